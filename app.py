@@ -8,6 +8,10 @@ from datetime import datetime
 
 st.set_page_config(page_title="Planification – Tetart.Y", layout="wide")
 
+# Préchauffage des caches en arrière-plan (un seul thread par process)
+from pages.refresher import get_refresher
+get_refresher()
+
 # ----- INITIALISATION -----
 if "page" not in st.session_state:
     st.session_state["page"] = "home"
@@ -2,7 +2,9 @@ import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
-from openpyxl import load_workbook
+
+from pages.data_access import BASE_PATH, UAPS, current_uap, load_table, require_uap_folder
+from pages.pic_data import load_pic
 
 # Pas de st.set_page_config ici : il est déjà dans app.py
 
@@ -33,85 +35,30 @@ def show_dashboard_pic():
             st.session_state["page"] = "menu"
             return
     # === Paramètres GIF ===
-    GIF_PATH = 'GIF_20251219_081101_562.gif'  # chemin local
-
-    # Chargement des données
-    file_path = 'Essai appli dashboard (1).xlsx'
-    df = pd.read_excel(file_path, sheet_name='2025', engine='openpyxl', header=None)
-
-    # --- Lecture de la cellule Q4 pour l’En-cours Visitage ---
-    wb_info = load_workbook(file_path, data_only=True)
-    ws_info = wb_info["2025"]  # ou le nom exact si différent
-
-    en_cours_visitage = ws_info["Q4"].value
-
-    if en_cours_visitage is None:
-       en_cours_visitage = 0
-
-    # === Soucis de cylindre via openpyxl : lecture robuste d'AJ à AM ===
-    try:
-        wb = load_workbook(file_path, data_only=True)
-
-        # On cible la feuille "2025" si elle existe, sinon on prend la 1ère
-        sheet_name_cyl = '2025'
-        if sheet_name_cyl not in wb.sheetnames:
-            sheet_name_cyl = wb.sheetnames[0]
-
-        ws = wb[sheet_name_cyl]
+    GIF_PATH = BASE_PATH / 'GIF_20251219_081101_562.gif'  # chemin local
 
-        # Colonnes Excel -> index openpyxl (A=1) : AJ=36, AK=37, AL=38, AM=39
-        COL_AJ, COL_AK, COL_AL, COL_AM = 36, 37, 38, 39
-
-        rows_list = []
-        # On parcourt de la ligne 2 jusqu'à la fin de la feuille
-        for r in range(2, ws.max_row + 1):
-            cylindre = ws.cell(row=r, column=COL_AJ).value  # AJ
-            delai    = ws.cell(row=r, column=COL_AK).value  # AK
-            retour   = ws.cell(row=r, column=COL_AL).value  # AL
-            impact   = ws.cell(row=r, column=COL_AM).value  # AM
-
-            # Ignore les lignes où le cylindre n'est pas renseigné
-            if cylindre is None or (isinstance(cylindre, str) and cylindre.strip() == ""):
-                continue
-
-            rows_list.append({
-                "Cylindre": cylindre,
-                "Délai": delai,
-                "Retour prévu": retour,
-                "Impact client": impact
-            })
-
-        # Conversion en DataFrame pandas
-        issues = pd.DataFrame(rows_list)
+    # Sidebar
+    st.sidebar.image(
+        "https://upload.wikimedia.org/wikipedia/commons/thumb/3/3f/Logo_Gerflor.svg/2560px-Logo_Gerflor.svg.png",
+        width=150
+    )
+    st.sidebar.title("Sélection UAP")
+    uap_selection = st.sidebar.selectbox("Choisir une UAP", UAPS, index=UAPS.index(current_uap()))
+    require_uap_folder(uap_selection)
 
-        if not issues.empty:
-            # Normalise la date (AL)
-            issues["Retour prévu"] = pd.to_datetime(
-                issues["Retour prévu"], errors="coerce", dayfirst=True
-            )
-            # Colonne pour affichage
-            issues["Retour prévu (aff.)"] = issues["Retour prévu"].dt.strftime("%d/%m/%Y")
-            # Tri par date de retour (les NaT passent en bas)
-            issues = issues.sort_values(by=["Retour prévu"], na_position="last").reset_index(drop=True)
-
-            # KPIs
-            nb_cylindres = len(issues)
-            prochaine_date = issues["Retour prévu"].dropna().min()
-            prochaine_date_aff = prochaine_date.strftime("%d/%m/%Y") if pd.notna(prochaine_date) else "—"
-        else:
-            nb_cylindres = 0
-            prochaine_date_aff = "—"
+    # Chargement des données : classeur PIC de l'UAP, lu une fois par version (pic_data)
+    pic = load_pic(uap_selection)
+    en_cours_visitage = pic.en_cours_visitage
 
-    except Exception as e:
-        # Repli propre si jamais la lecture échoue
-        issues = pd.DataFrame(columns=["Cylindre", "Délai", "Retour prévu (aff.)", "Impact client"])
-        nb_cylindres = 0
-        prochaine_date_aff = "—"
-        st.warning(f"Impossible de lire AJ:AM (soucis de cylindre). Détail : {e}")
+    # === Soucis de cylindre (AJ à AM) ===
+    issues = pic.issues
+    nb_cylindres = pic.nb_cylindres
+    prochaine_date_aff = pic.prochaine_date_aff
+    if pic.issues_error:
+        st.warning(f"Impossible de lire AJ:AM (soucis de cylindre). Détail : {pic.issues_error}")
 
     # === Chargement du calendrier des postes ===
-    calendrier_path = 'Calendrier 2026.xlsx'
-    df_cal = pd.read_excel(calendrier_path, sheet_name='Feuil1', engine='openpyxl')
+    df_cal = load_table("calendrier", uap_selection)
 
     # Renommer proprement les colonnes du calendrier
     df_cal.columns = [
@@ -132,50 +79,25 @@ def show_dashboard_pic():
     )
 
     # Initialisation
-    mois = df.iloc[2:14, 0].tolist()
-    campagnes = df.iloc[1, 25:34].tolist()  # Colonnes Z à AH incluses
-
-    pic_realise = pd.Series(
-        pd.to_numeric(df.iloc[2:14, 1], errors='coerce').fillna(0).astype(int).values,
-        index=mois
-    )
-    pic_prevu = pd.Series(
-        pd.to_numeric(df.iloc[2:14, 2], errors='coerce').fillna(0).astype(int).values,
-        index=mois
-    )
-    ruptures = int(df.iloc[1, 16])
+    mois = pic.mois
+    campagnes = pic.campagnes  # Colonnes Z à AH incluses
+    pic_realise = pic.pic_realise
+    pic_prevu = pic.pic_prevu
+    ruptures = pic.ruptures
 
     # Taux d'adhérence global (W2)
-    raw_adherence = pd.to_numeric(df.iloc[1, 22], errors='coerce')
-    taux_adherence = (raw_adherence * 100) if pd.notna(raw_adherence) else 0
+    taux_adherence = pic.taux_adherence
 
     # Taux d'adhérence S-1 (T2)
-    adherence_s1 = pd.to_numeric(df.iloc[1, 19], errors='coerce')
+    adherence_s1 = pic.adherence_s1
 
-    # Sidebar
-    st.sidebar.image(
-        "https://upload.wikimedia.org/wikipedia/commons/thumb/3/3f/Logo_Gerflor.svg/2560px-Logo_Gerflor.svg.png",
-        width=150
-    )
-    st.sidebar.title("Sélection UAP")
-    uap_selection = st.sidebar.selectbox("Choisir une UAP", ["4M", "2M", "P2000", "KLAM"])
     mois_selectionne = st.sidebar.selectbox("Choisir un mois", mois)
 
     # Données campagnes (Z à AH)
-    campagne_data = df.iloc[2:14, 25:34]
-    campagne_data.columns = campagnes
-    campagne_data.index = mois
-    campagne_mois = campagne_data.loc[mois_selectionne].apply(pd.to_numeric, errors='coerce').fillna(0)
+    campagne_mois = pic.campagne_data.loc[mois_selectionne]
 
     # Données hebdomadaires
-    weekly_data = df.iloc[2:51, [21, 22]]
-    weekly_data.columns = ["Semaine", "Taux d'adhérence"]
-    weekly_data.dropna(inplace=True)
-    weekly_data["Taux d'adhérence"] = pd.to_numeric(
-        weekly_data["Taux d'adhérence"], errors="coerce"
-    )
-    weekly_data["Taux d'adhérence"] = (weekly_data["Taux d'adhérence"] * 100).round(1)
-    weekly_data["Semaine"] = weekly_data["Semaine"].astype(int)
+    weekly_data = pic.weekly
     semaines_completes = list(range(1, 51))
     colors = ["green" if val >= 85 else "red" for val in weekly_data["Taux d'adhérence"]]
 
@@ -337,9 +259,8 @@ def show_dashboard_pic():
    
 
     # Graphiques côte à côte
-    campagne_labels = df.iloc[1, 6:14].tolist()
-    campagne_values = df[df.iloc[:, 0] == mois_selectionne].iloc[0, 6:14]
-    campagne_values = pd.to_numeric(campagne_values, errors='coerce').fillna(0)
+    campagne_labels = pic.campagne_labels
+    campagne_values = pic.campagne_values(mois_selectionne)
 
     couleurs_personnalisees = {
         "PRIMETEX": "yellow", "TEXLINE": "green", "NERA": "blue", "MOUSSE": "red",
@@ -476,10 +397,7 @@ def show_dashboard_pic():
     st.write(pd.DataFrame.from_dict(st.session_state.adjustments, orient='index', columns=['Ajustement (km²)']))
 
     # Heatmap
-    campagne_data_heatmap = df.iloc[2:14, 6:14]
-    campagne_data_heatmap.columns = campagne_labels
-    campagne_data_heatmap.index = mois
-    campagne_data_heatmap = campagne_data_heatmap.apply(pd.to_numeric, errors='coerce').fillna(0)
+    campagne_data_heatmap = pic.campagne_heatmap
 
     fig_heatmap = go.Figure(data=go.Heatmap(
         z=campagne_data_heatmap.values,
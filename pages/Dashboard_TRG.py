@@ -1,10 +1,12 @@
 import os
-from pathlib import Path
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
+from pages.data_access import UAPS, current_uap, require_uap_folder, table_path, table_version
+from pages.qualite_data import aggregate, load_cube
+
 # -------------------------------------------------
 #  Mapping lignes (L1, L2, Imprimerie)
 # -------------------------------------------------
@@ -73,88 +75,62 @@ def show_dashboard_trg():
             st.session_state["page"] = "menu"
             st.rerun()
 
-    @st.cache_data
-    def load_data(qualite_path: str) -> pd.DataFrame:
-        df = pd.read_excel(qualite_path, sheet_name=0, engine="openpyxl")
+    require_uap_folder()
 
-        # On garde uniquement les ML
-        df = df[df["Unité IM"] == "ML"].copy()
+    @st.cache_data(max_entries=2 * len(UAPS))
+    def load_data(uap, version) -> pd.DataFrame:
+        # Cube qualité (année, semaine, jour, ligne), partagé avec la page Qualité.
+        # OFs TRG : ML uniquement, durée > 0
+        cube = load_cube(uap)
+        cube = cube[cube["trg"]].copy()
 
         # Normalisation lignes
-        df["Ligne"] = df["Libelle ligne"].map(LINE_MAP).fillna(df["Libelle ligne"])
-
-        # Dates
-        df["Date début OF"] = pd.to_datetime(df["Date début OF"])
-        df["Date fin OF"] = pd.to_datetime(df["Date fin OF"])
-        df["duree_h"] = (df["Date fin OF"] - df["Date début OF"]).dt.total_seconds() / 3600
-        df = df[df["duree_h"] > 0]
-
-        # Semaine / année / jour
-        iso = df["Date début OF"].dt.isocalendar()
-        df["semaine"] = iso.week
-        df["annee"] = iso.year
-        df["jour_sem"] = df["Date début OF"].dt.dayofweek  # 0=lundi
-
-        # Scrap & rendement qualité
-        df["scrap_ml"] = df["Quantité mvt IM"] - df["Quantité IC"]
-        df["rendement_qualite"] = df["Quantité IC"] / df["Quantité mvt IM"]
-
-        # TRG réel / prévu basés uniquement sur quantités + durée
-        df["TRG_reel_OF"] = df["Quantité mvt IM"] / df["duree_h"]          # ML/h réel
-        df["TRG_prev_OF"] = df["Quantité demandée"] / df["duree_h"]        # ML/h prévu
-
-        return df
-
-    qualite_path = Path("../Qualite.xlsx")
+        cube["Ligne"] = cube["Ligne"].cat.remove_unused_categories().cat.rename_categories(
+            lambda c: LINE_MAP.get(c, c)
+        )
+        cube["jour_sem"] = cube["Jour"].dt.dayofweek  # 0=lundi
+        return cube
 
+    uap = current_uap()
+    qualite_path = table_path("qualite", uap)
 
     if not os.path.exists(qualite_path):
-        st.error(f"Fichier '{qualite_path}' introuvable dans : {os.getcwd()}")
+        st.error(f"Fichier '{qualite_path}' introuvable.")
         st.stop()
 
-    df = load_data(qualite_path)
+    cube = load_data(uap, table_version("qualite", uap))
 
     # -------------------------------------------------
     #  Filtres
     # -------------------------------------------------
     st.sidebar.title("Filtres")
 
-    annees = sorted(df["annee"].unique())
+    annees = sorted(cube["annee"].unique())
     annee_sel = st.sidebar.selectbox("Année", annees, index=len(annees) - 1)
 
-    semaines = sorted(df[df["annee"] == annee_sel]["semaine"].unique())
+    semaines = sorted(cube[cube["annee"] == annee_sel]["semaine"].unique())
     semaine_sel = st.sidebar.selectbox("Semaine ISO", semaines, index=len(semaines) - 1)
 
-    df_week = df[(df["annee"] == annee_sel) & (df["semaine"] == semaine_sel)]
+    df_week = cube[(cube["annee"] == annee_sel) & (cube["semaine"] == semaine_sel)]
     if df_week.empty:
         st.warning("Pas de données pour cette semaine.")
         st.stop()
 
     # -------------------------------------------------
-    #  Agrégations
+    #  Agrégations (depuis le cube)
     # -------------------------------------------------
     # Global par semaine (toutes lignes)
-    agg_all = (
-        df.groupby(["annee", "semaine"])
-        .agg(
-            prod_semaine_ml=("Quantité mvt IM", "sum"),
-            scrap_ml=("scrap_ml", "sum"),
-        )
-        .reset_index()
+    agg_all = aggregate(cube, ["annee", "semaine"], sums=["QteIM", "scrap_ml"], means=[]).rename(
+        columns={"QteIM": "prod_semaine_ml"}
     )
 
     # Par semaine & ligne (pour moyennes historiques)
-    agg_all_line = (
-        df.groupby(["annee", "semaine", "Ligne"])
-        .agg(
-            prod_semaine_ml=("Quantité mvt IM", "sum"),
-            scrap_ml=("scrap_ml", "sum"),
-        )
-        .reset_index()
+    agg_all_line = aggregate(cube, ["annee", "semaine", "Ligne"], sums=["QteIM", "scrap_ml"], means=[]).rename(
+        columns={"QteIM": "prod_semaine_ml"}
     )
 
     weekly_avg_by_line = (
-        agg_all_line.groupby("Ligne")
+        agg_all_line.groupby("Ligne", observed=True)
         .agg(
             prod_moy=("prod_semaine_ml", "mean"),
             scrap_moy=("scrap_ml", "mean"),
@@ -173,21 +149,18 @@ def show_dashboard_trg():
     weekly_avg_scrap = agg_all["scrap_ml"].mean()
 
     # Semaine sélectionnée : par ligne
-    agg_week_line = (
-        df_week.groupby("Ligne")
-        .agg(
-            prod_semaine_ml=("Quantité mvt IM", "sum"),
-            bon_ml=("Quantité IC", "sum"),
-            scrap_ml=("scrap_ml", "sum"),
-            rdt_budget_moy=("Rdt budget", "mean"),
-            duree_h=("duree_h", "sum"),
-            qte_dem=("Quantité demandée", "sum"),
-            trg_reel_moy=("TRG_reel_OF", "mean"),
-            trg_prev_moy=("TRG_prev_OF", "mean"),
-            nb_of=("Numéro OF", "nunique"),
-        )
-        .reset_index()
-    )
+    agg_week_line = aggregate(
+        df_week, "Ligne",
+        sums=["QteIM", "QteIC", "scrap_ml", "duree_h", "QteDemandee", "nb_of"],
+        means=["RdtBudget", "TRG_reel_OF", "TRG_prev_OF"],
+    ).rename(columns={
+        "QteIM": "prod_semaine_ml",
+        "QteIC": "bon_ml",
+        "QteDemandee": "qte_dem",
+        "RdtBudget": "rdt_budget_moy",
+        "TRG_reel_OF": "trg_reel_moy",
+        "TRG_prev_OF": "trg_prev_moy",
+    })
 
     # Rendement
     agg_week_line["rendement_reel"] = agg_week_line["bon_ml"] / agg_week_line["prod_semaine_ml"]
@@ -357,11 +330,10 @@ def show_dashboard_trg():
     #  PRODUCTION THIS WEEK / TREND / DISTRIBUTION
     # -------------------------------------------------
     jour_labels = {0: "Mon", 1: "Tue", 2: "Wed", 3: "Thu", 4: "Fri", 5: "Sat", 6: "Sun"}
-    df_week["Jour"] = df_week["jour_sem"].map(jour_labels)
-
     prod_jour = (
-        df_week.groupby(["Jour", "Ligne"])
-        .agg(prod_ml=("Quantité mvt IM", "sum"))
+        df_week.assign(Jour=df_week["jour_sem"].map(jour_labels))
+        .groupby(["Jour", "Ligne"], observed=True)
+        .agg(prod_ml=("QteIM", "sum"))
         .reset_index()
     )
 
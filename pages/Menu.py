@@ -4,6 +4,8 @@
 
 import streamlit as st
 
+from pages.data_access import uap_folder_error
+
 def show_menu():
     
     uap = st.session_state.get("uap_selection", "4M")
@@ -58,6 +60,11 @@ def show_menu():
     st.markdown(f"<div class='menu-title'>Menu – UAP {uap}</div>", unsafe_allow_html=True)
     st.markdown("<div class='menu-subtitle' style='text-align:center;'>Sélectionne un module de planification ou de suivi.</div>", unsafe_allow_html=True)
 
+    # Classeurs de l'UAP (un dossier par UAP, cf. data_access.uap_base_path)
+    message = uap_folder_error(uap)
+    if message:
+        st.warning(f"⚠️ {message}")
+
     st.markdown("<div class='menu-section-label'>Choisir un module :</div>", unsafe_allow_html=True)
 
     # Dashboard PIC
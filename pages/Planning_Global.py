@@ -3,40 +3,24 @@
 # ============================================================
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from pathlib import Path
 import plotly.graph_objects as go
 
+from pages.data_access import LIGNES, load_ligne, require_uap_folder
+from pages.calendrier import calendrier_ligne
+from pages.gantt import add_bars, add_lines
+from pages.scheduler import SegmentTable, intro_changement, intro_produit_l1
+from pages.plan_cache import cached_plan, now_bucket
+
 # ------------------------------------------------------------
 # CONFIG
 # ------------------------------------------------------------
-BASE_PATH = Path(
-    r"C:\Users\yannick.tetard\OneDrive - GERFLOR\Desktop\Planning Streamlit\xarpediem2684-repo-main"
-)
-
-FILES = {
-    "Ligne 1": {
-        "ofs": BASE_PATH / "OFs_L1.xlsx",
-        "cal": BASE_PATH / "Calendrier 2026 L1.xlsx",
-        "sheet": "Feuil1",
-    },
-    "Imprimerie": {
-        "ofs": BASE_PATH / "OFs_Imprimerie.xlsx",
-        "cal": BASE_PATH / "Calendrier 2026 imprimerie.xlsx",
-        "sheet": "Feuil1",
-    },
-    "Ligne 2": {
-        "ofs": BASE_PATH / "OFs_L2.xlsx",
-        "cal": BASE_PATH / "Calendrier 2026.xlsx",
-        "sheet": "Sheet1",
-    },
-    "Visitage": {
-        "ofs": BASE_PATH / "OFs_Visitage.xlsx",
-        "cal": BASE_PATH / "Calendrier 2026.xlsx",
-        "sheet": "Feuil1",
-    }
-}
+# Fichiers OFs / calendrier par ligne : voir data_access.LIGNES
+
+# Semaines consultables après la semaine courante (planification longue)
+HORIZON_SEMAINES = 10
 
 INTRO_DUREE = {
     "Ligne 1": 2.3,
@@ -178,82 +162,16 @@ VIS_BOTTOM_COLOR = {
 # ------------------------------------------------------------
 # LOAD DATA
 # ------------------------------------------------------------
-@st.cache_data
-def load_all():
+def load_all(uap=None):
     data = {}
-    for ligne,f in FILES.items():
+    for ligne in LIGNES:
         try:
-            ofs = pd.read_excel(f["ofs"], sheet_name=f["sheet"], engine="openpyxl")
-            cal = pd.read_excel(f["cal"], engine="openpyxl")
+            ofs, cal = load_ligne(ligne, uap)
             data[ligne] = {"ofs": ofs, "cal": cal}
         except Exception as e:
             data[ligne] = {"ofs": pd.DataFrame(), "cal": pd.DataFrame(), "error": str(e)}
     return data
 
-# ------------------------------------------------------------
-# SLOTS
-# ------------------------------------------------------------
-def parse_horaire(jour, text):
-    if not isinstance(text,str) or "-" not in text: return None,None
-    d,f = text.split("-")
-    d = d.replace("h",":"); f = f.replace("h",":")
-    start = datetime.combine(jour.date(), datetime.strptime(d,"%H:%M").time())
-    end   = datetime.combine(jour.date(), datetime.strptime(f,"%H:%M").time())
-    if end <= start: end += timedelta(days=1)
-    return start,end
-
-def build_slots(cal_df, start, end):
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-    mask = (cal["Jour"].dt.date >= start.date()) & (cal["Jour"].dt.date <= end.date())
-    slots = []
-    for _,row in cal.loc[mask].iterrows():
-        jour = row["Jour"]
-        for i in [1,2,3]:
-            if row.get(f"Etat_{i}")=="OUVERT":
-                h=row.get(f"Horaire_{i}")
-                if isinstance(h,str) and "-" in h:
-                    s,e = parse_horaire(jour,h)
-                    if s and e and e>start and s<end:
-                        slots.append({"start":max(s,start),"end":min(e,end)})
-    return sorted(slots,key=lambda x:x["start"])
-
-
-# ------------------------------------------------------------
-# RÈGLES INTRO L1 (Planning_L1) [2](https://gerflorgroup-my.sharepoint.com/personal/yannick_tetart_gerflor_com/Documents/Fichiers%20de%20conversation%20Microsoft%20Copilot/Planning_L2.py)
-# ------------------------------------------------------------
-def l1_needs_intro(prev_prod,curr_prod):
-    if not prev_prod or not curr_prod: return False
-    p=prev_prod.upper(); c=curr_prod.upper()
-
-    def t(x):
-        if "CICDMD" in x: return "CICDMD"
-        if "CIMD"   in x: return "CIMD"
-        if "CICD"   in x: return "CICD"
-        return "OTHER"
-
-    def larg(x):
-        if "3M" in x: return "3M"
-        if "4M" in x: return "4M"
-        return "?"
-
-    pt,ct = t(p),t(c)
-    pl,cl = larg(p),larg(c)
-
-    if (pt=="CICD" and ct=="CIMD") or (pt=="CIMD" and ct=="CICD"): return True
-    if (pt=="CICDMD" and ct=="CICD") or (pt=="CICD" and ct=="CICDMD"): return True
-    if (pt=="CICDMD" and ct=="CIMD") or (pt=="CIMD" and ct=="CICDMD"): return True
-    if pl=="3M" and cl=="4M": return True
-
-    return False
-
-# ------------------------------------------------------------
-# RÈGLES INTRO L2 (Planning_L2) [2](https://gerflorgroup-my.sharepoint.com/personal/yannick_tetart_gerflor_com/Documents/Fichiers%20de%20conversation%20Microsoft%20Copilot/Planning_L2.py)
-# ------------------------------------------------------------
-def l2_needs_intro(prev_camp,curr_camp):
-    if not prev_camp: return False
-    return prev_camp != curr_camp
-
 # ------------------------------------------------------------
 # LABELS harmonisés
 # ------------------------------------------------------------
@@ -299,122 +217,127 @@ LABEL_FUN = {
 # ------------------------------------------------------------
 # PLANIFICATION GÉNÉRIQUE
 # ------------------------------------------------------------
+def color_of(r,ligne):
+    if ligne=="Ligne 1":
+        prod=str(r.get("Produit","")).upper()
+        for k,v in PRODUIT_COLOR_L1.items():
+            if k.upper() in prod: return v
+        return "#CCCCCC"
+
+    if ligne=="Ligne 2":
+        fam=r.get("FAMILLE","")
+        c,_=FAMILLE_COLOR_L2.get(fam,("#FFFFFF","#000000"))
+        return c
+
+    if ligne=="Visitage":
+        camp=str(r.get("Campagne","")).upper()
+        for k,v in VIS_TOP_COLOR.items():
+            if k in camp: return v
+        return "#CCCCCC"
+
+    if ligne=="Imprimerie":
+        return "#FFFFFF"
+
+    return "#FFFFFF"
+
+INTRO_RULE = {
+    "Ligne 1": lambda ofs: intro_produit_l1(ofs["Produit"]),
+    "Ligne 2": lambda ofs: intro_changement(ofs["Campagne"]),
+}
+
 def schedule_generic(ofs_df,slots,ligne):
-    rows=[]
-    if ofs_df.empty or not slots: return pd.DataFrame()
-
-    intro_d=INTRO_DUREE[ligne]
-    slot_idx=0
-    cur_s=slots[0]["start"]; cur_e=slots[0]["end"]
-    prev_key=None
-
-    def consume(h):
-        nonlocal slot_idx,cur_s,cur_e
-        segs=[]; rem=timedelta(hours=h)
-        while rem>timedelta(0):
-            if slot_idx>=len(slots): return segs,False
-            avail=cur_e-cur_s
-            if avail<=timedelta(0):
-                slot_idx+=1
-                if slot_idx>=len(slots): return segs,False
-                cur_s=slots[slot_idx]["start"]; cur_e=slots[slot_idx]["end"]
-                continue
-            use=min(avail,rem)
-            segs.append({"start":cur_s,"end":cur_s+use,"duree_h":use.total_seconds()/3600})
-            rem-=use
-            cur_s+=use
-        return segs,True
-
-    def key_of(r):
-        if ligne=="Ligne 1" : return r.get("Produit","")
-        if ligne=="Ligne 2" : return r.get("Campagne","")
-        if ligne=="Imprimerie": return r.get("Campagne","")
-        return None
-
-    def color_of(r):
-        if ligne=="Ligne 1":
-            prod=str(r.get("Produit","")).upper()
-            for k,v in PRODUIT_COLOR_L1.items():
-                if k.upper() in prod: return v
-            return "#CCCCCC"
-
-        if ligne=="Ligne 2":
-            fam=r.get("FAMILLE","")
-            c,_=FAMILLE_COLOR_L2.get(fam,("#FFFFFF","#000000"))
-            return c
-
-        if ligne=="Visitage":
-            camp=str(r.get("Campagne","")).upper()
-            for k,v in VIS_TOP_COLOR.items():
-                if k in camp: return v
-            return "#CCCCCC"
-
-        if ligne=="Imprimerie":
-            return "#FFFFFF"
+    """Segments de la ligne (SegmentTable) : libellés et couleurs à l'affichage."""
+    ofs=ofs_df.reset_index(drop=True)
+    if ofs.empty or not len(slots): return SegmentTable.empty_for(ofs)
+
+    # --- durées (défaut Visitage : ML / 15 ml/min, TRG 0.8, +0.75h) ---
+    duree=pd.to_numeric(ofs.get("Temps en h"),errors="coerce")
+    if ligne=="Visitage":
+        ml=pd.to_numeric(ofs.get("Ml"),errors="coerce").fillna(0)
+        defaut=(ml/15/60*0.8)+0.75
+    else: defaut=1.0
+    duree=duree.where(duree.notna() & (duree!=0), defaut)
+
+    rule=INTRO_RULE.get(ligne)
+    return SegmentTable.plan(ofs, duree.to_numpy("float64"), slots,
+                             intro=rule(ofs) if rule else None, intro_h=INTRO_DUREE[ligne])
+
+# Couleur par catégorie (une fois par famille / campagne), sinon par OF
+COLOR_FIELD = {"Ligne 2": "famille", "Visitage": "campagne"}
+
+def segment_colors(seg,ligne):
+    field=COLOR_FIELD.get(ligne)
+    if field:
+        col=SegmentTable.CODED[field]
+        return seg.per_code(field,lambda v: color_of({col:v},ligne),"#FFFFFF")
+    return seg.per_of(lambda r: color_of(r,ligne),"#FFFFFF")
+
+FRAME_COLUMNS = ["Ofs","Produit","Laise","COLORIS","Support","FAMILLE","GRAIN","Campagne"]
+
+def segment_frame(seg,ligne,labels=False):
+    """Segments 'seg' avec les colonnes de l'OF ; labels=True : couleur et libellé."""
+    cols={c:c for c in FRAME_COLUMNS}
+    cols["Ml"]="Ml" if "Ml" in seg.ofs else "ML"
+    cols["Coloris"]="Coloris"
+    df=seg.to_frame(cols,intro_values={"Ofs":"INTRO"})
+    df["Coloris"]=df["COLORIS"].where(df["COLORIS"]!="",df["Coloris"])
+    df.insert(0,"Ligne",ligne)
+    if labels:
+        df["color"]=segment_colors(seg,ligne)
+        df["text_color"]="#000000"
+        reel=~df["is_intro"]
+        df["Label"]="<b>INTRO</b>"
+        if reel.any():
+            # Libellé sur les colonnes de l'OF telles quelles : sans "Ml" (L2 : "ML"), pas de ML affiché
+            rows=df[reel] if "Ml" in seg.ofs else df[reel].drop(columns="Ml")
+            df.loc[reel,"Label"]=rows.apply(LABEL_FUN[ligne],axis=1)
+    return df
+
+def plan_global(ligne,ofs_df,cal,start,end,uap=None,warm=False):
+    """schedule_generic sur les créneaux [start, end], via le cache partagé."""
+    return cached_plan(ligne,ofs_df,start,end,
+                       lambda: schedule_generic(ofs_df,cal.open_slots(start,end),ligne),
+                       variant="global",uap=uap,warm=warm)
+
+def week_bounds(ref,off):
+    """(lundi 00:00, dimanche 23:59) de la semaine 'ref' décalée de 'off' semaines."""
+    mon=ref - timedelta(days=ref.weekday())
+    mon=datetime.combine(mon.date(),datetime.min.time())+timedelta(weeks=off)
+    sun=mon+timedelta(days=6, hours=23, minutes=59)
+    return mon,sun
+
+def horizon_week_starts(now):
+    """Débuts des semaines consultables : bornes des snapshots."""
+    return [week_bounds(now,k)[0] for k in range(1,HORIZON_SEMAINES+1)]
+
+def default_plans(now,uap=None):
+    """Plannings du décalage 0 et planning long de chaque ligne (préchauffage du cache).
+
+    Mêmes clés que show_planning_global : la première ouverture de la page
+    ou d'un décalage de semaine les retrouve dans le cache."""
+    data=load_all(uap)
+    we=week_bounds(now,0)[1]
+    horizon=horizon_week_starts(now)[-1]
+    for ligne in LIGNES:
+        if "error" in data[ligne] or data[ligne]["ofs"].empty:
+            continue
+        cal=calendrier_ligne(ligne,uap)
+        plan_global(ligne,data[ligne]["ofs"],cal,now,we,uap,warm=True)
+        plan_global(ligne,data[ligne]["ofs"],cal,now,horizon,uap,warm=True)
 
-        return "#FFFFFF"
+def week_checkpoints(plan_long,week_starts):
+    """Snapshots aux débuts de semaine : {ws: OFs commencés avant ws}.
 
-    # --- boucle OF ---
-    for _,r0 in ofs_df.iterrows():
-        curr_key=key_of(r0)
-
-        need_intro=False
-        if ligne=="Ligne 1": need_intro=l1_needs_intro(prev_key,curr_key)
-        elif ligne=="Ligne 2": need_intro=l2_needs_intro(prev_key,curr_key)
-
-        if need_intro and intro_d>0:
-            intro_segs,_=consume(intro_d)
-            for s in intro_segs:
-                rows.append({
-                    "Ligne":ligne,"Ofs":"INTRO","is_intro":True,
-                    "start":s["start"],"end":s["end"],"duree_h":s["duree_h"],
-                    "Label":"<b>INTRO</b>",
-                    "color":"#FFFFFF","text_color":"#000000",
-                })
-
-        prev_key=curr_key
-
-        duree=r0.get("Temps en h")
-        if pd.isna(duree) or duree in [None,"",0]:
-            if ligne=="Visitage":
-                ml=float(r0.get("Ml",0))
-                duree=(ml/15/60*0.8)+0.75
-            else: duree=1.0
-        duree=float(duree)
-
-        segs,_=consume(duree)
-        col=color_of(r0)
-        labelf=LABEL_FUN[ligne]
-
-        for s in segs:
-            r=r0.copy()
-            r["start"]=s["start"]; r["end"]=s["end"]; r["duree_h"]=s["duree_h"]
-
-            ml = r.get("Ml", r.get("ML",""))
-            laise = r.get("Laise","")
-            colU = r.get("COLORIS",""); colL = r.get("Coloris","")
-            if colU=="": colAny=colL
-            else: colAny=colU
-
-            rows.append({
-                "Ligne":ligne,
-                "Ofs":r.get("Ofs",""),
-                "is_intro":False,
-                "start":r["start"],"end":r["end"],"duree_h":r["duree_h"],
-                "color":col,"text_color":"#000000",
-                "Label":labelf(r),
-                "Produit":r.get("Produit",""),
-                "Ml":ml,
-                "Laise":laise,
-                "COLORIS":colU,
-                "Coloris":colAny,
-                "Support":r.get("Support",""),
-                "FAMILLE":r.get("FAMILLE",""),
-                "GRAIN":r.get("GRAIN",""),
-                "Campagne":r.get("Campagne",""),
-            })
-
-    return pd.DataFrame(rows)
+    plan_long : planning continu depuis now (schedule_generic). Un OF est
+    "commencé" dès que son premier segment débute avant ws."""
+    if plan_long.empty:
+        return {ws:set() for ws in week_starts}
+    reel=~plan_long.is_intro
+    of_seg=pd.DataFrame({"Ofs":plan_long.column("Ofs")[reel],"start":plan_long.starts()[reel]})
+    first=of_seg.groupby("Ofs",sort=False,dropna=False)["start"].min().sort_values(kind="stable")
+    ofs=first.index.to_numpy(object)
+    cuts=np.searchsorted(first.to_numpy(),pd.DatetimeIndex(week_starts).to_numpy(),side="left")
+    return {ws:set(ofs[:k]) for ws,k in zip(week_starts,cuts)}
 
 
 
@@ -431,22 +354,19 @@ def show_planning_global():
             st.session_state["page"]="menu"
             st.rerun()
 
+    require_uap_folder()
+
     data=load_all()
-    now=datetime.now()
+    now=now_bucket()
 
     st.markdown("### 📆 Sélection de la semaine")
     c1,c2,_=st.columns([1,2,1])
 
     with c1:
-        offset=st.number_input("Décalage semaine",0,10,0)
-
-    def week_bounds(ref,off):
-        mon=ref - timedelta(days=ref.weekday())
-        mon=datetime.combine(mon.date(),datetime.min.time())+timedelta(weeks=off)
-        sun=mon+timedelta(days=6, hours=23, minutes=59)
-        return mon,sun
+        offset=st.number_input("Décalage semaine",0,HORIZON_SEMAINES,0)
 
     ws,we = week_bounds(now,offset)
+    week_starts=horizon_week_starts(now)
 
     with c2:
         st.info(f"**{ws.strftime('%d/%m')} → {we.strftime('%d/%m/%Y')}**")
@@ -461,18 +381,17 @@ def show_planning_global():
         if ligne not in data or "error" in data[ligne] or data[ligne]["ofs"].empty:
             continue
 
+        cal=calendrier_ligne(ligne)
         if offset==0:
-            slots=build_slots(data[ligne]["cal"], now, we)
-            planning[ligne]=schedule_generic(data[ligne]["ofs"],slots,ligne)
+            planning[ligne]=plan_global(ligne,data[ligne]["ofs"],cal,now,we)
         else:
-            slots_before=build_slots(data[ligne]["cal"], now, ws)
-            p_before=schedule_generic(data[ligne]["ofs"],slots_before,ligne)
-
-            done=set(p_before[~p_before["is_intro"]]["Ofs"].unique()) if not p_before.empty else set()
+            # Planning long (mis en cache) -> snapshot de la semaine, puis
+            # planification des seuls OFs restants sur la semaine affichée
+            p_long=plan_global(ligne,data[ligne]["ofs"],cal,now,week_starts[-1])
+            done=week_checkpoints(p_long,week_starts)[ws]
 
             remaining=data[ligne]["ofs"][~data[ligne]["ofs"]["Ofs"].isin(done)]
-            slots=build_slots(data[ligne]["cal"], ws, we)
-            planning[ligne]=schedule_generic(remaining,slots,ligne)
+            planning[ligne]=plan_global(ligne,remaining,cal,ws,we)
 
     # -----------------------------------------------------
     # GANTT
@@ -484,100 +403,42 @@ def show_planning_global():
         if ligne not in planning or planning[ligne].empty:
             continue
 
-        df=planning[ligne]
-
-        # --- BARRES ---
-        for _,r in df.iterrows():
-            if r["end"] < display_start or r["start"] > we:
-                continue
-            dur_ms=(r["end"]-r["start"]).total_seconds()*1000
-
-            bar_col = r["color"]
-            if ligne=="Imprimerie":
-                bar_col="#FFFFFF"
-
-            fig.add_trace(go.Bar(
-                x=[dur_ms], y=[ligne], base=[r["start"]],
-                orientation='h',
-                marker=dict(color=bar_col, line=dict(color="#000",width=1)),
-                text=r["Label"], textposition="inside",
-                insidetextanchor="middle",
-                textfont=dict(color=r["text_color"],size=9),
-                hovertemplate=f"{r['Label']}<extra></extra>",
-                showlegend=False
-            ))
+        df=segment_frame(planning[ligne].window(display_start,we),ligne,labels=True)
+
+        # --- BARRES (une trace par ligne) ---
+        add_bars(fig, ligne, df["start"], df["end"],
+                 color="#FFFFFF" if ligne=="Imprimerie" else df["color"],
+                 text=df["Label"], text_color=df["text_color"],
+                 insidetextanchor="middle")
+
+        reel=df[~df["is_intro"].astype(bool)]
 
         # --- TRAITS IMPRIMERIE ---
-        if ligne=="Imprimerie":
-            for _,r in df.iterrows():
-                if r["is_intro"]: continue
-                s,e = r["start"],r["end"]
-                if e<display_start or s>we: continue
-
-                camp=str(r["Campagne"]).upper()
-                tcol="#000000"
-                double=False
-
-                for k,v in CAMPAGNE_COLOR_IMP.items():
-                    if k in camp: tcol=v
-
-                for dt in DOUBLE_TRAIT:
-                    if dt in camp: double=True
-
-                if double:
-                    fig.add_shape(type="line", x0=s,x1=e, y0=0.33,y1=0.33,
-                        xref="x",yref="paper", line=dict(color=tcol,width=3))
-                    fig.add_shape(type="line", x0=s,x1=e, y0=0.67,y1=0.67,
-                        xref="x",yref="paper", line=dict(color=tcol,width=3))
-                else:
-                    fig.add_shape(type="line", x0=s,x1=e, y0=0.5,y1=0.5,
-                        xref="x",yref="paper", line=dict(color=tcol,width=3))
+        if ligne=="Imprimerie" and not reel.empty:
+            camp=reel["Campagne"].astype(str).str.upper()
+            tcol=pd.Series("#000000",index=reel.index)
+            for k,v in CAMPAGNE_COLOR_IMP.items():
+                tcol[camp.str.contains(k,regex=False)]=v
+            double=camp.str.contains("|".join(DOUBLE_TRAIT))
+            traits=pd.concat([reel[~double].assign(y=0.5,c=tcol[~double]),
+                              reel[double].assign(y=0.33,c=tcol[double]),
+                              reel[double].assign(y=0.67,c=tcol[double])])
+            add_lines(fig, traits["start"], traits["end"], traits["y"], traits["c"])
 
         # --- VISITAGE : LAISE ---
-        if ligne=="Visitage":
-            for _,r in df.iterrows():
-                if r["is_intro"]: continue
-                s,e=r["start"],r["end"]
-                if e<display_start or s>we: continue
-
-                dur_ms=(e-s).total_seconds()*1000
-                la=int(r.get("Laise",4))
-                bot=VIS_BOTTOM_COLOR.get(la,"#55CC55")
-
-                fig.add_trace(go.Bar(
-                    x=[dur_ms], y=["Laise"], base=[s],
-                    orientation='h',
-                    marker=dict(color=bot, line=dict(color="#000",width=1)),
-                    text=f"L{la}",
-                    textposition="inside",
-                    textfont=dict(color="#000",size=10),
-                    hovertemplate=f"Laise {la}<extra></extra>",
-                    showlegend=False
-                ))
+        if ligne=="Visitage" and not reel.empty:
+            la=pd.to_numeric(reel["Laise"],errors="coerce").fillna(4).astype(int)
+            add_bars(fig, "Laise", reel["start"], reel["end"],
+                     color=la.map(lambda x: VIS_BOTTOM_COLOR.get(x,"#55CC55")),
+                     text="L"+la.astype(str), hover="Laise "+la.astype(str),
+                     font_size=10, insidetextanchor="end")
 
         # --- ARRETS FERMÉS ---
-        cal=data[ligne]["cal"].copy()
-        cal["Jour"]=pd.to_datetime(cal["Jour"])
-        mask=(cal["Jour"].dt.date>=display_start.date())&(cal["Jour"].dt.date<=we.date())
-        for _,row in cal.loc[mask].iterrows():
-            j=row["Jour"]
-            for i in [1,2,3]:
-                if row.get(f"Etat_{i}")=="FERME":
-                    h=row.get(f"Horaire_{i}")
-                    if isinstance(h,str) and "-" in h:
-                        s,e=parse_horaire(j,h)
-                        if s<we and e>display_start:
-                            s=max(s,display_start); e=min(e,we)
-                            dur_ms=(e-s).total_seconds()*1000
-                            fig.add_trace(go.Bar(
-                                x=[dur_ms], y=[ligne], base=[s],
-                                orientation='h',
-                                marker=dict(color="rgba(255,0,0,0.75)"),
-                                text="ARRÊT", textposition="inside",
-                                textfont=dict(size=9,color="white",family="Arial Black"),
-                                hovertemplate="ARRÊT<extra></extra>",
-                                showlegend=False
-                            ))
+        arret_s,arret_e=calendrier_ligne(ligne).closed_arrays(display_start, we)
+        add_bars(fig, ligne, arret_s, arret_e,
+                 color="rgba(255,0,0,0.75)", line_width=0,
+                 text="ARRÊT", text_color="white", hover="ARRÊT",
+                 font_family="Arial Black", insidetextanchor="end")
 
     # --- JOURS ---
     JFR=["Lundi","Mardi","Mercredi","Jeudi","Vendredi","Samedi","Dimanche"]
@@ -616,10 +477,10 @@ def show_planning_global():
             if ligne not in planning or planning[ligne].empty:
                 st.metric(ligne,"0 OF","—")
             else:
-                df=planning[ligne]
-                tot=df["duree_h"].sum()
-                nb=df[~df["is_intro"]]["Ofs"].nunique()
-                ni=len(df[df["is_intro"]])
+                seg=planning[ligne]
+                tot=seg.duree_h.sum()
+                nb=pd.Series(seg.column("Ofs")[~seg.is_intro]).nunique()
+                ni=int(seg.is_intro.sum())
                 st.metric(ligne,f"{nb} OFs",f"{tot:.1f}h total")
                 if ni>0: st.caption(f"+ {ni} INTRO")
 
@@ -629,12 +490,13 @@ def show_planning_global():
     # KPIs
     # -----------------------------------------------------
     st.markdown("### 📈 Indicateurs clés de la semaine")
+    frames={l:segment_frame(planning[l],l) for l in planning}
     c1,c2,c3,c4=st.columns(4)
 
     # ML MOYEN IMPRIMERIE
     with c1:
         if "Imprimerie" in planning and not planning["Imprimerie"].empty:
-            df=planning["Imprimerie"]
+            df=frames["Imprimerie"]
             uniq=df[~df["is_intro"]].drop_duplicates(subset=["Ofs"])
             ml = pd.to_numeric(uniq["Ml"],errors="coerce").sum()
             nb=len(uniq)
@@ -645,7 +507,7 @@ def show_planning_global():
     # GRAINEURS L2
     with c2:
         if "Ligne 2" in planning and not planning["Ligne 2"].empty:
-            df=planning["Ligne 2"]
+            df=frames["Ligne 2"]
             grains=[g for g in df["GRAIN"].unique() if str(g).strip()]
             st.metric("🔧 Graineurs L2",f"{len(grains)}")
         else:
@@ -654,7 +516,7 @@ def show_planning_global():
     # CICD01 L1
     with c3:
         if "Ligne 1" in planning and not planning["Ligne 1"].empty:
-            df=planning["Ligne 1"]
+            df=frames["Ligne 1"]
             d1=df[df["Produit"].str.contains("CICD01",na=False)]
             uniq=d1.drop_duplicates(subset=["Ofs"])
             ml=pd.to_numeric(uniq["Ml"],errors="coerce").sum()
@@ -665,7 +527,7 @@ def show_planning_global():
     # CICD04 L1
     with c4:
         if "Ligne 1" in planning and not planning["Ligne 1"].empty:
-            df=planning["Ligne 1"]
+            df=frames["Ligne 1"]
             d1=df[df["Produit"].str.contains("CICD04",na=False)]
             uniq=d1.drop_duplicates(subset=["Ofs"])
             ml=pd.to_numeric(uniq["Ml"],errors="coerce").sum()
@@ -681,6 +543,6 @@ def show_planning_global():
             if l in planning and not planning[l].empty:
                 st.markdown(f"**{l}** — {len(planning[l])} segments")
                 st.dataframe(
-                    planning[l][["Ofs","Produit","Campagne","Ml","start","end","duree_h"]],
+                    frames[l][["Ofs","Produit","Campagne","Ml","start","end","duree_h"]],
                     use_container_width=True
                 )
\ No newline at end of file
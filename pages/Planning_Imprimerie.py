@@ -6,28 +6,26 @@
 # 1) IMPORTS & CONFIG
 # --------------------------------------------
 import streamlit as st
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
-from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
 
 from pages.utils import (
-    load_suivi_of,
-    get_ofs_exclus,
-    get_statut_dict,
+    suivi_ligne,
     get_stock_supports,
     is_statut_actif,
     STATUT_ACTIF,
     SUPPORTS_L1,
 )
-
-# Adapter le chemin si besoin
-BASE_PATH = Path(
-    r"C:\Users\yannick.tetard\OneDrive - GERFLOR\Desktop\Planning Streamlit\xarpediem2684-repo-main"
-)
-OFS_IMP_FILE = BASE_PATH / "OFs_Imprimerie.xlsx"
-CAL_FILE = BASE_PATH / "Calendrier 2026 imprimerie.xlsx"
+from pages.data_access import load_ligne, require_uap_folder
+from pages.calendrier import calendrier_ligne
+from pages.gantt import add_bars, add_blocks, add_lines, add_pastilles, paper_y
+from pages.scheduler import IncrementalPlan, attach_columns, durations_from
+from pages.plan_cache import cached_plan, now_bucket
+from pages.plan_store import order_base, reset_order, sync_order
+from pages.writeback import get_writeback, show_write_status
 
 LIGNE_NAME = "Imprimerie"
 
@@ -55,6 +53,8 @@ DEFAULT_TEXT_COLOR = "#000000"
 
 INTRO_DUREE_H = 2.3
 
+GANTT_HEIGHT = 350  # px (marges haut + bas : 100 px)
+
 # ============================================
 # 3) FONCTIONS UTILITAIRES
 # ============================================
@@ -80,158 +80,35 @@ def is_double_trait(campagne_str):
     up = campagne_str.upper()
     return "TARABUS" in up or "TMAX" in up
 
-def parse_horaire(jour, horaire_str):
-    """Retourne start,end à partir d'un '12h30-20h30' """
-    debut_str, fin_str = horaire_str.split("-")
-    debut_str = debut_str.replace("h", ":")
-    fin_str = fin_str.replace("h", ":")
-    start = datetime.combine(jour.date(), datetime.strptime(debut_str, "%H:%M").time())
-    end = datetime.combine(jour.date(), datetime.strptime(fin_str, "%H:%M").time())
-    if end <= start:
-        end += timedelta(days=1)
-    return start, end
-def build_open_slots_from_now(cal_df, horizon_days=14, now=None):
-    """Retourne une liste ordonnée de créneaux OUVERT."""
-    if now is None:
-        now = datetime.now()
-
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-
-    start_date = now.date()
-    horizon_end = now + timedelta(days=horizon_days)
-    end_date = horizon_end.date()
-
-    mask = (cal["Jour"].dt.date >= start_date) & (cal["Jour"].dt.date <= end_date)
-    sub = cal.loc[mask]
-
-    slots = []
-
-    for _, row in sub.iterrows():
-        jour = row["Jour"]
-        for i in [1, 2, 3]:
-            etat_col = f"Etat_{i}"
-            hor_col = f"Horaire_{i}"
-
-            if etat_col in row and hor_col in row:
-                etat = row[etat_col]
-                h = row[hor_col]
-
-                if etat == "OUVERT" and isinstance(h, str) and "-" in h:
-                    start, end = parse_horaire(jour, h)
-
-                    if end <= now:
-                        continue
-
-                    if start < now < end:
-                        start = now
-
-                    if start < horizon_end:
-                        end = min(end, horizon_end)
-                        slots.append({"start": start, "end": end})
-
-    slots = sorted(slots, key=lambda x: x["start"])
-    return slots
-
-
-def schedule_ofs_from_slots(ofs_df, slots):
-    """Planifie les OFs dans les créneaux 'slots'. Pas d'INTRO à l'imprimerie."""
-    from datetime import timedelta
-
-    planning_rows = []
-    if not slots:
+def schedule_ofs_from_slots(ofs_df, slots, state=None):
+    """Planifie les OFs dans les créneaux 'slots'. Pas d'INTRO à l'imprimerie.
+    'state' (IncrementalPlan) : ne replanifie qu'à partir du premier OF changé."""
+    if ofs_df.empty or not len(slots):
         return pd.DataFrame()
 
-    slot_idx = 0
-    current_slot_start = slots[0]["start"]
-    current_slot_end = slots[0]["end"]
-
-    def consume_time(duration_h):
-        nonlocal slot_idx, current_slot_start, current_slot_end
-        segments = []
-        remaining = timedelta(hours=duration_h)
-        seg = 1
-
-        while remaining > timedelta(0):
-            if slot_idx >= len(slots):
-                return segments, False
-
-            available = current_slot_end - current_slot_start
-
-            if available <= timedelta(0):
-                slot_idx += 1
-                if slot_idx >= len(slots):
-                    return segments, False
-
-                current_slot_start = slots[slot_idx]["start"]
-                current_slot_end = slots[slot_idx]["end"]
-                continue
-
-            use = min(available, remaining)
-            start = current_slot_start
-            end = start + use
-
-            segments.append(
-                {
-                    "start": start,
-                    "end": end,
-                    "duree_h": use.total_seconds() / 3600.0,
-                    "segment": seg,
-                }
-            )
-
-            seg += 1
-            remaining -= use
-            current_slot_start = end
-
-        return segments, True
-
-    for _, row in ofs_df.iterrows():
-        of_id = row["ID_PLAN"]
-        coloris = row["Coloris"]
-        support = row["Support"]
-        campagne = row.get("Campagne", "")
-        ml = row["Ml"]
-        duree_h = float(row["Temps en h"]) if pd.notna(row["Temps en h"]) else 0.0
-
-        trait_color = get_trait_color(campagne)
-        double_trait = is_double_trait(campagne)
-
-        of_segments, ok = consume_time(duree_h)
-
-        for seg_data in of_segments:
-            planning_rows.append(
-                {
-                    "Ofs": of_id,
-                    "Segment": seg_data["segment"],
-                    "Coloris": coloris,
-                    "Support": support,
-                    "Campagne": campagne,
-                    "Ml": ml,
-                    "start": seg_data["start"],
-                    "end": seg_data["end"],
-                    "duree_h": seg_data["duree_h"],
-                    "is_intro": False,
-                    "trait_color": trait_color,
-                    "double_trait": double_trait,
-                }
-            )
-
-        if not ok:
-            return pd.DataFrame(planning_rows)
-
-    return pd.DataFrame(planning_rows)
+    ofs_df = ofs_df.reset_index(drop=True)
+    segments = (state or IncrementalPlan()).plan(ofs_df["ID_PLAN"], durations_from(ofs_df), slots)
+    planning = attach_columns(
+        segments,
+        ofs_df,
+        {"Ofs": "ID_PLAN", "Coloris": "Coloris", "Support": "Support", "Campagne": "Campagne", "Ml": "Ml"},
+    )
+    campagnes = planning["Campagne"]
+    planning["trait_color"] = campagnes.map({c: get_trait_color(c) for c in campagnes.unique()})
+    planning["double_trait"] = campagnes.map({c: is_double_trait(c) for c in campagnes.unique()}).astype(bool)
+    return planning[[
+        "Ofs", "Segment", "Coloris", "Support", "Campagne", "Ml",
+        "start", "end", "duree_h", "is_intro", "trait_color", "double_trait",
+    ]]
 
 
 # ============================================
 # 4) CHARGEMENT DONNÉES
 # ============================================
 
-@st.cache_data(ttl=7200)
 def load_data():
-    ofs_imp = pd.read_excel(OFS_IMP_FILE, engine="openpyxl")
-    cal = pd.read_excel(CAL_FILE, engine="openpyxl")
-    return ofs_imp, cal
+    """OFs Imprimerie + calendrier imprimerie, servis par le repository partagé."""
+    return load_ligne("Imprimerie")
 
 
 # ============================================
@@ -250,17 +127,19 @@ def show_planning_imprimerie():
             st.session_state["page"] = "menu"
             st.rerun()
 
+    require_uap_folder()
+
     # Charger les données
     ofs_imp_df, cal_df = load_data()
-    suivi_df = load_suivi_of()
+    suivi = suivi_ligne("Imprimerie")
 
     # Filtrer OFs terminés (<200 ML, statuts 60/61/99)
-    ofs_exclus = get_ofs_exclus(suivi_df, "IMPRIMERIE|L09")
+    ofs_exclus = suivi.exclus
     ofs_imp_df = ofs_imp_df[~ofs_imp_df["Ofs"].isin(ofs_exclus)]
 
     # Statuts / stocks
-    statut_dict = get_statut_dict(suivi_df, "IMPRIMERIE|L09")
-    stock_supports = get_stock_supports(suivi_df)
+    statut_dict = suivi.statut
+    stock_supports = get_stock_supports()
 
     # ID unique
     ofs_imp_df["ID_PLAN"] = (
@@ -278,9 +157,8 @@ def show_planning_imprimerie():
     with st.expander("Données OFs Imprimerie"):
         st.dataframe(ofs_imp_df)
 
-    # Sauvegarde ordre original
-    if "ofs_list_original_IMP" not in st.session_state:
-        st.session_state.ofs_list_original_IMP = list(ofs_imp_df["ID_PLAN"].values)
+    # Liste d'ID_PLAN de la version affichée
+    st.session_state.ofs_list_original_IMP = list(ofs_imp_df["ID_PLAN"].values)
 
     id_to_label = dict(zip(ofs_imp_df["ID_PLAN"], ofs_imp_df["DISPLAY_LABEL"]))
     id_to_campagne = dict(zip(ofs_imp_df["ID_PLAN"], ofs_imp_df["Campagne"]))
@@ -288,11 +166,11 @@ def show_planning_imprimerie():
     # --- Réorganisation manuelle ---
     st.markdown("### 🔁 Réorganisation manuelle (OF ou Campagne)")
 
-    if "ordre_ofs_IMP" not in st.session_state:
-        st.session_state.ordre_ofs_IMP = list(ofs_imp_df["ID_PLAN"].values)
-        st.session_state.ordre_ofs_origine_IMP = (
-            st.session_state.ordre_ofs_IMP.copy()
-        )
+    # Ordre de la session aligné sur la dernière version enregistrée
+    sync_order(
+        "ofs_imprimerie", "ordre_ofs_IMP", "ordre_ofs_origine_IMP",
+        list(ofs_imp_df["ID_PLAN"]),
+    )
 
     ordre = st.session_state.ordre_ofs_IMP
 
@@ -454,9 +332,7 @@ def show_planning_imprimerie():
         if st.button(
             "Réinitialiser l'ordre (Excel)", use_container_width=True, key="reset_IMP"
         ):
-            st.session_state.ordre_ofs_IMP = (
-                st.session_state.ordre_ofs_origine_IMP.copy()
-            )
+            reset_order("ordre_ofs_IMP", "ordre_ofs_origine_IMP")
             st.info("Ordre réinitialisé à l'ordre Excel d'origine.")
 
     with col_backup:
@@ -470,45 +346,28 @@ def show_planning_imprimerie():
             use_container_width=True,
             key="save_IMP",
         ):
-            try:
-                ordre_final = st.session_state.ordre_ofs_IMP
-
-                if sorted(ordre_final) != sorted(
-                    st.session_state.ofs_list_original_IMP
-                ):
-                    st.error(
-                        "❌ L'ordre ne correspond pas exactement aux OFs d'origine."
-                    )
-                    st.stop()
-
-                df_excel = pd.read_excel(OFS_IMP_FILE, engine="openpyxl")
-                df_excel["ID_PLAN"] = (
-                    df_excel.index.astype(str) + "_" + df_excel["Ofs"].astype(str)
-                )
-
-                if backup_before_save:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    backup_path = (
-                        BASE_PATH
-                        / f"OFs_Imprimerie_backup_{timestamp}.xlsx"
-                    )
-                    df_excel.drop(columns=["ID_PLAN"]).to_excel(
-                        backup_path, index=False, engine="openpyxl"
-                    )
-
-                df_excel = df_excel.set_index("ID_PLAN")
-                df_excel = df_excel.loc[ordre_final].reset_index(drop=True)
-                df_excel.to_excel(OFS_IMP_FILE, index=False, engine="openpyxl")
+            ordre_final = st.session_state.ordre_ofs_IMP
 
-                st.success(
-                    "✅ L'ordre a été appliqué et OFs_Imprimerie.xlsx a été mis à jour !"
+            if sorted(ordre_final) != sorted(
+                st.session_state.ofs_list_original_IMP
+            ):
+                st.error(
+                    "❌ L'ordre ne correspond pas exactement aux OFs d'origine."
                 )
+                st.stop()
+
+            # Écriture atomique en arrière-plan (journal d'ordres si sauvegarde),
+            # depuis la version de départ de la session
+            base_version, base = order_base("ordre_ofs_IMP", "ordre_ofs_origine_IMP")
+            st.session_state.ecriture_IMP = get_writeback().submit_order(
+                "ofs_imprimerie", ordre_final, backup=backup_before_save,
+                base_version=base_version, base=base,
+            )
 
-                st.session_state.ofs_list_original_IMP = ordre_final.copy()
-                st.session_state.ordre_ofs_origine_IMP = ordre_final.copy()
-
-            except Exception as e:
-                st.error(f"❌ Erreur lors de la mise à jour du fichier : {e}")
+        show_write_status(
+            "ecriture_IMP",
+            "✅ L'ordre a été appliqué et OFs_Imprimerie.xlsx a été mis à jour !",
+        )
 
     # --- ORDRE COURANT ---
     with st.expander("Ordre courant des OFs (appliqué au planning)"):
@@ -520,13 +379,14 @@ def show_planning_imprimerie():
     # -------------------------
     # Créneaux ouverts
     # -------------------------
-    now = datetime.now()
+    now = now_bucket()
     horizon_days = 14
     horizon_end = now + timedelta(days=horizon_days)
 
     st.markdown(f"**🕒 Maintenant : {now.strftime('%d/%m/%Y %H:%M')}**")
 
-    slots = build_open_slots_from_now(cal_df, horizon_days=horizon_days, now=now)
+    calendrier = calendrier_ligne("Imprimerie")
+    slots = calendrier.open_slots(now, horizon_end)
 
     if not slots:
         st.error("Aucun créneau OUVERT trouvé dans les 14 prochains jours.")
@@ -539,51 +399,7 @@ def show_planning_imprimerie():
         ofs_imp_df.index.astype(str) + "_" + ofs_imp_df["Ofs"].astype(str)
     )
 
-    if "ordre_ofs_IMP" not in st.session_state:
-        st.session_state.ordre_ofs_IMP = list(ofs_imp_df["ID_PLAN"].values)
-
     current_ids = set(ofs_imp_df["ID_PLAN"])
-    saved_order = st.session_state.ordre_ofs_IMP
-    ids_missing = [x for x in saved_order if x not in current_ids]
-
-    def rebuild_order_from_ofs(old_ids, df_ids, ofs_series):
-        ids_by_of = {}
-        for id_val, ofs in zip(df_ids, ofs_series.astype(str)):
-            ids_by_of.setdefault(ofs, []).append(id_val)
-
-        counters = {k: 0 for k in ids_by_of}
-
-        new_order = []
-        for old in old_ids:
-            ofs = str(old).split("_")[-1]
-            if ofs in ids_by_of and counters[ofs] < len(ids_by_of[ofs]):
-                new_order.append(ids_by_of[ofs][counters[ofs]])
-                counters[ofs] += 1
-
-        remaining = [i for i in df_ids if i not in set(new_order)]
-        return new_order + remaining
-
-    if ids_missing:
-        try:
-            repaired = rebuild_order_from_ofs(
-                saved_order,
-                list(ofs_imp_df["ID_PLAN"]),
-                ofs_imp_df["Ofs"],
-            )
-
-            if len(repaired) == len(ofs_imp_df) and len(set(repaired)) == len(
-                repaired
-            ):
-                st.session_state.ordre_ofs_IMP = repaired
-                st.success("Ordre Imprimerie réparé automatiquement.")
-            else:
-                raise Exception("Reconstruction partielle")
-
-        except Exception:
-            st.warning(
-                "⚠️ Ordre Imprimerie incompatible — réinitialisation totale."
-            )
-            st.session_state.ordre_ofs_IMP = list(ofs_imp_df["ID_PLAN"])
 
     ordre_final_imp = [
         x for x in st.session_state.ordre_ofs_IMP if x in current_ids
@@ -597,7 +413,12 @@ def show_planning_imprimerie():
     ofs_imp_work = ofs_imp_work.loc[
         st.session_state.ordre_ofs_IMP
     ].reset_index()
-    planning_df = schedule_ofs_from_slots(ofs_imp_work, slots)
+    plan_state = st.session_state.setdefault("plan_ofs_IMP", IncrementalPlan())
+    planning_df = cached_plan(
+        "Imprimerie", ofs_imp_work, now, horizon_end,
+        lambda: schedule_ofs_from_slots(ofs_imp_work, slots, state=plan_state),
+        variant="page",
+    )
 
     if planning_df.empty:
         st.warning("Planning Imprimerie vide : pas assez de créneaux.")
@@ -660,140 +481,53 @@ def show_planning_imprimerie():
 
     fig = go.Figure()
 
-    for _, row in plot_df.iterrows():
-        start = row["start"]
-        end = row["end"]
-        label = row["Label"]
-        is_intro = row.get("is_intro", False)
-        trait_color = row.get("trait_color", DEFAULT_TRAIT_COLOR)
-        double_trait = row.get("double_trait", False)
-
-        bar_color = "#F0F0F0" if is_intro else "#FFFFFF"
-
-        # BARRE PRINCIPALE
-        fig.add_trace(
-            go.Bar(
-                x=[(end - start).total_seconds() * 1000],
-                y=[LIGNE_NAME],
-                base=[start],
-                orientation="h",
-                marker=dict(
-                    color=bar_color, line=dict(color="#000000", width=1)
-                ),
-                text=label,
-                textposition="inside",
-                insidetextanchor="middle",
-                textfont=dict(size=9, color="#000000", family="Arial"),
-                hovertemplate=f"<b>Détail :</b><br>{label}<extra></extra>",
-                showlegend=False,
-            )
-        )
+    is_intro = plot_df["is_intro"].astype(bool)
+    reel = plot_df[~is_intro]
+
+    # BARRES PRINCIPALES (une seule trace)
+    add_bars(
+        fig,
+        LIGNE_NAME,
+        plot_df["start"],
+        plot_df["end"],
+        color=np.where(is_intro, "#F0F0F0", "#FFFFFF"),
+        text=plot_df["Label"],
+        hover="<b>Détail :</b><br>" + plot_df["Label"],
+        font_family="Arial",
+    )
 
-        # PASTILLE VERTE STATUTS
-        if not is_intro:
-            of_num = row["Ofs"]
-            if isinstance(of_num, str) and "_" in of_num:
-                try:
-                    of_num = int(of_num.split("_")[-1])
-                except:
-                    of_num = None
-
-            if of_num and is_statut_actif(of_num, statut_dict):
-                mid_time = start + (end - start) / 2
-                fig.add_annotation(
-                    x=mid_time,
-                    y="Imprimerie",
-                    yshift=-35,
-                    text="🟢",
-                    showarrow=False,
-                    font=dict(size=12),
-                    xref="x",
-                    yref="y",
-                )
+    # PASTILLES VERTES STATUTS
+    of_nums = pd.to_numeric(reel["Ofs"].astype(str).str.split("_").str[-1], errors="coerce")
+    actif = [
+        pd.notna(n) and n != 0 and is_statut_actif(int(n), statut_dict) for n in of_nums
+    ]
+    pastilles = reel[actif]
+    add_pastilles(
+        fig,
+        pastilles["start"] + (pastilles["end"] - pastilles["start"]) / 2,
+        paper_y(0, 1, shift_px=-35, plot_height_px=GANTT_HEIGHT - 100),
+    )
 
-        # TRAITS COLORES (simple ou double)
-        if not is_intro:
-            if double_trait:
-                fig.add_shape(
-                    type="line",
-                    x0=start,
-                    x1=end,
-                    y0=0.33,
-                    y1=0.33,
-                    yref="paper",
-                    line=dict(color=trait_color, width=3),
-                )
-                fig.add_shape(
-                    type="line",
-                    x0=start,
-                    x1=end,
-                    y0=0.67,
-                    y1=0.67,
-                    yref="paper",
-                    line=dict(color=trait_color, width=3),
-                )
-            else:
-                fig.add_shape(
-                    type="line",
-                    x0=start,
-                    x1=end,
-                    y0=0.5,
-                    y1=0.5,
-                    yref="paper",
-                    line=dict(color=trait_color, width=3),
-                )
+    # TRAITS COLORES (simple ou double)
+    double = reel["double_trait"].astype(bool)
+    traits = pd.concat([
+        reel[~double].assign(y=0.5),
+        reel[double].assign(y=0.33),
+        reel[double].assign(y=0.67),
+    ])
+    add_lines(fig, traits["start"], traits["end"], traits["y"], traits["trait_color"].fillna(DEFAULT_TRAIT_COLOR))
 
     # ARRETS (ROUGE)
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-    mask_cal = (cal["Jour"].dt.date >= now.date()) & (
-        cal["Jour"].dt.date <= horizon_end.date()
+    arret_s, arret_e = calendrier.closed_arrays(now, horizon_end)
+    add_blocks(
+        fig,
+        arret_s,
+        arret_e,
+        color="#ff0000",
+        opacity=0.95,
+        text="ARRET",
+        font=dict(color="white", size=12, family="Arial Black"),
     )
-    sub_cal = cal.loc[mask_cal]
-
-    for _, row_cal in sub_cal.iterrows():
-        jour = row_cal["Jour"]
-        for i in [1, 2, 3]:
-            etat_col = f"Etat_{i}"
-            hor_col = f"Horaire_{i}"
-
-            if row_cal.get(etat_col, "FERME") == "FERME":
-                h = row_cal[hor_col]
-
-                if isinstance(h, str) and "-" in h:
-                    start_arret, end_arret = parse_horaire(jour, h)
-
-                    if end_arret <= now or start_arret >= horizon_end:
-                        continue
-
-                    if start_arret < now:
-                        start_arret = now
-
-                    if end_arret > horizon_end:
-                        end_arret = horizon_end
-
-                    fig.add_shape(
-                        type="rect",
-                        x0=start_arret,
-                        x1=end_arret,
-                        y0=0.05,
-                        y1=0.95,
-                        xref="x",
-                        yref="paper",
-                        fillcolor="#ff0000",
-                        opacity=0.95,
-                        line_width=0,
-                    )
-
-                    fig.add_annotation(
-                        x=start_arret + (end_arret - start_arret) / 2,
-                        y=0.5,
-                        xref="x",
-                        yref="paper",
-                        text="ARRET",
-                        showarrow=False,
-                        font=dict(color="white", size=12, family="Arial Black"),
-                    )
 
     # AXES
     fig.update_xaxes(
@@ -851,7 +585,7 @@ def show_planning_imprimerie():
     )
 
     fig.update_layout(
-        height=350,
+        height=GANTT_HEIGHT,
         margin=dict(l=10, r=10, t=60, b=40),
         plot_bgcolor="#444444",
         paper_bgcolor="#444444",
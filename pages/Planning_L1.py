@@ -8,18 +8,19 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
-from pages.utils import load_suivi_of, get_ofs_exclus, get_statut_dict, is_statut_actif, STATUT_ACTIF
+from pages.utils import suivi_ligne, is_statut_actif, STATUT_ACTIF
+from pages.data_access import load_ligne, require_uap_folder
+from pages.calendrier import calendrier_ligne
+from pages.gantt import CLIENT_SCROLL_CONFIG, client_scroll, in_viewport, viewport
+from pages.scheduler import IncrementalPlan, attach_columns, durations_from, intro_produit_l1
+from pages.plan_cache import cached_plan, now_bucket
+from pages.plan_store import order_base, reset_order, sync_order
+from pages.writeback import get_writeback, show_write_status
 
 # st.set_page_config dans app.py
 
-# 👉 Adapter ce chemin si besoin sur ton poste
-BASE_PATH = Path(r"C:\\Users\\yannick.tetard\\OneDrive - GERFLOR\\Desktop\\Planning Streamlit\\xarpediem2684-repo-main")
-OFS_L1_FILE = BASE_PATH / "OFs_L1.xlsx"
-CAL_FILE = BASE_PATH / "Calendrier 2026 L1.xlsx"
-
 LIGNE_NAME = "Ligne 1"  # nom affiché sur le Gantt
 
 # ============================================
@@ -59,213 +60,38 @@ INTRO_DUREE_H = 2.3
 # 3) FONCTIONS UTILITAIRES
 # ============================================
 
-def parse_horaire(jour, horaire_str):
-    """'jour' = Timestamp (date du jour)
-    'horaire_str' = '12h30-20h30' -> (start_datetime, end_datetime)"""
-    debut_str, fin_str = horaire_str.split('-')
-    debut_str = debut_str.replace('h', ':')
-    fin_str = fin_str.replace('h', ':')
-    start = datetime.combine(jour.date(), datetime.strptime(debut_str, "%H:%M").time())
-    end = datetime.combine(jour.date(), datetime.strptime(fin_str, "%H:%M").time())
-    if end <= start:
-        end += timedelta(days=1)
-    return start, end
-
-
-def build_open_slots_from_now(cal_df, horizon_days=14, now=None):
-    """Retourne une liste ordonnée de créneaux OUVERT :
-    [{'start': datetime, 'end': datetime}, ...] à partir de 'now' sur horizon_days."""
-    if now is None:
-        now = datetime.now()
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-
-    start_date = now.date()
-    horizon_end = now + timedelta(days=horizon_days)
-    end_date = horizon_end.date()
-
-    mask = (cal["Jour"].dt.date >= start_date) & (cal["Jour"].dt.date <= end_date)
-    sub = cal.loc[mask]
-
-    slots = []
-    for _, row in sub.iterrows():
-        jour = row["Jour"]
-        for i in [1, 2, 3]:
-            etat_col = f"Etat_{i}"
-            hor_col = f"Horaire_{i}"
-            if etat_col in row and hor_col in row:
-                etat = row[etat_col]
-                h = row[hor_col]
-                if etat == "OUVERT" and isinstance(h, str) and "-" in h:
-                    start, end = parse_horaire(jour, h)
-                    if end <= now:
-                        continue
-                    if start < now < end:
-                        start = now
-                    if start < horizon_end:
-                        end = min(end, horizon_end)
-                        slots.append({"start": start, "end": end})
-    slots = sorted(slots, key=lambda x: x["start"])
-    return slots
-
-
-def needs_intro(prev_produit, curr_produit):
-    """Détermine si une INTRO est nécessaire entre deux produits.
-    INTRO seulement quand :
-    - Changement entre CICD et CIMD (dans les deux sens)
-    - Changement entre CICDMD et CICD (dans les deux sens)
-    - Passage de 3M à 4M (pas l'inverse)
-    """
-    if not prev_produit or not curr_produit:
-        return False
-
-    prev = str(prev_produit).upper()
-    curr = str(curr_produit).upper()
-
-    def get_support_type(p):
-        if "CICDMD" in p:
-            return "CICDMD"
-        elif "CIMD" in p:
-            return "CIMD"
-        elif "CICD" in p:
-            return "CICD"
-        return "OTHER"
-
-    def get_largeur(p):
-        if "3M" in p:
-            return "3M"
-        elif "4M" in p:
-            return "4M"
-        return "UNKNOWN"
-
-    prev_type = get_support_type(prev)
-    curr_type = get_support_type(curr)
-    prev_larg = get_largeur(prev)
-    curr_larg = get_largeur(curr)
-
-    if (prev_type == "CICD" and curr_type == "CIMD") or (prev_type == "CIMD" and curr_type == "CICD"):
-        return True
-    if (prev_type == "CICDMD" and curr_type == "CICD") or (prev_type == "CICD" and curr_type == "CICDMD"):
-        return True
-    if (prev_type == "CICDMD" and curr_type == "CIMD") or (prev_type == "CIMD" and curr_type == "CICDMD"):
-        return True
-    if prev_larg == "3M" and curr_larg == "4M":
-        return True
-    return False
-
-
-def schedule_ofs_from_slots(ofs_df, slots):
+def schedule_ofs_from_slots(ofs_df, slots, state=None):
     """Planifie les OFs (dans l'ordre fourni) dans les créneaux 'slots'.
-    Insère automatiquement une INTRO selon les règles métier.
+    Insère automatiquement une INTRO selon les règles métier (intro_produit_l1).
+    'state' (IncrementalPlan) : ne replanifie qu'à partir du premier OF changé.
     Retourne un DataFrame de segments."""
-    from datetime import timedelta
-
-    planning_rows = []
-    if not slots:
+    if ofs_df.empty or not len(slots):
         return pd.DataFrame()
 
-    slot_idx = 0
-    current_slot_start = slots[0]["start"]
-    current_slot_end = slots[0]["end"]
-
-    previous_produit = None
-    intro_counter = 0
-
-    def consume_time(duration_h):
-        """Consomme du temps dans les créneaux et retourne les segments créés."""
-        nonlocal slot_idx, current_slot_start, current_slot_end
-        segments = []
-        remaining = timedelta(hours=duration_h)
-        seg = 1
-
-        while remaining > timedelta(0):
-            if slot_idx >= len(slots):
-                return segments, False  # Plus de créneaux
-
-            available = current_slot_end - current_slot_start
-            if available <= timedelta(0):
-                slot_idx += 1
-                if slot_idx >= len(slots):
-                    return segments, False
-                current_slot_start = slots[slot_idx]["start"]
-                current_slot_end = slots[slot_idx]["end"]
-                continue
-
-            use = min(available, remaining)
-            start = current_slot_start
-            end = start + use
-
-            segments.append({
-                "start": start,
-                "end": end,
-                "duree_h": use.total_seconds() / 3600.0,
-                "segment": seg,
-            })
-
-            seg += 1
-            remaining -= use
-            current_slot_start = end
-
-        return segments, True
-
-    for _, row in ofs_df.iterrows():
-        current_produit = row.get("Produit", None)
-
-        # INTRO ?
-        if needs_intro(previous_produit, current_produit):
-            intro_counter += 1
-            intro_segments, ok = consume_time(INTRO_DUREE_H)
-            for seg_data in intro_segments:
-                planning_rows.append({
-                    "Ofs": f"INTRO_{intro_counter}",
-                    "Segment": seg_data["segment"],
-                    "Produit": "INTRO",
-                    "Ml": "",
-                    "Campagne": "",
-                    "start": seg_data["start"],
-                    "end": seg_data["end"],
-                    "duree_h": seg_data["duree_h"],
-                    "is_intro": True,
-                })
-            if not ok:
-                return pd.DataFrame(planning_rows)
-
-        previous_produit = current_produit
-
-        # Planifier l'OF
-        of_id = row["ID_PLAN"]
-        produit = row["Produit"]
-        ml = row["Ml"]
-        campagne = row.get("Campagne", "")
-        duree_h = float(row["Temps en h"]) if pd.notna(row["Temps en h"]) else 0.0
-
-        of_segments, ok = consume_time(duree_h)
-        for seg_data in of_segments:
-            planning_rows.append({
-                "Ofs": of_id,
-                "Segment": seg_data["segment"],
-                "Produit": produit,
-                "Ml": ml,
-                "Campagne": campagne,
-                "start": seg_data["start"],
-                "end": seg_data["end"],
-                "duree_h": seg_data["duree_h"],
-                "is_intro": False,
-            })
-        if not ok:
-            return pd.DataFrame(planning_rows)
-
-    return pd.DataFrame(planning_rows)
+    ofs_df = ofs_df.reset_index(drop=True)
+    segments = (state or IncrementalPlan()).plan(
+        ofs_df["ID_PLAN"],
+        durations_from(ofs_df),
+        slots,
+        intro=intro_produit_l1(ofs_df["Produit"]),
+        intro_h=INTRO_DUREE_H,
+    )
+    planning = attach_columns(
+        segments,
+        ofs_df,
+        {"Ofs": "ID_PLAN", "Produit": "Produit", "Ml": "Ml", "Campagne": "Campagne"},
+        intro_values={"Produit": "INTRO"},
+    )
+    planning["Ofs"] = planning["Ofs"].where(~planning["is_intro"], "INTRO_" + planning["intro_no"].astype(str))
+    return planning[["Ofs", "Segment", "Produit", "Ml", "Campagne", "start", "end", "duree_h", "is_intro"]]
 
 
 # ============================================
 # 4) CHARGEMENT DONNÉES
 # ============================================
-@st.cache_data(ttl=7200)
 def load_data():
-    ofs_l1 = pd.read_excel(OFS_L1_FILE, engine="openpyxl")
-    cal = pd.read_excel(CAL_FILE, engine="openpyxl")
-    return ofs_l1, cal
+    """OFs L1 + calendrier L1, servis par le repository partagé."""
+    return load_ligne("Ligne 1")
 
 
 # ============================================
@@ -284,17 +110,19 @@ def show_planning_l1():
             st.session_state["page"] = "menu"
             st.rerun()
 
+    require_uap_folder()
+
     ofs_l1_df, cal_df = load_data()
 
     # Charger SUIVI_OF pour statuts
-    suivi_df = load_suivi_of()
+    suivi = suivi_ligne("Ligne 1")
 
     # Filtrer les OFs terminés (60, 61, 99) et < 200 ML
-    ofs_exclus = get_ofs_exclus(suivi_df, "LIGNE1|L06")
+    ofs_exclus = suivi.exclus
     ofs_l1_df = ofs_l1_df[~ofs_l1_df["Ofs"].isin(ofs_exclus)]
 
     # Dict des statuts pour pastilles vertes
-    statut_dict = get_statut_dict(suivi_df, "LIGNE1|L06")
+    statut_dict = suivi.statut
 
     # Génère un identifiant unique pour chaque ligne
     ofs_l1_df["ID_PLAN"] = ofs_l1_df.index.astype(str) + "_" + ofs_l1_df["Ofs"].astype(str)
@@ -309,9 +137,8 @@ def show_planning_l1():
     with st.expander("Données OFs L1"):
         st.dataframe(ofs_l1_df)
 
-    # Conserve la liste originale d'ID_PLAN
-    if "ofs_list_original_L1" not in st.session_state:
-        st.session_state.ofs_list_original_L1 = list(ofs_l1_df["ID_PLAN"].values)
+    # Liste d'ID_PLAN de la version affichée
+    st.session_state.ofs_list_original_L1 = list(ofs_l1_df["ID_PLAN"].values)
 
     # Mapping ID_PLAN <-> label lisible
     id_to_label = dict(zip(ofs_l1_df["ID_PLAN"], ofs_l1_df["DISPLAY_LABEL"]))
@@ -322,10 +149,8 @@ def show_planning_l1():
     # ---- 5.0 Réorganisation manuelle (OF ou Campagne)
     st.markdown("### 🔁 Réorganisation manuelle (OF ou Campagne)")
 
-    # Initialisation de l'ordre dans la session
-    if "ordre_ofs_L1" not in st.session_state:
-        st.session_state.ordre_ofs_L1 = list(ofs_l1_df["ID_PLAN"].values)
-        st.session_state.ordre_ofs_origine_L1 = st.session_state.ordre_ofs_L1.copy()
+    # Ordre de la session aligné sur la dernière version enregistrée
+    sync_order("ofs_l1", "ordre_ofs_L1", "ordre_ofs_origine_L1", list(ofs_l1_df["ID_PLAN"]))
 
     ordre = st.session_state.ordre_ofs_L1
 
@@ -446,40 +271,35 @@ def show_planning_l1():
     col_reset, col_backup, col_save = st.columns([1, 2, 3])
     with col_reset:
         if st.button("Réinitialiser l'ordre (Excel)", use_container_width=True, key="reset_L1"):
-            st.session_state.ordre_ofs_L1 = st.session_state.ordre_ofs_origine_L1.copy()
+            reset_order("ordre_ofs_L1", "ordre_ofs_origine_L1")
             st.info("Ordre réinitialisé à l'ordre Excel d'origine.")
     with col_backup:
         backup_before_save = st.checkbox("Créer une sauvegarde avant d'écrire", value=True, key="backup_L1")
     with col_save:
         if st.button("📥 Valider l'ordre et mettre à jour OFs_L1.xlsx", use_container_width=True, key="save_L1"):
-            try:
-                ordre_final = st.session_state.ordre_ofs_L1
-                if sorted(ordre_final) != sorted(st.session_state.ofs_list_original_L1):
-                    st.error("❌ L'ordre ne correspond pas exactement aux OFs d'origine.")
-                    st.stop()
-                df_excel = pd.read_excel(OFS_L1_FILE, engine="openpyxl")
-                df_excel["ID_PLAN"] = df_excel.index.astype(str) + "_" + df_excel["Ofs"].astype(str)
-                if backup_before_save:
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    backup_path = BASE_PATH / f"OFs_L1_backup_{timestamp}.xlsx"
-                    df_excel.drop(columns=["ID_PLAN"]).to_excel(backup_path, index=False, engine="openpyxl")
-                df_excel = df_excel.set_index("ID_PLAN")
-                df_excel = df_excel.loc[ordre_final].reset_index(drop=True)
-                df_excel.to_excel(OFS_L1_FILE, index=False, engine="openpyxl")
-                st.success("✅ L'ordre a été appliqué et OFs_L1.xlsx a été mis à jour !")
-                st.session_state.ofs_list_original_L1 = ordre_final.copy()
-                st.session_state.ordre_ofs_origine_L1 = ordre_final.copy()
-            except Exception as e:
-                st.error(f"❌ Erreur lors de la mise à jour du fichier : {e}")
+            ordre_final = st.session_state.ordre_ofs_L1
+            if sorted(ordre_final) != sorted(st.session_state.ofs_list_original_L1):
+                st.error("❌ L'ordre ne correspond pas exactement aux OFs d'origine.")
+                st.stop()
+            # Écriture atomique en arrière-plan (journal d'ordres si sauvegarde),
+            # depuis la version de départ de la session
+            base_version, base = order_base("ordre_ofs_L1", "ordre_ofs_origine_L1")
+            st.session_state.ecriture_L1 = get_writeback().submit_order(
+                "ofs_l1", ordre_final, backup=backup_before_save,
+                base_version=base_version, base=base,
+            )
+
+        show_write_status("ecriture_L1", "✅ L'ordre a été appliqué et OFs_L1.xlsx a été mis à jour !")
 
     # ---- 5.1 Créneaux ouverts ----
-    now = datetime.now()
+    now = now_bucket()
     horizon_days = 14
     horizon_end = now + timedelta(days=horizon_days)
 
     st.markdown(f"**🕒 Maintenant : {now.strftime('%d/%m/%Y %H:%M')}**")
 
-    slots = build_open_slots_from_now(cal_df, horizon_days=horizon_days, now=now)
+    calendrier = calendrier_ligne("Ligne 1")
+    slots = calendrier.open_slots(now, horizon_end)
     if not slots:
         st.error("Aucun créneau OUVERT trouvé dans les 14 prochains jours.")
         st.stop()
@@ -490,50 +310,9 @@ def show_planning_l1():
     # 1) Recréer ID_PLAN frais (au cas où Excel a bougé)
     ofs_l1_df["ID_PLAN"] = ofs_l1_df.index.astype(str) + "_" + ofs_l1_df["Ofs"].astype(str)
 
-    # 2) Initialiser ordre si absent
-    if "ordre_ofs_L1" not in st.session_state:
-        st.session_state.ordre_ofs_L1 = list(ofs_l1_df["ID_PLAN"].values)
-
     current_ids = set(ofs_l1_df["ID_PLAN"])
-    saved_order = st.session_state.ordre_ofs_L1
-
-    # 3) Identifier les IDs manquants (cause du KeyError)
-    ids_missing = [x for x in saved_order if x not in current_ids]
-
-    def rebuild_order_from_ofs(old_ids, df_ids, ofs_series):
-        """Reconstruit un ordre compatible à partir des OFs."""
-        ids_by_of = {}
-        for id_val, ofs in zip(df_ids, ofs_series.astype(str)):
-            ids_by_of.setdefault(ofs, []).append(id_val)
-        counters = {k: 0 for k in ids_by_of}
-        new_order = []
-        for old in old_ids:
-            ofs = str(old).split("_")[-1]
-            if ofs in ids_by_of and counters[ofs] < len(ids_by_of[ofs]):
-                new_order.append(ids_by_of[ofs][counters[ofs]])
-                counters[ofs] += 1
-        remaining = [x for x in df_ids if x not in set(new_order)]
-        return new_order + remaining
-
-    # 4) Correction automatique si incohérence
-    if ids_missing:
-        try:
-            st.info("🔁 Ordre L1 invalide — tentative de réparation...")
-            repaired = rebuild_order_from_ofs(
-                saved_order,
-                list(ofs_l1_df["ID_PLAN"]),
-                ofs_l1_df["Ofs"]
-            )
-            if len(repaired) == len(ofs_l1_df) and len(set(repaired)) == len(repaired):
-                st.session_state.ordre_ofs_L1 = repaired
-                st.success("✅ Ordre réparé automatiquement.")
-            else:
-                raise Exception("Réparation partielle")
-        except Exception:
-            st.warning("⚠️ Impossible de réparer — ordre réinitialisé.")
-            st.session_state.ordre_ofs_L1 = list(ofs_l1_df["ID_PLAN"])
 
-    # 5) Dernier filet de sécurité
+    # 2) Dernier filet de sécurité (l'ordre est aligné par sync_order)
     ordre_final_l1 = st.session_state.ordre_ofs_L1
     ordre_final_l1 = [x for x in ordre_final_l1 if x in current_ids]
     st.session_state.ordre_ofs_L1 = ordre_final_l1
@@ -542,7 +321,12 @@ def show_planning_l1():
     ofs_l1_work = ofs_l1_df.set_index("ID_PLAN")
     ofs_l1_work = ofs_l1_work.loc[st.session_state.ordre_ofs_L1].reset_index()
 
-    planning_df = schedule_ofs_from_slots(ofs_l1_work, slots)
+    plan_state = st.session_state.setdefault("plan_ofs_L1", IncrementalPlan())
+    planning_df = cached_plan(
+        "Ligne 1", ofs_l1_work, now, horizon_end,
+        lambda: schedule_ofs_from_slots(ofs_l1_work, slots, state=plan_state),
+        variant="page",
+    )
     if planning_df.empty:
         st.warning("Planning L1 vide : pas assez de créneaux ouverts pour placer les OFs.")
         st.stop()
@@ -562,13 +346,14 @@ def show_planning_l1():
             f"OF {of_display} - {row['duree_h']:.1f} h"
         )
 
-    # DataFrame pour le Gantt
-    plot_df = planning_df.copy()
-    plot_df["Ligne"] = LIGNE_NAME
-    plot_df["Label"] = plot_df.apply(build_label, axis=1)
-
     # ---- 5.3 Paramètres d'affichage ----
     st.markdown("### 🔎 Fenêtre d'affichage")
+    client_side = st.toggle(
+        "Défilement dans le navigateur",
+        value=True,
+        key="defilement_client_L1",
+        help="Glisser le Gantt ou utiliser la barre du bas pour défiler, molette pour zoomer, sans recharger la page.",
+    )
     largeur_heures = st.selectbox(
         "Largeur de vue",
         [12, 24, 36, 48, 72],
@@ -589,6 +374,16 @@ def show_planning_l1():
     if view_end > horizon_end:
         view_end = horizon_end
 
+    # DataFrame pour le Gantt : seulement les segments de la fenêtre
+    # (tout l'horizon en défilement navigateur)
+    if client_side:
+        win_start, win_end = now, horizon_end
+    else:
+        win_start, win_end = viewport(view_start, view_end)
+    plot_df = in_viewport(planning_df, win_start, win_end).copy()
+    plot_df["Ligne"] = LIGNE_NAME
+    plot_df["Label"] = plot_df.apply(build_label, axis=1) if len(plot_df) else ""
+
     # ---- 5.4 Gantt des OFs ----
     fig = px.timeline(
         plot_df,
@@ -640,49 +435,29 @@ def show_planning_l1():
             )
 
     # ---- ARRETS = créneaux FERMÉ (en rouge) ----
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-    start_date_cal = now.date()
-    end_date_cal = horizon_end.date()
-    mask_cal = (cal["Jour"].dt.date >= start_date_cal) & (cal["Jour"].dt.date <= end_date_cal)
-    sub_cal = cal.loc[mask_cal]
-
-    for _, row_cal in sub_cal.iterrows():
-        jour = row_cal["Jour"]
-        for i in [1, 2, 3]:
-            etat_col = f"Etat_{i}"
-            hor_col = f"Horaire_{i}"
-            if row_cal.get(etat_col, "FERME") == "FERME":
-                h = row_cal[hor_col]
-                if isinstance(h, str) and "-" in h:
-                    start_arret, end_arret = parse_horaire(jour, h)
-                    if end_arret <= now or start_arret >= horizon_end:
-                        continue
-                    if start_arret < now:
-                        start_arret = now
-                    if end_arret > horizon_end:
-                        end_arret = horizon_end
-                    fig.add_shape(
-                        type="rect",
-                        x0=start_arret,
-                        x1=end_arret,
-                        y0=0.05,
-                        y1=0.95,
-                        xref="x",
-                        yref="paper",
-                        fillcolor="#ff0000",
-                        opacity=0.95,
-                        line_width=0,
-                    )
-                    fig.add_annotation(
-                        x=start_arret + (end_arret - start_arret) / 2,
-                        y=0.5,
-                        xref="x",
-                        yref="paper",
-                        text="ARRET 2x8",
-                        showarrow=False,
-                        font=dict(color="white", size=12, family="Arial Black"),
-                    )
+    for arret in calendrier.closed_slots(max(now, win_start), min(horizon_end, win_end)):
+        start_arret, end_arret = arret["start"], arret["end"]
+        fig.add_shape(
+            type="rect",
+            x0=start_arret,
+            x1=end_arret,
+            y0=0.05,
+            y1=0.95,
+            xref="x",
+            yref="paper",
+            fillcolor="#ff0000",
+            opacity=0.95,
+            line_width=0,
+        )
+        fig.add_annotation(
+            x=start_arret + (end_arret - start_arret) / 2,
+            y=0.5,
+            xref="x",
+            yref="paper",
+            text="ARRET 2x8",
+            showarrow=False,
+            font=dict(color="white", size=12, family="Arial Black"),
+        )
 
     # Axe temps
     fig.update_xaxes(
@@ -701,8 +476,8 @@ def show_planning_l1():
 
     # Jours en haut
     JOURS_FR = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
-    current_day = view_start.date()
-    end_day = view_end.date()
+    current_day = (now if client_side else view_start).date()
+    end_day = (horizon_end if client_side else view_end).date()
     day_annotations = []
     while current_day <= end_day:
         day_middle = datetime.combine(current_day, datetime.min.time()) + timedelta(hours=12)
@@ -735,26 +510,31 @@ def show_planning_l1():
         font=dict(color="white"),
     )
 
-    st.plotly_chart(fig, use_container_width=True)
-
-    # Slider de défilement horizontal
-    new_offset = st.slider(
-        "⬅️ Faire défiler le planning ➡️",
-        min_value=0.0,
-        max_value=max(1.0, max_offset),
-        value=float(st.session_state.offset_heures_L1),
-        step=1.0,
-        format="%.0fh",
-        key="slider_defilement_L1"
-    )
+    if client_side:
+        client_scroll(fig, view_start, view_end, now, horizon_end)
+        st.plotly_chart(fig, use_container_width=True, config=CLIENT_SCROLL_CONFIG)
+        st.caption("↔️ Glisser le Gantt ou la barre du bas pour défiler, molette pour zoomer.")
+    else:
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Slider de défilement horizontal
+        new_offset = st.slider(
+            "⬅️ Faire défiler le planning ➡️",
+            min_value=0.0,
+            max_value=max(1.0, max_offset),
+            value=float(st.session_state.offset_heures_L1),
+            step=1.0,
+            format="%.0fh",
+            key="slider_defilement_L1"
+        )
 
-    if new_offset != st.session_state.offset_heures_L1:
-        st.session_state.offset_heures_L1 = new_offset
-        st.rerun()
+        if new_offset != st.session_state.offset_heures_L1:
+            st.session_state.offset_heures_L1 = new_offset
+            st.rerun()
 
-    view_start_display = now + timedelta(hours=new_offset)
-    view_end_display = view_start_display + timedelta(hours=largeur_heures)
-    st.caption(f"📍 Vue : {view_start_display.strftime('%d/%m %Hh')} → {view_end_display.strftime('%d/%m %Hh')}")
+        view_start_display = now + timedelta(hours=new_offset)
+        view_end_display = view_start_display + timedelta(hours=largeur_heures)
+        st.caption(f"📍 Vue : {view_start_display.strftime('%d/%m %Hh')} → {view_end_display.strftime('%d/%m %Hh')}")
 
     # Tableau debug
     with st.expander("Segments planifiés L1 (debug)"):
@@ -8,24 +8,21 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from pathlib import Path
 import plotly.express as px
 import plotly.graph_objects as go
 from pages.utils import (
-    load_suivi_of,
-    get_ofs_exclus,
-    get_statut_dict,
+    suivi_ligne,
     get_fabrique_dict,
     is_statut_actif,
     STATUT_ACTIF,
 )
-
-# 👉 Adapter ce chemin si besoin sur ton poste
-BASE_PATH = Path(
-    r"C:\Users\yannick.tetard\OneDrive - GERFLOR\Desktop\Planning Streamlit\xarpediem2684-repo-main"
-)
-OFS_L2_FILE = BASE_PATH / "OFs_L2.xlsx"
-CAL_FILE = BASE_PATH / "Calendrier 2026.xlsx"
+from pages.data_access import load_ligne, require_uap_folder
+from pages.calendrier import calendrier_ligne
+from pages.gantt import CLIENT_SCROLL_CONFIG, client_scroll, in_viewport, viewport
+from pages.scheduler import IncrementalPlan, attach_columns, durations_from, intro_changement
+from pages.plan_cache import cached_plan, now_bucket
+from pages.plan_store import order_base, reset_order, sync_order
+from pages.writeback import get_writeback, show_write_status
 
 LIGNE_NAME = "Ligne 2"  # nom affiché sur le Gantt
 
@@ -114,170 +111,30 @@ INTRO_COLOR = ("#FFFFFF", "#000000")
 # 3) FONCTIONS UTILITAIRES & SÉCURITÉ
 # ============================================
 
-def parse_horaire(jour, horaire_str):
-    """'jour' = Timestamp (date du jour)
-    'horaire_str' = '12h30-20h30' -> (start_datetime, end_datetime)"""
-    debut_str, fin_str = horaire_str.split("-")
-    debut_str = debut_str.replace("h", ":")
-    fin_str = fin_str.replace("h", ":")
-    start = datetime.combine(jour.date(), datetime.strptime(debut_str, "%H:%M").time())
-    end = datetime.combine(jour.date(), datetime.strptime(fin_str, "%H:%M").time())
-    if end <= start:
-        end += timedelta(days=1)
-    return start, end
-
-
-def build_open_slots_from_now(cal_df, horizon_days=14, now=None):
-    """Retourne une liste ordonnée de créneaux OUVERT :
-    [{'start': datetime, 'end': datetime}, ...] à partir de 'now' sur horizon_days."""
-    if now is None:
-        now = datetime.now()
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-
-    start_date = now.date()
-    end_date = (now + timedelta(days=horizon_days)).date()
-
-    mask = (cal["Jour"].dt.date >= start_date) & (cal["Jour"].dt.date <= end_date)
-    sub = cal.loc[mask]
-
-    horizon_end = now + timedelta(days=horizon_days)
-    slots = []
-
-    for _, row in sub.iterrows():
-        jour = row["Jour"]
-        for i in [1, 2, 3]:
-            etat_col = f"Etat_{i}"
-            hor_col = f"Horaire_{i}"
-            if row.get(etat_col, "FERME") == "OUVERT":
-                h = row[hor_col]
-                if isinstance(h, str) and "-" in h:
-                    start, end = parse_horaire(jour, h)
-                    if end <= now:
-                        continue
-                    if start < now < end:
-                        start = now
-                    if start < horizon_end:
-                        end = min(end, horizon_end)
-                        slots.append({"start": start, "end": end})
-
-    slots = sorted(slots, key=lambda x: x["start"])
-    return slots
-
-
-def schedule_ofs_from_slots(ofs_df, slots):
+def schedule_ofs_from_slots(ofs_df, slots, state=None):
     """Planifie les OFs (dans l'ordre fourni) dans les créneaux 'slots'.
     Insère une INTRO automatiquement entre les campagnes.
+    'state' (IncrementalPlan) : ne replanifie qu'à partir du premier OF changé.
     Retourne un DataFrame de segments."""
-    from datetime import timedelta
-
-    planning_rows = []
-    if not slots:
+    if ofs_df.empty or not len(slots):
         return pd.DataFrame()
 
-    slot_idx = 0
-    current_slot_start = slots[0]["start"]
-    current_slot_end = slots[0]["end"]
-
-    previous_campagne = None
-    intro_counter = 0
-
-    def consume_time(duration_h):
-        """Consomme du temps dans les créneaux et retourne les segments créés."""
-        nonlocal slot_idx, current_slot_start, current_slot_end
-        segments = []
-        remaining = timedelta(hours=duration_h)
-        seg = 1
-
-        while remaining > timedelta(0):
-            if slot_idx >= len(slots):
-                return segments, False
-
-            available = current_slot_end - current_slot_start
-            if available <= timedelta(0):
-                slot_idx += 1
-                if slot_idx >= len(slots):
-                    return segments, False
-                current_slot_start = slots[slot_idx]["start"]
-                current_slot_end = slots[slot_idx]["end"]
-                continue
-
-            use = min(available, remaining)
-            start = current_slot_start
-            end = start + use
-
-            segments.append(
-                {
-                    "start": start,
-                    "end": end,
-                    "duree_h": use.total_seconds() / 3600.0,
-                    "segment": seg,
-                }
-            )
-
-            seg += 1
-            remaining -= use
-            current_slot_start = end
-
-        return segments, True
-
-    for _, row in ofs_df.iterrows():
-        current_campagne = row.get("Campagne", None)
-
-        if previous_campagne is not None and current_campagne != previous_campagne:
-            intro_counter += 1
-            intro_segments, ok = consume_time(INTRO_DUREE_H)
-            for seg_data in intro_segments:
-                planning_rows.append(
-                    {
-                        "Ofs": f"INTRO_{intro_counter}",
-                        "Segment": seg_data["segment"],
-                        "COLORIS": "INTRO",
-                        "GRAIN": "",
-                        "FAMILLE": "INTRO",
-                        "ML": "",
-                        "Campagne": "",
-                        "start": seg_data["start"],
-                        "end": seg_data["end"],
-                        "duree_h": seg_data["duree_h"],
-                        "is_intro": True,
-                    }
-                )
-            if not ok:
-                return pd.DataFrame(planning_rows)
-
-        previous_campagne = current_campagne
-
-        of_id = row["ID_PLAN"]
-        coloris = row["COLORIS"]
-        grain = row["GRAIN"]
-        famille = row["FAMILLE"]
-        ml = row["ML"]
-        campagne = row.get("Campagne", "")
-        duree_h = float(row["Temps en h"]) if pd.notna(row["Temps en h"]) else 0.0
-
-        of_segments, ok = consume_time(duree_h)
-        for seg_data in of_segments:
-            planning_rows.append(
-                {
-                    "Ofs": of_id,
-                    "Segment": seg_data["segment"],
-                    "COLORIS": coloris,
-                    "GRAIN": grain,
-                    "FAMILLE": famille,
-                    "ML": ml,
-                    "Campagne": campagne,
-                    "start": seg_data["start"],
-                    "end": seg_data["end"],
-                    "duree_h": seg_data["duree_h"],
-                    "is_intro": False,
-                }
-            )
-
-        if not ok:
-            return pd.DataFrame(planning_rows)
-
-    return pd.DataFrame(planning_rows)
+    ofs_df = ofs_df.reset_index(drop=True)
+    segments = (state or IncrementalPlan()).plan(
+        ofs_df["ID_PLAN"],
+        durations_from(ofs_df),
+        slots,
+        intro=intro_changement(ofs_df["Campagne"]),
+        intro_h=INTRO_DUREE_H,
+    )
+    planning = attach_columns(
+        segments,
+        ofs_df,
+        {"Ofs": "ID_PLAN", "COLORIS": "COLORIS", "GRAIN": "GRAIN", "FAMILLE": "FAMILLE", "ML": "ML", "Campagne": "Campagne"},
+        intro_values={"COLORIS": "INTRO", "FAMILLE": "INTRO"},
+    )
+    planning["Ofs"] = planning["Ofs"].where(~planning["is_intro"], "INTRO_" + planning["intro_no"].astype(str))
+    return planning[["Ofs", "Segment", "COLORIS", "GRAIN", "FAMILLE", "ML", "Campagne", "start", "end", "duree_h", "is_intro"]]
 
 
 def split_coloris(value: str):
@@ -307,11 +164,9 @@ def normalize_of(x):
 # 4) CHARGEMENT DONNÉES
 # ============================================
 
-@st.cache_data(ttl=7200)
 def load_data():
-    ofs_l2 = pd.read_excel(OFS_L2_FILE, engine="openpyxl")
-    cal = pd.read_excel(CAL_FILE, engine="openpyxl")
-    return ofs_l2, cal
+    """OFs L2 + calendrier, servis par le repository partagé."""
+    return load_ligne("Ligne 2")
 # ============================================
 # 5) FONCTION PRINCIPALE D'AFFICHAGE
 # ============================================
@@ -335,17 +190,19 @@ def show_planning_l2():
             st.session_state["page"] = "menu"
             return
 
+    require_uap_folder()
+
     # Charger les données
     ofs_l2_df, cal_df = load_data()
-    suivi_df = load_suivi_of()
+    suivi = suivi_ligne("Ligne 2")
 
     # Filtrer les OF exclus
-    ofs_exclus = get_ofs_exclus(suivi_df, "LIGNE2|L08")
+    ofs_exclus = suivi.exclus
     ofs_l2_df = ofs_l2_df[~ofs_l2_df["Ofs"].isin(ofs_exclus)]
 
     # Dictionnaires statuts / impression
-    statut_dict = get_statut_dict(suivi_df, "LIGNE2|L08")
-    fabrique_dict = get_fabrique_dict(suivi_df)
+    statut_dict = suivi.statut
+    fabrique_dict = get_fabrique_dict()
 
     # Créer un ID unique pour chaque ligne
     ofs_l2_df["ID_PLAN"] = ofs_l2_df.index.astype(str) + "_" + ofs_l2_df["Ofs"].astype(str)
@@ -370,9 +227,8 @@ def show_planning_l2():
     # ---- Réorganisation manuelle ----
     st.markdown("### 🔁 Réorganisation manuelle (OF ou Campagne)")
 
-    if "ordre_ofs" not in st.session_state:
-        st.session_state.ordre_ofs = list(ofs_l2_df["ID_PLAN"].values)
-        st.session_state.ordre_ofs_origine = st.session_state.ordre_ofs.copy()
+    # Ordre de la session aligné sur la dernière version enregistrée
+    sync_order("ofs_l2", "ordre_ofs", "ordre_ofs_origine", list(ofs_l2_df["ID_PLAN"]))
 
     ordre = st.session_state.ordre_ofs
     ordre_labels = [id_to_label.get(x, x) for x in ordre]
@@ -501,7 +357,7 @@ def show_planning_l2():
 
     with col_reset:
         if st.button("Réinitialiser l'ordre"):
-            st.session_state.ordre_ofs = st.session_state.ordre_ofs_origine.copy()
+            reset_order("ordre_ofs", "ordre_ofs_origine")
             st.info("Ordre réinitialisé.")
 
     with col_backup:
@@ -509,34 +365,25 @@ def show_planning_l2():
 
     with col_save:
         if st.button("📥 Valider et écrire"):
-            try:
-                ordre_final = st.session_state.ordre_ofs
-
-                df_excel = pd.read_excel(OFS_L2_FILE, engine="openpyxl")
-                df_excel["ID_PLAN"] = df_excel.index.astype(str) + "_" + df_excel["Ofs"].astype(str)
-
-                if backup_before_save:
-                    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                    backup = BASE_PATH / f"OFs_L2_backup_{ts}.xlsx"
-                    df_excel.drop(columns=["ID_PLAN"]).to_excel(backup, index=False)
-
-                df_excel = df_excel.set_index("ID_PLAN")
-                df_excel = df_excel.loc[ordre_final].reset_index(drop=True)
-                df_excel.to_excel(OFS_L2_FILE, index=False)
-
-                st.success("Ordre mis à jour avec succès !")
+            # Écriture atomique en arrière-plan (journal d'ordres si sauvegarde),
+            # depuis la version de départ de la session
+            base_version, base = order_base("ordre_ofs", "ordre_ofs_origine")
+            st.session_state.ecriture_L2 = get_writeback().submit_order(
+                "ofs_l2", st.session_state.ordre_ofs, backup=backup_before_save,
+                base_version=base_version, base=base,
+            )
 
-            except Exception as e:
-                st.error(f"Erreur : {e}")
+        show_write_status("ecriture_L2", "Ordre mis à jour avec succès !")
 
     # ---- Créneaux ouverts ----
-    now = datetime.now()
+    now = now_bucket()
     horizon_days = 14
     horizon_end = now + timedelta(days=horizon_days)
 
     st.markdown(f"**🕒 Maintenant : {now.strftime('%d/%m/%Y %H:%M')}**")
 
-    slots = build_open_slots_from_now(cal_df, horizon_days, now)
+    calendrier = calendrier_ligne("Ligne 2")
+    slots = calendrier.open_slots(now, horizon_end)
     if not slots:
         st.error("Aucun créneau OUVERT trouvé.")
         st.stop()
@@ -547,41 +394,6 @@ def show_planning_l2():
     ofs_l2_df["ID_PLAN"] = ofs_l2_df.index.astype(str) + "_" + ofs_l2_df["Ofs"].astype(str)
 
     current_ids = set(ofs_l2_df["ID_PLAN"])
-    saved_order = st.session_state.ordre_ofs
-
-    def rebuild_order_from_ofs(old_ids, df_ids, ofs_series):
-        ids_by_of = {}
-        for id_val, ofs in zip(df_ids, ofs_series.astype(str)):
-            ids_by_of.setdefault(ofs, []).append(id_val)
-
-        counters = {k: 0 for k in ids_by_of}
-
-        new_order = []
-        for old in old_ids:
-            ofs = str(old).split("_")[-1]
-            if ofs in ids_by_of and counters[ofs] < len(ids_by_of[ofs]):
-                new_order.append(ids_by_of[ofs][counters[ofs]])
-                counters[ofs] += 1
-
-        remaining = [i for i in df_ids if i not in set(new_order)]
-        return new_order + remaining
-
-    ids_missing = [x for x in saved_order if x not in current_ids]
-
-    if ids_missing:
-        try:
-            repaired = rebuild_order_from_ofs(
-                saved_order,
-                list(ofs_l2_df["ID_PLAN"]),
-                ofs_l2_df["Ofs"],
-            )
-            if len(repaired) == len(ofs_l2_df):
-                st.session_state.ordre_ofs = repaired
-                st.success("Ordre réparé automatiquement !")
-        except:
-            st.session_state.ordre_ofs = list(ofs_l2_df["ID_PLAN"])
-            st.warning("Ordre incompatible — réinitialisation.")
-
     ordre_final_l2 = [x for x in st.session_state.ordre_ofs if x in current_ids]
     st.session_state.ordre_ofs = ordre_final_l2
 
@@ -592,7 +404,12 @@ def show_planning_l2():
     ofs_l2_work = ofs_l2_df.set_index("ID_PLAN")
     ofs_l2_work = ofs_l2_work.loc[st.session_state.ordre_ofs].reset_index()
 
-    planning_df = schedule_ofs_from_slots(ofs_l2_work, slots)
+    plan_state = st.session_state.setdefault("plan_ofs", IncrementalPlan())
+    planning_df = cached_plan(
+        "Ligne 2", ofs_l2_work, now, horizon_end,
+        lambda: schedule_ofs_from_slots(ofs_l2_work, slots, state=plan_state),
+        variant="page",
+    )
 
     if planning_df.empty:
         st.warning("Planning vide : pas assez de créneaux.")
@@ -633,11 +450,13 @@ def show_planning_l2():
     # GÉNÉRATION DU GANTT
     # --------------------------------------------------------
 
-    plot_df = planning_df.copy()
-    plot_df["Ligne"] = LIGNE_NAME
-    plot_df["Label"] = plot_df.apply(build_label, axis=1)
-
     st.markdown("### 🔎 Fenêtre d'affichage")
+    client_side = st.toggle(
+        "Défilement dans le navigateur",
+        value=True,
+        key="defilement_client",
+        help="Glisser le Gantt ou utiliser la barre du bas pour défiler, molette pour zoomer, sans recharger la page.",
+    )
 
     largeur_heures = st.selectbox(
         "Largeur de vue",
@@ -659,6 +478,16 @@ def show_planning_l2():
     if view_end > horizon_end:
         view_end = horizon_end
 
+    # Seulement les segments de la fenêtre (plus une marge)
+    # (tout l'horizon en défilement navigateur)
+    if client_side:
+        win_start, win_end = now, horizon_end
+    else:
+        win_start, win_end = viewport(view_start, view_end)
+    plot_df = in_viewport(planning_df, win_start, win_end).copy()
+    plot_df["Ligne"] = LIGNE_NAME
+    plot_df["Label"] = plot_df.apply(build_label, axis=1) if len(plot_df) else ""
+
     fig = px.timeline(
         plot_df,
         x_start="start",
@@ -716,60 +545,31 @@ def show_planning_l2():
     # ARRETS (FERMÉ) EN ROUGE
     # --------------------------------------------------------
 
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-
-    start_date_cal = now.date()
-    end_date_cal = horizon_end.date()
+    for arret in calendrier.closed_slots(max(now, win_start), min(horizon_end, win_end)):
+        start_arret, end_arret = arret["start"], arret["end"]
+
+        fig.add_shape(
+            type="rect",
+            x0=start_arret,
+            x1=end_arret,
+            y0=0.05,
+            y1=0.95,
+            xref="x",
+            yref="paper",
+            fillcolor="#ff0000",
+            opacity=0.95,
+            line_width=0,
+        )
 
-    mask_cal = (cal["Jour"].dt.date >= start_date_cal) & (
-        cal["Jour"].dt.date <= end_date_cal
-    )
-    sub_cal = cal.loc[mask_cal]
-
-    for _, row_cal in sub_cal.iterrows():
-        jour = row_cal["Jour"]
-        for i in [1, 2, 3]:
-            etat_col = f"Etat_{i}"
-            hor_col = f"Horaire_{i}"
-
-            if row_cal.get(etat_col, "FERME") == "FERME":
-                h = row_cal[hor_col]
-
-                if isinstance(h, str) and "-" in h:
-                    start_arret, end_arret = parse_horaire(jour, h)
-
-                    if end_arret <= now or start_arret >= horizon_end:
-                        continue
-
-                    if start_arret < now:
-                        start_arret = now
-
-                    if end_arret > horizon_end:
-                        end_arret = horizon_end
-
-                    fig.add_shape(
-                        type="rect",
-                        x0=start_arret,
-                        x1=end_arret,
-                        y0=0.05,
-                        y1=0.95,
-                        xref="x",
-                        yref="paper",
-                        fillcolor="#ff0000",
-                        opacity=0.95,
-                        line_width=0,
-                    )
-
-                    fig.add_annotation(
-                        x=start_arret + (end_arret - start_arret) / 2,
-                        y=0.5,
-                        xref="x",
-                        yref="paper",
-                        text="ARRET 2x8",
-                        showarrow=False,
-                        font=dict(color="white", size=12, family="Arial Black"),
-                    )
+        fig.add_annotation(
+            x=start_arret + (end_arret - start_arret) / 2,
+            y=0.5,
+            xref="x",
+            yref="paper",
+            text="ARRET 2x8",
+            showarrow=False,
+            font=dict(color="white", size=12, family="Arial Black"),
+        )
 
     # --------------------------------------------------------
     # AXE TEMPS
@@ -804,8 +604,8 @@ def show_planning_l2():
         "Dimanche",
     ]
 
-    current_day = view_start.date()
-    end_day = view_end.date()
+    current_day = (now if client_side else view_start).date()
+    end_day = (horizon_end if client_side else view_end).date()
     day_annotations = []
 
     while current_day <= end_day:
@@ -846,28 +646,33 @@ def show_planning_l2():
         font=dict(color="white"),
     )
 
-    st.plotly_chart(fig, use_container_width=True)
-
-    new_offset = st.slider(
-        "⬅️ Faire défiler le planning ➡️",
-        min_value=0.0,
-        max_value=max(1.0, max_offset),
-        value=float(st.session_state.offset_heures),
-        step=1.0,
-        format="%.0fh",
-    )
+    if client_side:
+        client_scroll(fig, view_start, view_end, now, horizon_end)
+        st.plotly_chart(fig, use_container_width=True, config=CLIENT_SCROLL_CONFIG)
+        st.caption("↔️ Glisser le Gantt ou la barre du bas pour défiler, molette pour zoomer.")
+    else:
+        st.plotly_chart(fig, use_container_width=True)
+
+        new_offset = st.slider(
+            "⬅️ Faire défiler le planning ➡️",
+            min_value=0.0,
+            max_value=max(1.0, max_offset),
+            value=float(st.session_state.offset_heures),
+            step=1.0,
+            format="%.0fh",
+        )
 
-    if new_offset != st.session_state.offset_heures:
-        st.session_state.offset_heures = new_offset
-        st.rerun()
+        if new_offset != st.session_state.offset_heures:
+            st.session_state.offset_heures = new_offset
+            st.rerun()
 
-    view_start_display = now + timedelta(hours=new_offset)
-    view_end_display = view_start_display + timedelta(hours=largeur_heures)
+        view_start_display = now + timedelta(hours=new_offset)
+        view_end_display = view_start_display + timedelta(hours=largeur_heures)
 
-    st.caption(
-        f"📍 Vue : {view_start_display.strftime('%d/%m %Hh')} → "
-        f"{view_end_display.strftime('%d/%m %Hh')}"
-    )
+        st.caption(
+            f"📍 Vue : {view_start_display.strftime('%d/%m %Hh')} → "
+            f"{view_end_display.strftime('%d/%m %Hh')}"
+        )
 
     # Debug final
     with st.expander("Segments planifiés L2 (debug)"):
@@ -6,20 +6,22 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
-from pathlib import Path
 import plotly.graph_objects as go
-from pages.utils import load_suivi_of, get_ofs_exclus, get_statut_dict, is_statut_actif, STATUT_ACTIF
+from pages.utils import suivi_ligne, is_statut_actif, STATUT_ACTIF
+from pages.data_access import load_ligne, require_uap_folder
+from pages.calendrier import calendrier_ligne
+from pages.gantt import add_bars, add_pastilles, paper_y
+from pages.scheduler import attach_columns, plan_segments
+from pages.plan_cache import cached_plan, now_bucket
 
 # -------- CONFIG --------
-BASE_PATH = Path(r"C:\Users\yannick.tetard\OneDrive - GERFLOR\Desktop\Planning Streamlit\xarpediem2684-repo-main")
-OFS_VIS_FILE = BASE_PATH / "OFs_Visitage.xlsx"
-CAL_FILE = BASE_PATH / "Calendrier 2026.xlsx"
-
 # Valeurs par défaut pour calcul durée
 DEFAULT_ML_MIN = 15
 DEFAULT_TRG = 0.8
 OFFSET_TEMPS = 0.75
 
+GANTT_HEIGHT = 300  # px (marges haut + bas : 90 px)
+
 # -------- COULEURS --------
 def rgb_to_hex(r, g, b):
     return f"#{r:02X}{g:02X}{b:02X}"
@@ -71,121 +73,41 @@ def calculate_duree(ml, ml_min=DEFAULT_ML_MIN, trg=DEFAULT_TRG):
         return 0.5
     return (ml / ml_min / 60 * trg) + OFFSET_TEMPS
 
-# -------- SLOTS --------
-def parse_horaire(jour, h):
-    d, f = h.split("-")
-    d = d.replace("h", ":")
-    f = f.replace("h", ":")
-    start = datetime.combine(jour.date(), datetime.strptime(d, "%H:%M").time())
-    end = datetime.combine(jour.date(), datetime.strptime(f, "%H:%M").time())
-    if end <= start:
-        end += timedelta(days=1)
-    return start, end
-
-def build_all_open_slots(cal_df, from_date=None):
-    """Construit tous les créneaux OUVERT du calendrier."""
-    cal = cal_df.copy()
-    cal["Jour"] = pd.to_datetime(cal["Jour"])
-    
-    if from_date is None:
-        from_date = datetime.now()
-    
-    slots = []
-    for _, row in cal.iterrows():
-        day = row["Jour"]
-        for i in [1, 2, 3]:
-            e = row.get(f"Etat_{i}")
-            h = row.get(f"Horaire_{i}")
-            if e == "OUVERT" and isinstance(h, str) and "-" in h:
-                start, end = parse_horaire(day, h)
-                if end > from_date:
-                    if start < from_date:
-                        start = from_date
-                    slots.append({"start": start, "end": end})
-    
-    return sorted(slots, key=lambda x: x["start"])
-
 # -------- PLANIFICATION --------
 def schedule_ofs(ofs_df, slots):
     """Planifie les OFs dans les créneaux."""
-    if not slots or ofs_df.empty:
+    if not len(slots) or ofs_df.empty:
         return pd.DataFrame()
 
-    planning = []
-    slot_idx = 0
-    cur_s = slots[0]["start"]
-    cur_e = slots[0]["end"]
-
-    def consume(hours):
-        nonlocal slot_idx, cur_s, cur_e
-        segs = []
-        remain = timedelta(hours=hours)
-
-        while remain > timedelta(0):
-            if slot_idx >= len(slots):
-                return segs, False
-
-            dispo = cur_e - cur_s
-            if dispo <= timedelta(0):
-                slot_idx += 1
-                if slot_idx >= len(slots):
-                    return segs, False
-                cur_s = slots[slot_idx]["start"]
-                cur_e = slots[slot_idx]["end"]
-                continue
-
-            use = min(dispo, remain)
-            segs.append({"start": cur_s, "end": cur_s + use, "duree_h": use.total_seconds() / 3600})
-            remain -= use
-            cur_s = cur_s + use
-
-        return segs, True
-
-    for _, row in ofs_df.iterrows():
-        of_id = row.get("ID_PLAN", row.get("Ofs", ""))
-        coloris = row.get("Coloris", "")
-        laise = row.get("Laise", 4)
-        campagne = row.get("Campagne", "")
-        ml = float(row.get("Ml", 0)) if pd.notna(row.get("Ml")) else 0
-        
-        # Calculer durée
-        duree = row.get("Temps en h")
-        if pd.isna(duree) or duree is None or duree <= 0:
-            duree = calculate_duree(ml)
-        else:
-            duree = float(duree)
-
-        top_color = get_top_color(campagne)
-        bottom_color = get_bottom_color(laise)
-        text_color = get_text_color(top_color)
-
-        segs, ok = consume(duree)
-        for s in segs:
-            planning.append({
-                "Ofs": of_id,
-                "Coloris": coloris,
-                "Laise": laise,
-                "Campagne": campagne,
-                "Ml": ml,
-                "start": s["start"],
-                "end": s["end"],
-                "duree_h": s["duree_h"],
-                "top_color": top_color,
-                "bottom_color": bottom_color,
-                "text_color": text_color,
-            })
-
-        if not ok:
-            break
-
-    return pd.DataFrame(planning)
+    ofs_df = ofs_df.reset_index(drop=True)
+    ml = pd.to_numeric(ofs_df.get("Ml"), errors="coerce").fillna(0)
+    duree = pd.to_numeric(ofs_df.get("Temps en h"), errors="coerce")
+    sans_duree = duree.isna() | (duree <= 0)
+    duree = duree.where(~sans_duree, ml.map(calculate_duree))
+
+    work = ofs_df.assign(
+        Ofs=ofs_df["ID_PLAN"] if "ID_PLAN" in ofs_df else ofs_df.get("Ofs", ""),
+        Ml=ml,
+        Laise=ofs_df["Laise"] if "Laise" in ofs_df else 4,
+    )
+    planning = attach_columns(
+        plan_segments(duree.to_numpy("float64"), slots),
+        work,
+        {"Ofs": "Ofs", "Coloris": "Coloris", "Laise": "Laise", "Campagne": "Campagne", "Ml": "Ml"},
+    )
+    top = {c: get_top_color(c) for c in planning["Campagne"].unique()}
+    planning["top_color"] = planning["Campagne"].map(top)
+    planning["bottom_color"] = planning["Laise"].map({l: get_bottom_color(l) for l in planning["Laise"].unique()})
+    planning["text_color"] = planning["top_color"].map({c: get_text_color(c) for c in set(top.values())})
+    return planning[[
+        "Ofs", "Coloris", "Laise", "Campagne", "Ml", "start", "end", "duree_h",
+        "top_color", "bottom_color", "text_color",
+    ]]
 
 # -------- DATA --------
-@st.cache_data(ttl=7200)
 def load_data():
-    ofs = pd.read_excel(OFS_VIS_FILE, sheet_name="Feuil1", engine="openpyxl")
-    cal = pd.read_excel(CAL_FILE, engine="openpyxl")
-    return ofs, cal
+    """OFs Visitage + calendrier, servis par le repository partagé."""
+    return load_ligne("Visitage")
 
 def show_planning_visitage():
     st.title("📅 Planning VISITAGE")
@@ -197,6 +119,8 @@ def show_planning_visitage():
             st.session_state["page"] = "menu"
             st.rerun()
 
+    require_uap_folder()
+
     # --- CHARGEMENT ---
     try:
         ofs_df, cal_df = load_data()
@@ -205,14 +129,14 @@ def show_planning_visitage():
         return
 
     # Charger SUIVI_OF pour statuts
-    suivi_df = load_suivi_of()
+    suivi = suivi_ligne("Visitage")
     
     # Filtrer les OFs terminés (60, 61, 99) et < 200 ML
-    ofs_exclus = get_ofs_exclus(suivi_df, "VISITAGE|L10")
+    ofs_exclus = suivi.exclus
     ofs_df = ofs_df[~ofs_df["Ofs"].isin(ofs_exclus)]
     
     # Dict des statuts pour pastilles vertes
-    statut_dict = get_statut_dict(suivi_df, "VISITAGE|L10")
+    statut_dict = suivi.statut
 
     if ofs_df.empty:
         st.warning("Aucun OF trouvé.")
@@ -224,8 +148,8 @@ def show_planning_visitage():
         st.dataframe(ofs_df)
 
     # ---- Créneaux ouverts ----
-    now = datetime.now()
-    slots = build_all_open_slots(cal_df, now)
+    now = now_bucket()
+    slots = calendrier_ligne("Visitage").open_slots(now)
 
     if not slots:
         st.error("Aucun créneau OUVERT trouvé dans le calendrier.")
@@ -235,7 +159,7 @@ def show_planning_visitage():
     st.info(f"⏰ Premier créneau : **{first_slot['start'].strftime('%d/%m à %Hh%M')}**")
 
     # ---- Planification ----
-    planning = schedule_ofs(ofs_df, slots)
+    planning = cached_plan("Visitage", ofs_df, now, None, lambda: schedule_ofs(ofs_df, slots), variant="page")
     
     if planning.empty:
         st.warning("Aucun OF planifié.")
@@ -264,50 +188,38 @@ def show_planning_visitage():
 
     visible = planning[(planning["end"] >= view_start) & (planning["start"] <= view_end)]
 
-    for _, r in visible.iterrows():
-        start = r["start"]
-        end = r["end"]
-        dur_ms = (end - start).total_seconds() * 1000
-        of_num = str(r['Ofs']).split('_')[-1] if '_' in str(r['Ofs']) else str(r['Ofs'])
-        
-        # Étiquette du haut (coloris + ML + OF + durée)
-        label_top = f"<b>{str(r['Coloris'])[:15]}</b><br>{int(r['Ml'])} ML<br>OF {of_num}<br>{r['duree_h']:.1f}h"
-        
-        fig.add_trace(go.Bar(
-            x=[dur_ms], y=["Visitage"], base=[start], orientation="h",
-            marker=dict(color=r["top_color"], line=dict(color="#000", width=1)),
-            text=label_top, textposition="inside", insidetextanchor="middle",
-            textfont=dict(size=9, color=r["text_color"]),
-            hovertemplate=f"{r['Coloris']}<br>{int(r['Ml'])} ML<br>OF {of_num}<extra></extra>",
-            showlegend=False,
-        ))
-
-        # Barre du bas (laise)
-        fig.add_trace(go.Bar(
-            x=[dur_ms], y=["Laise"], base=[start], orientation="h",
-            marker=dict(color=r["bottom_color"], line=dict(color="#000", width=1)),
-            text=f"<b>L{r['Laise']}</b>", textposition="inside",
-            textfont=dict(size=12, color="#000"),
-            hovertemplate=f"Laise {r['Laise']}<extra></extra>",
-            showlegend=False,
-        ))
+    of_num = visible["Ofs"].astype(str).str.split("_").str[-1]
+    ml = pd.to_numeric(visible["Ml"], errors="coerce").fillna(0).astype(int).astype(str)
+    coloris = visible["Coloris"].astype(str)
+
+    # Étiquette du haut (coloris + ML + OF + durée)
+    label_top = (
+        "<b>" + coloris.str[:15] + "</b><br>" + ml + " ML<br>OF " + of_num
+        + "<br>" + visible["duree_h"].map("{:.1f}h".format)
+    )
+    add_bars(
+        fig, "Visitage", visible["start"], visible["end"],
+        color=visible["top_color"], text=label_top, text_color=visible["text_color"],
+        hover=coloris + "<br>" + ml + " ML<br>OF " + of_num,
+    )
+
+    # Barre du bas (laise)
+    laise = visible["Laise"].astype(str)
+    add_bars(
+        fig, "Laise", visible["start"], visible["end"],
+        color=visible["bottom_color"], text="<b>L" + laise + "</b>",
+        hover="Laise " + laise, font_size=12, insidetextanchor="end",
+    )
 
     # ---- PASTILLES VERTES pour statuts 30, 40, 50 ----
-    for _, r in visible.iterrows():
-        of_num = r["Ofs"]
-        if isinstance(of_num, str) and "_" in of_num:
-            try:
-                of_num = int(of_num.split("_")[-1])
-            except:
-                continue
-        
-        if is_statut_actif(of_num, statut_dict):
-            mid_time = r["start"] + (r["end"] - r["start"]) / 2
-            fig.add_annotation(
-                x=mid_time, y="Visitage", yshift=-40,
-                text="🟢", showarrow=False, font=dict(size=12),
-                xref="x", yref="y",
-            )
+    num = pd.to_numeric(of_num, errors="coerce")
+    actif = [pd.notna(n) and is_statut_actif(int(n), statut_dict) for n in num]
+    pastilles = visible[actif]
+    add_pastilles(
+        fig,
+        pastilles["start"] + (pastilles["end"] - pastilles["start"]) / 2,
+        paper_y(1, 2, shift_px=-40, plot_height_px=GANTT_HEIGHT - 90),
+    )
 
     # ---- Jours ----
     JOURS_FR = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
@@ -329,7 +241,7 @@ def show_planning_visitage():
     fig.update_xaxes(type="date", range=[view_start, view_end], tickformat="%Hh", dtick=3600000)
     fig.update_yaxes(categoryorder='array', categoryarray=['Laise', 'Visitage'], tickfont=dict(color="white", size=12))
     fig.update_layout(
-        height=300, margin=dict(l=80, r=20, t=50, b=40),
+        height=GANTT_HEIGHT, margin=dict(l=80, r=20, t=50, b=40),
         plot_bgcolor="#444", paper_bgcolor="#444", font=dict(color="white"),
         barmode="overlay", showlegend=False,
     )
@@ -11,7 +11,6 @@ Page Streamlit : Qualite.py (v7 FINAL)
 """
 
 import io
-import re
 import math
 import numpy as np
 import pandas as pd
@@ -20,6 +19,9 @@ import plotly.graph_objects as go
 import streamlit as st
 from datetime import datetime, date
 
+from pages.data_access import require_uap_folder
+from pages.qualite_data import aggregate, load_cube, load_qualite
+
 
 def _safe_rerun():
     if hasattr(st, "rerun"):
@@ -89,67 +91,9 @@ st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
 # ----------------------------------------------------------
 # UTILITAIRES
 # ----------------------------------------------------------
-def _normalize(col: str) -> str:
-    if col is None: return ""
-    col = col.lower()
-    repl = {
-        "é":"e","è":"e","ê":"e","ë":"e",
-        "à":"a","â":"a",
-        "î":"i","ï":"i",
-        "ô":"o",
-        "ù":"u","û":"u","ü":"u",
-        "ç":"c"
-    }
-    for k,v in repl.items(): col = col.replace(k,v)
-    col = re.sub(r"[^a-z0-9]","", col)
-    return col
-
-def find_col(df, candidates):
-    norm = {_normalize(c): c for c in df.columns}
-    for cand in candidates:
-        k = _normalize(cand)
-        if k in norm: return norm[k]
-    for cand in candidates:
-        k = _normalize(cand)
-        for key, real in norm.items():
-            if k in key: return real
-    raise KeyError(f"Colonne introuvable : {candidates}")
-
-@st.cache_data(show_spinner=True)
-def load_data(path="Qualite.xlsx"):
-    df = pd.read_excel(path, engine="openpyxl").copy()
-
-    col_date = find_col(df, ["Date début OF","datedebutof"])
-    col_ligne = find_col(df, ["Libelle ligne","ligne"])
-    col_im = find_col(df, ["Quantité mvt IM","Quantite mvt IM","IM"])
-    col_ic = find_col(df, ["Quantité IC","Quantite IC","IC"])
-
-    # optionnel
-    try: col_of = find_col(df, ["Numéro OF","Numero OF"])
-    except: col_of = None
-    try: col_col = find_col(df, ["Dessin coloris"])
-    except: col_col = None
-    try: col_ecart = find_col(df, ["Rebuts en écart vs budget"])
-    except: col_ecart = None
-
-    df["DateDebutOF"] = pd.to_datetime(df[col_date], errors="coerce", dayfirst=True)
-    df[col_im] = pd.to_numeric(df[col_im], errors="coerce")
-    df[col_ic] = pd.to_numeric(df[col_ic], errors="coerce")
-
-    df["PctRebut"] = np.where(df[col_im] > 0, (df[col_im] - df[col_ic]) / df[col_im] * 100, np.nan)
-    df["PctRealise"] = np.where(df[col_im] > 0, df[col_ic] / df[col_im] * 100, np.nan)
-
-    df.loc[df["PctRebut"] < 0, "PctRebut"] = 0
-    df.loc[df["PctRealise"] < 0, "PctRealise"] = 0
-
-    df["Jour"] = df["DateDebutOF"].dt.date
-
-    df.rename(columns={col_ligne:"Ligne", col_im:"QteIM", col_ic:"QteIC"}, inplace=True)
-    if col_of: df.rename(columns={col_of:"Numéro OF"}, inplace=True)
-    if col_col: df.rename(columns={col_col:"Dessin coloris"}, inplace=True)
-    if col_ecart: df.rename(columns={col_ecart:"RebutsEcartBudget"}, inplace=True)
-
-    return df
+def load_data():
+    """Qualite.xlsx typé, partagé avec Dashboard_TRG (voir qualite_data)."""
+    return load_qualite()
 
 
 # ----------------------------------------------------------
@@ -207,9 +151,11 @@ def show_qualite():
             st.session_state["page"] = "menu"
             st.rerun()
 
+    require_uap_folder()
+
     df = load_data()
-    df["Jour"] = pd.to_datetime(df["Jour"], errors="coerce").dt.date
     df = df.dropna(subset=["Jour"])
+    cube = load_cube()
 
     # --------------------------
     # SIDEBAR
@@ -217,8 +163,8 @@ def show_qualite():
     with st.sidebar:
         st.header("🎛️ Filtres")
 
-        min_date = df["Jour"].min()
-        max_date = df["Jour"].max()
+        min_date = df["Jour"].min().date()
+        max_date = df["Jour"].max().date()
 
         date_start, date_end = st.date_input(
             "Plage de dates", value=(min_date,max_date),
@@ -233,13 +179,21 @@ def show_qualite():
         seuil_realise = st.slider("Seuil % Réalisé",70.0,100.0,95.0,0.5)
 
     # --------------------------
-    # FILTER DF
+    # FILTER : cube pour les agrégats, lignes d'OF pour histogramme / alertes
     # --------------------------
+    cubef = cube[
+        (cube["Jour"] >= pd.Timestamp(date_start)) &
+        (cube["Jour"] <= pd.Timestamp(date_end)) &
+        (cube["Ligne"].isin(selected_lignes))
+    ]
+    total = aggregate(cubef.assign(tout=0), "tout", sums=["n", "QteIM"], means=["PctRealise", "PctRebut"])
+    total = total.iloc[0] if len(total) else pd.Series({"n": 0, "QteIM": 0.0, "PctRealise": np.nan, "PctRebut": np.nan})
+
     dff = df[
-        (df["Jour"] >= date_start) &
-        (df["Jour"] <= date_end) &
+        (df["Jour"] >= pd.Timestamp(date_start)) &
+        (df["Jour"] <= pd.Timestamp(date_end)) &
         (df["Ligne"].isin(selected_lignes))
-    ].copy()
+    ]
 
     # --------------------------
     # KPIs FIXES
@@ -253,7 +207,7 @@ def show_qualite():
             f"""
             <div class='kpi-box'>
                 <div class='kpi-title'>Total ML produits</div>
-                <div class='kpi-value'>{dff['QteIM'].sum():,.0f}</div>
+                <div class='kpi-value'>{total['QteIM']:,.0f}</div>
             </div>
             """, unsafe_allow_html=True
         )
@@ -262,7 +216,7 @@ def show_qualite():
             f"""
             <div class='kpi-box'>
                 <div class='kpi-title'>% Réalisé moyen</div>
-                <div class='kpi-value'>{dff['PctRealise'].mean():.2f} %</div>
+                <div class='kpi-value'>{total['PctRealise']:.2f} %</div>
             </div>
             """, unsafe_allow_html=True
         )
@@ -271,7 +225,7 @@ def show_qualite():
             f"""
             <div class='kpi-box'>
                 <div class='kpi-title'>% Rebut moyen</div>
-                <div class='kpi-value'>{dff['PctRebut'].mean():.2f} %</div>
+                <div class='kpi-value'>{total['PctRebut']:.2f} %</div>
             </div>
             """, unsafe_allow_html=True
         )
@@ -280,7 +234,7 @@ def show_qualite():
             f"""
             <div class='kpi-box'>
                 <div class='kpi-title'>Nombre d’OF</div>
-                <div class='kpi-value'>{len(dff)}</div>
+                <div class='kpi-value'>{int(total['n'])}</div>
             </div>
             """, unsafe_allow_html=True
         )
@@ -292,11 +246,9 @@ def show_qualite():
     # --------------------------
     st.subheader("🔧 Jauges par ligne")
 
-    agg = dff.groupby("Ligne").agg(
-        Realise=("PctRealise","mean"),
-        Rebut=("PctRebut","mean"),
-        ML=("QteIM","sum")
-    ).reset_index().sort_values("ML",ascending=False)
+    agg = aggregate(cubef, "Ligne", sums=["QteIM"], means=["PctRealise","PctRebut"]).rename(
+        columns={"PctRealise":"Realise", "PctRebut":"Rebut", "QteIM":"ML"}
+    ).sort_values("ML",ascending=False)
 
     for start in range(0,min(6,len(agg)),3):
         cols = st.columns(3)
@@ -328,20 +280,21 @@ def show_qualite():
     # GRAPH : Production / Réalisé / Donut
     # --------------------------
     st.subheader("📈 Production par jour (ML)")
-    prod = dff.groupby("Jour")["QteIM"].sum().reset_index()
+    par_jour = aggregate(cubef, "Jour", sums=["QteIM"], means=["PctRealise"])
+    prod = par_jour[["Jour","QteIM"]]
     st.plotly_chart(
         px.bar(prod, x="Jour", y="QteIM", text_auto=True, template=PLOTLY_TEMPLATE),
         use_container_width=True
     )
 
     st.subheader("📉 Tendance % Réalisé")
-    prod2 = dff.groupby("Jour")["PctRealise"].mean().reset_index()
+    prod2 = par_jour[["Jour","PctRealise"]]
     fig2 = px.line(prod2, x="Jour", y="PctRealise", markers=True, template=PLOTLY_TEMPLATE)
     fig2.update_yaxes(range=[0,100])
     st.plotly_chart(fig2, use_container_width=True)
 
     st.subheader("🍩 Distribution par ligne")
-    dist = dff.groupby("Ligne")["QteIM"].sum().reset_index()
+    dist = agg[["Ligne","ML"]].rename(columns={"ML":"QteIM"}).sort_values("Ligne")
     st.plotly_chart(
         px.pie(dist, values="QteIM", names="Ligne", hole=0.55, template=PLOTLY_TEMPLATE),
         use_container_width=True
@@ -3,13 +3,13 @@
 # Settings.py — Dashboard de Gestion des Plannings
 # ============================================
 
+import threading
+import numpy as np
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-from pathlib import Path
 
-BASE_PATH = Path("..")          # remonte d'un dossier depuis /pages
-SUIVI_OF_FILE = BASE_PATH / "SUIVI_OF.xlsx"
+from pages.data_access import current_uap, get_store, load_table, notify_file_written, require_uap_folder, table_version, uap_base_path
+from pages.writeback import atomic_path, get_writeback, log_order, show_write_status
 
 LIGNE_MAPPING = {
     "L06 - 4M-LIGNE1": {"name": "L1", "file": "OFs_L1.xlsx", "sheet": "Feuil1"},
@@ -31,13 +31,16 @@ OFFSET_TEMPS = 0.75
 
 
 def load_suivi_of():
-    return pd.read_excel(SUIVI_OF_FILE, engine="openpyxl")
+    return load_table("suivi_of")
+
+
+CALCUL_TABLES = {"L1": "calcul_l1", "L2": "calcul_l2", "Imprimerie": "calcul_imprimerie", "Visitage": "calcul_visitage"}
+OFS_TABLES = {"L1": "ofs_l1", "L2": "ofs_l2", "Imprimerie": "ofs_imprimerie", "Visitage": "ofs_visitage"}
 
 
 def load_calcul_duree(ligne_name):
-    file_map = {"L1": "OFs_L1.xlsx", "L2": "OFs_L2.xlsx", "Imprimerie": "OFs_Imprimerie.xlsx", "Visitage": "OFs_Visitage.xlsx"}
     try:
-        df = pd.read_excel(BASE_PATH / file_map[ligne_name], sheet_name="calcul_durée", engine="openpyxl")
+        df = load_table(CALCUL_TABLES[ligne_name])
         df.columns = df.columns.str.strip()
         if "Famille " in df.columns:
             df = df.rename(columns={"Famille ": "Famille"})
@@ -46,15 +49,62 @@ def load_calcul_duree(ligne_name):
         return pd.DataFrame()
 
 
-def get_ml_min(calcul_df, search):
-    if calcul_df.empty or not search:
-        return DEFAULT_ML_MIN
-    search = str(search).upper().strip()
-    for _, row in calcul_df.iterrows():
-        fam = str(row.get("Famille", "")).upper().strip()
-        if fam == search or fam in search or search in fam:
-            return float(row.get("ml/min", DEFAULT_ML_MIN))
-    return DEFAULT_ML_MIN
+class MlMinMatcher:
+    """Famille -> ml/min compilé depuis une table calcul_durée.
+
+    Règle de l'ancien parcours ligne à ligne : la PREMIÈRE ligne dont la
+    famille est égale à la clé, contenue dans la clé ou la contient.
+    Familles et valeurs sont extraites une fois ; une égalité exacte (dict)
+    borne la recherche aux lignes qui la précèdent ; chaque clé distincte
+    n'est résolue qu'une fois (mémo). Une ligne dont le ml/min n'est pas
+    numérique est ignorée (les autres familles restent utilisables)."""
+
+    def __init__(self, calcul_df):
+        n = 0 if calcul_df.empty else len(calcul_df)
+        fam = calcul_df["Famille"] if "Famille" in calcul_df.columns else pd.Series([""] * n)
+        val = calcul_df["ml/min"] if "ml/min" in calcul_df.columns else pd.Series([DEFAULT_ML_MIN] * n)
+        val = pd.to_numeric(pd.Series(list(val)[:n], dtype=object), errors="coerce")
+        ok = val.notna().to_numpy()
+        self.familles = [str(f).upper().strip() for f, keep in zip(list(fam)[:n], ok) if keep]
+        self.valeurs = val[ok].astype(float).tolist()
+        self.exact = {}
+        for i, f in enumerate(self.familles):
+            self.exact.setdefault(f, i)
+        self._memo = {}
+
+    def _match(self, key):
+        i = self.exact.get(key, len(self.familles))
+        for j in range(i):
+            f = self.familles[j]
+            if f in key or key in f:
+                return self.valeurs[j]
+        return self.valeurs[i] if i < len(self.familles) else DEFAULT_ML_MIN
+
+    def __call__(self, search):
+        if not self.familles or not search:
+            return DEFAULT_ML_MIN
+        key = str(search).upper().strip()
+        if key not in self._memo:
+            self._memo[key] = self._match(key)
+        return self._memo[key]
+
+
+_matchers = {}  # (UAP, nom de table) -> (version, MlMinMatcher)
+_matchers_lock = threading.Lock()
+
+
+def ml_min_matcher(ligne_name):
+    """MlMinMatcher de la ligne, recompilé seulement si son fichier OFs a changé."""
+    key = (current_uap(), CALCUL_TABLES[ligne_name])
+    version = table_version(key[1])
+    entry = _matchers.get(key)
+    if entry is None or entry[0] != version:
+        with _matchers_lock:
+            entry = _matchers.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, MlMinMatcher(load_calcul_duree(ligne_name)))
+                _matchers[key] = entry
+    return entry[1]
 
 
 def calc_temps(ml, ml_min):
@@ -82,330 +132,148 @@ def filter_active(df):
     return df[df["STATUT"] <= 50]
 
 
-def extract_laise(lib_format):
-    if not lib_format or pd.isna(lib_format):
-        return 4
-    s = str(lib_format).upper()
-    if "2M" in s:
-        return 2
-    elif "3M" in s:
-        return 3
-    return 4
-
-
-def extract_type(campagne):
-    if not campagne:
-        return ""
-    c = str(campagne).upper()
-    for t in ["TEXLINE", "NERA", "PRIMETEX", "TARABUS", "BOOSTER", "SPORISOL", "TMAX", "START", "FUSION", "LOFTEX"]:
-        if t in c:
-            return t
-    return ""
-
-
 # ---------------------------------
-# L1 — Applique STATUT <= 50 et ML = COMMANDE - FABRIQUE ; ML < 150 => skip
+# Sélection commune (ensembliste) — une tranche de ligne, pas de boucle par OF
+#   1) OFs du jour puis urgents : première ligne de chaque OF, STATUT <= 50
+#      (ou vide) ; ils ne sont plus repris par les campagnes
+#   2) Campagnes dans l'ordre choisi : OFs actifs (STATUT <= 50) de chaque
+#      campagne, dans l'ordre de SUIVI_OF
+# ML = COMMANDE - FABRIQUE ; ML < 150 => skip
 # ---------------------------------
 
-def generate_L1(df, campagnes, urgents, journee, calcul_df):
-    rows = []
-    done = set()
+ML_MIN_EXPORT = 150
 
-    # 1) OFs du jour et urgents
-    for of in journee + [u for u in urgents if u not in journee]:
-        d = df[(df["LIB_LIGNE"] == "L06 - 4M-LIGNE1") & (df["NUM_OF"] == of)]
-        if d.empty:
-            continue
-        r = d.iloc[0]
-
-        # Règle STATUT
-        if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-            continue
-
-        done.add(of)
-
-        lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-        produit = ""
-        for code in ["CICDMD01", "CICD01", "CICD02", "CICD03", "CICD04", "CICD05", "CICD06", "CIMD02", "CIMD03"]:
-            if code in lib.upper():
-                largeur = "3M" if "3M" in lib.upper() else "4M"
-                produit = f"{code} {largeur}"
-                break
-
-        # ML = COMMANDE - FABRIQUE
-        commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-        fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-        ml = commande - fabrique
-        if ml < 150:
-            continue
-
-        ml_min = get_ml_min(calcul_df, produit)
-
-        rows.append({
-            "Campagne": lib, "Colonne2": None, "Produit": produit, "Ml": ml,
-            "Ofs": r["NUM_OF"], "ml / min": ml_min, "Temps en h": calc_temps(ml, ml_min)
-        })
-
-    # 2) Campagnes
-    for camp in campagnes:
-        if not camp:
-            continue
-        sub = df[(df["LIB_LIGNE"] == "L06 - 4M-LIGNE1") & (df["LIB_CAMPAGNE"] == camp)]
-        sub = filter_active(sub)
-        for _, r in sub.iterrows():
-            if r["NUM_OF"] in done:
-                continue
+PRODUITS_L1 = ["CICDMD01", "CICD01", "CICD02", "CICD03", "CICD04", "CICD05", "CICD06", "CIMD02", "CIMD03"]
+TYPES_CAMPAGNE = ["TEXLINE", "NERA", "PRIMETEX", "TARABUS", "BOOSTER", "SPORISOL", "TMAX", "START", "FUSION", "LOFTEX"]
 
-            # Règle STATUT
-            if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-                continue
-
-            lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-            produit = ""
-            for code in ["CICDMD01", "CICD01", "CICD02", "CICD03", "CICD04", "CICD05", "CICD06", "CIMD02", "CIMD03"]:
-                if code in lib.upper():
-                    largeur = "3M" if "3M" in lib.upper() else "4M"
-                    produit = f"{code} {largeur}"
-                    break
-
-            commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-            fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-            ml = commande - fabrique
-            if ml < 150:
-                continue
 
-            ml_min = get_ml_min(calcul_df, produit)
+def _first_match(values, codes, fmt="{}"):
+    """Premier code contenu dans chaque valeur (ordre de 'codes'), "" sinon."""
+    up = values.str.upper()
+    return pd.Series(
+        np.select([up.str.contains(c, regex=False) for c in codes], [fmt.format(c) for c in codes], default=""),
+        index=values.index,
+    )
 
-            rows.append({
-                "Campagne": lib, "Colonne2": None, "Produit": produit, "Ml": ml,
-                "Ofs": r["NUM_OF"], "ml / min": ml_min, "Temps en h": calc_temps(ml, ml_min)
-            })
 
-    return pd.DataFrame(rows)
+def select_ofs(df, lib_ligne, campagnes, urgents, journee):
+    """Lignes SUIVI_OF à exporter pour 'lib_ligne', dans l'ordre d'export, avec leur ML."""
+    d = df[df["LIB_LIGNE"] == lib_ligne].reset_index(drop=True)
+    d["_pos"] = np.arange(len(d))
+    statut = d["STATUT"] if "STATUT" in d else pd.Series(np.nan, index=d.index)
 
+    # 1) OFs du jour et urgents
+    choisis = pd.DataFrame({"NUM_OF": journee + [u for u in urgents if u not in journee]})
+    choisis["_rang"] = np.arange(len(choisis))
+    premiers = d.drop_duplicates("NUM_OF")
+    premiers = premiers[~(statut[premiers.index] > 50)]
+    part1 = choisis.merge(premiers, on="NUM_OF", how="inner")
 
-# ---------------------------------
-# L2 (MODIFIÉ) — FAMILLE = DESCRIPTION (colonne K)
-# Applique STATUT <= 50 et ML = COMMANDE - FABRIQUE ; ML < 150 => skip
-# ---------------------------------
+    # 2) Campagnes (hors OFs déjà pris en 1)
+    camps = pd.DataFrame({"LIB_CAMPAGNE": [c for c in campagnes if c]})
+    camps["_rang"] = len(choisis) + np.arange(len(camps))
+    actifs = d[(statut <= 50) & ~d["NUM_OF"].isin(part1["NUM_OF"])]
+    part2 = camps.merge(actifs, on="LIB_CAMPAGNE", how="inner")
 
-def generate_L2(df, campagnes, urgents, journee, calcul_df, col_k_name="DESCRIPTION"):
-    rows = []
-    done = set()
+    sel = pd.concat([part1, part2], ignore_index=True).sort_values(["_rang", "_pos"], kind="stable")
+    commande = pd.to_numeric(sel["COMMANDE"], errors="coerce").fillna(0)
+    fabrique = pd.to_numeric(sel["FABRIQUE"], errors="coerce").fillna(0) if "FABRIQUE" in sel else 0
+    sel["_ML"] = commande - fabrique
+    sel = sel[sel["_ML"] >= ML_MIN_EXPORT].drop(columns=["_rang", "_pos"]).reset_index(drop=True)
+    sel["_LIB"] = sel["LIB_CAMPAGNE"].fillna("").astype(str)
+    return sel
 
-    # 1) OFs du jour et urgents
-    for of in journee + [u for u in urgents if u not in journee]:
-        d = df[(df["LIB_LIGNE"] == "L08 - 4M-LIGNE2") & (df["NUM_OF"] == of)]
-        if d.empty:
-            continue
-        r = d.iloc[0]
-
-        if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-            continue
-
-        done.add(of)
-
-        lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-        famille_calc = extract_type(lib)  # utilisé uniquement pour ml/min
-
-        commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-        fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-        ml = commande - fabrique
-        if ml < 150:
-            continue
-
-        ml_min = get_ml_min(calcul_df, famille_calc)
-
-        desc = r[col_k_name] if (col_k_name in r.index and pd.notna(r[col_k_name])) else ""
-
-        rows.append({
-            "COLORIS": r["COLORIS"] if pd.notna(r["COLORIS"]) else "",
-            "GRAIN": r["GRAIN"] if pd.notna(r["GRAIN"]) else "",
-            "FAMILLE": desc,  # Remplacement par DESCRIPTION
-            "ML": ml, "Ofs": r["NUM_OF"],
-            "ml / min": ml_min, "Temps en h": calc_temps(ml, ml_min), "Campagne": lib
-        })
-
-    # 2) Campagnes
-    for camp in campagnes:
-        if not camp:
-            continue
-        sub = df[(df["LIB_LIGNE"] == "L08 - 4M-LIGNE2") & (df["LIB_CAMPAGNE"] == camp)]
-        sub = filter_active(sub)
-        for _, r in sub.iterrows():
-            if r["NUM_OF"] in done:
-                continue
 
-            if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-                continue
+def _ml_min(calcul, keys):
+    """ml/min de chaque clé : jointure des clés distinctes sur la table calcul_durée.
 
-            lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-            famille_calc = extract_type(lib)
+    'calcul' : MlMinMatcher (ml_min_matcher) ou DataFrame calcul_durée."""
+    matcher = calcul if isinstance(calcul, MlMinMatcher) else MlMinMatcher(calcul)
+    uniques = pd.Series(keys.unique())
+    table = pd.DataFrame({"_cle": uniques, "_ml_min": [matcher(k) for k in uniques]})
+    return keys.to_frame("_cle").merge(table, on="_cle", how="left")["_ml_min"].to_numpy("float64")
 
-            commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-            fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-            ml = commande - fabrique
-            if ml < 150:
-                continue
 
-            ml_min = get_ml_min(calcul_df, famille_calc)
-            desc = r[col_k_name] if (col_k_name in r.index and pd.notna(r[col_k_name])) else ""
+def _temps(ml, ml_min):
+    """calc_temps vectorisé (0 si ML ou ml/min nul / négatif)."""
+    ml = np.asarray(ml, dtype="float64")
+    ml_min = np.asarray(ml_min, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        temps = ml / ml_min / DEFAULT_HEURE * DEFAULT_TRG + OFFSET_TEMPS
+    return np.where((ml > 0) & ~(ml_min <= 0), temps, 0)
 
-            rows.append({
-                "COLORIS": r["COLORIS"] if pd.notna(r["COLORIS"]) else "",
-                "GRAIN": r["GRAIN"] if pd.notna(r["GRAIN"]) else "",
-                "FAMILLE": desc,
-                "ML": ml, "Ofs": r["NUM_OF"],
-                "ml / min": ml_min, "Temps en h": calc_temps(ml, ml_min), "Campagne": lib
-            })
 
-    return pd.DataFrame(rows)
+def _text(sel, col):
+    return sel[col].fillna("") if col and col in sel else pd.Series("", index=sel.index)
 
 
 # ---------------------------------
-# Imprimerie — STATUT <= 50 ; ML = COMMANDE - FABRIQUE ; ML < 150 => skip
+# L1 — Produit = code support (CICD / CIMD) + largeur
 # ---------------------------------
 
-def generate_Imp(df, campagnes, urgents, journee, calcul_df):
-    rows = []
-    done = set()
-
-    # 1) OFs du jour et urgents
-    for of in journee + [u for u in urgents if u not in journee]:
-        d = df[(df["LIB_LIGNE"] == "L09 - 4M-IMPRIMERIE") & (df["NUM_OF"] == of)]
-        if d.empty:
-            continue
-        r = d.iloc[0]
-
-        if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-            continue
-
-        done.add(of)
-
-        lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-        support = str(r.get("COMPOSANT", ""))[:6] if pd.notna(r.get("COMPOSANT")) else ""
-
-        commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-        fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-        ml = commande - fabrique
-        if ml < 150:
-            continue
-
-        type_camp = extract_type(lib)
-        ml_min = get_ml_min(calcul_df, type_camp)
-
-        rows.append({
-            "Coloris": r["COLORIS"] if pd.notna(r["COLORIS"]) else "",
-            "Support": support, "Campagne": lib, "Ml": ml, "Ofs": r["NUM_OF"],
-            "Temp/min": ml_min, "Temps en h": calc_temps(ml, ml_min)
-        })
-
-    # 2) Campagnes
-    for camp in campagnes:
-        if not camp:
-            continue
-        sub = df[(df["LIB_LIGNE"] == "L09 - 4M-IMPRIMERIE") & (df["LIB_CAMPAGNE"] == camp)]
-        sub = filter_active(sub)
-        for _, r in sub.iterrows():
-            if r["NUM_OF"] in done:
-                continue
-
-            if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-                continue
-
-            lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-            support = str(r.get("COMPOSANT", ""))[:6] if pd.notna(r.get("COMPOSANT")) else ""
-
-            commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-            fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-            ml = commande - fabrique
-            if ml < 150:
-                continue
-
-            type_camp = extract_type(lib)
-            ml_min = get_ml_min(calcul_df, type_camp)
-
-            rows.append({
-                "Coloris": r["COLORIS"] if pd.notna(r["COLORIS"]) else "",
-                "Support": support, "Campagne": lib, "Ml": ml, "Ofs": r["NUM_OF"],
-                "Temp/min": ml_min, "Temps en h": calc_temps(ml, ml_min)
-            })
-
-    return pd.DataFrame(rows)
+def generate_L1(df, campagnes, urgents, journee, calcul):
+    sel = select_ofs(df, "L06 - 4M-LIGNE1", campagnes, urgents, journee)
+    lib = sel["_LIB"]
+    largeur = np.where(lib.str.upper().str.contains("3M", regex=False), " 3M", " 4M")
+    code = _first_match(lib, PRODUITS_L1)
+    produit = code.where(code == "", code + largeur)
+    ml_min = _ml_min(calcul, produit)
+    return pd.DataFrame({
+        "Campagne": lib, "Colonne2": None, "Produit": produit, "Ml": sel["_ML"],
+        "Ofs": sel["NUM_OF"], "ml / min": ml_min, "Temps en h": _temps(sel["_ML"], ml_min),
+    })
 
 
 # ---------------------------------
-# Visitage — STATUT <= 50 ; ML = COMMANDE - FABRIQUE ; ML < 150 => skip
+# L2 (MODIFIÉ) — FAMILLE = DESCRIPTION (colonne K)
 # ---------------------------------
 
-def generate_Vis(df, campagnes, urgents, journee, calcul_df):
-    rows = []
-    done = set()
+def generate_L2(df, campagnes, urgents, journee, calcul, col_k_name="DESCRIPTION"):
+    sel = select_ofs(df, "L08 - 4M-LIGNE2", campagnes, urgents, journee)
+    lib = sel["_LIB"]
+    ml_min = _ml_min(calcul, _first_match(lib, TYPES_CAMPAGNE))  # famille utilisée uniquement pour ml/min
+    return pd.DataFrame({
+        "COLORIS": _text(sel, "COLORIS"),
+        "GRAIN": _text(sel, "GRAIN"),
+        "FAMILLE": _text(sel, col_k_name),  # Remplacement par DESCRIPTION
+        "ML": sel["_ML"], "Ofs": sel["NUM_OF"],
+        "ml / min": ml_min, "Temps en h": _temps(sel["_ML"], ml_min), "Campagne": lib,
+    })
 
-    # 1) OFs du jour et urgents
-    for of in journee + [u for u in urgents if u not in journee]:
-        d = df[(df["LIB_LIGNE"] == "L10 - 4M-VISITAGE") & (df["NUM_OF"] == of)]
-        if d.empty:
-            continue
-        r = d.iloc[0]
-
-        if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-            continue
-
-        done.add(of)
-
-        lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-        couleur = extract_type(lib)
-        laise = extract_laise(r.get("LIB_FORMAT"))
-
-        commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-        fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-        ml = commande - fabrique
-        if ml < 150:
-            continue
-
-        ml_min = get_ml_min(calcul_df, couleur)
-
-        rows.append({
-            "Coloris": r["COLORIS"] if pd.notna(r["COLORIS"]) else "",
-            "Laise": laise, "Campagne": lib, "Ml": ml, "Ofs": r["NUM_OF"],
-            "ml / min": ml_min, "Temps en h": calc_temps(ml, ml_min),
-            "trg": DEFAULT_TRG, "Heure": DEFAULT_HEURE, "COULEUR": couleur
-        })
-
-    # 2) Campagnes
-    for camp in campagnes:
-        if not camp:
-            continue
-        sub = df[(df["LIB_LIGNE"] == "L10 - 4M-VISITAGE") & (df["LIB_CAMPAGNE"] == camp)]
-        sub = filter_active(sub)
-        for _, r in sub.iterrows():
-            if r["NUM_OF"] in done:
-                continue
-
-            if pd.notna(r.get("STATUT")) and r["STATUT"] > 50:
-                continue
 
-            lib = str(r["LIB_CAMPAGNE"]) if pd.notna(r["LIB_CAMPAGNE"]) else ""
-            couleur = extract_type(lib)
-            laise = extract_laise(r.get("LIB_FORMAT"))
+# ---------------------------------
+# Imprimerie — Support = 6 premiers caractères du COMPOSANT
+# ---------------------------------
 
-            commande = float(r["COMMANDE"]) if pd.notna(r["COMMANDE"]) else 0
-            fabrique = float(r["FABRIQUE"]) if "FABRIQUE" in r.index and pd.notna(r["FABRIQUE"]) else 0
-            ml = commande - fabrique
-            if ml < 150:
-                continue
+def generate_Imp(df, campagnes, urgents, journee, calcul):
+    sel = select_ofs(df, "L09 - 4M-IMPRIMERIE", campagnes, urgents, journee)
+    lib = sel["_LIB"]
+    ml_min = _ml_min(calcul, _first_match(lib, TYPES_CAMPAGNE))
+    support = sel["COMPOSANT"].astype(str).str[:6].where(sel["COMPOSANT"].notna(), "") if "COMPOSANT" in sel else ""
+    return pd.DataFrame({
+        "Coloris": _text(sel, "COLORIS"),
+        "Support": support, "Campagne": lib, "Ml": sel["_ML"], "Ofs": sel["NUM_OF"],
+        "Temp/min": ml_min, "Temps en h": _temps(sel["_ML"], ml_min),
+    })
 
-            ml_min = get_ml_min(calcul_df, couleur)
 
-            rows.append({
-                "Coloris": r["COLORIS"] if pd.notna(r["COLORIS"]) else "",
-                "Laise": laise, "Campagne": lib, "Ml": ml, "Ofs": r["NUM_OF"],
-                "ml / min": ml_min, "Temps en h": calc_temps(ml, ml_min),
-                "trg": DEFAULT_TRG, "Heure": DEFAULT_HEURE, "COULEUR": couleur
-            })
+# ---------------------------------
+# Visitage — Laise (LIB_FORMAT) et COULEUR = type de campagne
+# ---------------------------------
 
-    return pd.DataFrame(rows)
+def generate_Vis(df, campagnes, urgents, journee, calcul):
+    sel = select_ofs(df, "L10 - 4M-VISITAGE", campagnes, urgents, journee)
+    lib = sel["_LIB"]
+    couleur = _first_match(lib, TYPES_CAMPAGNE)
+    ml_min = _ml_min(calcul, couleur)
+    fmt = _text(sel, "LIB_FORMAT").astype(str).str.upper()
+    laise = np.select([fmt.str.contains("2M", regex=False), fmt.str.contains("3M", regex=False)], [2, 3], default=4)
+    return pd.DataFrame({
+        "Coloris": _text(sel, "COLORIS"),
+        "Laise": laise, "Campagne": lib, "Ml": sel["_ML"], "Ofs": sel["NUM_OF"],
+        "ml / min": ml_min, "Temps en h": _temps(sel["_ML"], ml_min),
+        "trg": DEFAULT_TRG, "Heure": DEFAULT_HEURE, "COULEUR": couleur,
+    })
 
 
 # ---------------------------------
@@ -424,10 +292,25 @@ def save_with_calcul(df_export, path, ligne_name):
             cols.insert(2, "FAMILLE")  # index 2 => colonne C
             df_export = df_export[cols]
 
-        with pd.ExcelWriter(path, engine="openpyxl") as writer:
-            df_export.to_excel(writer, sheet_name=sheet, index=False)
-            if not calcul_df.empty:
-                calcul_df.to_excel(writer, sheet_name="calcul_durée", index=False)
+        # Sauvegarde : ordre des OFs avant / après dans le journal (historique_ordres/)
+        name = OFS_TABLES[ligne_name]
+        try:
+            avant = load_table(name)["Ofs"].tolist()
+        except (OSError, KeyError):  # pas encore de classeur pour la ligne
+            avant = []
+
+        # Base SQLite : la table est remplacée, le classeur sera exporté à la demande
+        store = get_store()
+        if store is not None:
+            store.replace(name, df_export)
+        else:
+            # Fichier temporaire renommé à la fin : jamais de classeur à moitié écrit
+            with atomic_path(path) as tmp:
+                with pd.ExcelWriter(tmp, engine="openpyxl") as writer:
+                    df_export.to_excel(writer, sheet_name=sheet, index=False)
+                    if not calcul_df.empty:
+                        calcul_df.to_excel(writer, sheet_name="calcul_durée", index=False)
+        log_order(name, avant, df_export["Ofs"].tolist())
         return True
     except Exception as e:
         st.error(f"Erreur: {e}")
@@ -447,6 +330,8 @@ def show_settings():
             st.session_state["page"] = "menu"
             st.rerun()
 
+    require_uap_folder()
+
     try:
         df_suivi = load_suivi_of()
         st.success(f"✅ SUIVI_OF.xlsx : {len(df_suivi)} OFs")
@@ -463,7 +348,8 @@ def show_settings():
         st.error(f"❌ Erreur chargement SUIVI_OF: {e}")
         return
 
-    calcul_tables = {info["name"]: load_calcul_duree(info["name"]) for info in LIGNE_MAPPING.values()}
+    # ml/min compilés une fois par version des fichiers OFs (aperçus + génération)
+    calcul_tables = {info["name"]: ml_min_matcher(info["name"]) for info in LIGNE_MAPPING.values()}
 
     # Vue globale (applique filter_active => STATUT <= 50)
     st.header("📊 Vue Globale")
@@ -525,16 +411,16 @@ def show_settings():
             st.markdown("#### 📝 Prévisualisation")
 
             if ordre_final or urgents or journee:
-                calcul_df = calcul_tables.get(ligne_name, pd.DataFrame())
+                calcul = calcul_tables[ligne_name]
 
                 if ligne_name == "L1":
-                    preview = generate_L1(df_suivi, ordre_final, urgents, journee, calcul_df)
+                    preview = generate_L1(df_suivi, ordre_final, urgents, journee, calcul)
                 elif ligne_name == "L2":
-                    preview = generate_L2(df_suivi, ordre_final, urgents, journee, calcul_df, col_k_name)
+                    preview = generate_L2(df_suivi, ordre_final, urgents, journee, calcul, col_k_name)
                 elif ligne_name == "Imprimerie":
-                    preview = generate_Imp(df_suivi, ordre_final, urgents, journee, calcul_df)
+                    preview = generate_Imp(df_suivi, ordre_final, urgents, journee, calcul)
                 else:
-                    preview = generate_Vis(df_suivi, ordre_final, urgents, journee, calcul_df)
+                    preview = generate_Vis(df_suivi, ordre_final, urgents, journee, calcul)
 
                 st.success(f"✅ {len(preview)} OFs prêts")
                 with st.expander("Voir détail"):
@@ -544,29 +430,23 @@ def show_settings():
                 if not ordre_final and not urgents and not journee:
                     st.error("Aucune config!")
                 else:
-                    calcul_df = calcul_tables.get(ligne_name, pd.DataFrame())
+                    calcul = calcul_tables[ligne_name]
 
                     if ligne_name == "L1":
-                        export = generate_L1(df_suivi, ordre_final, urgents, journee, calcul_df)
+                        export = generate_L1(df_suivi, ordre_final, urgents, journee, calcul)
                     elif ligne_name == "L2":
-                        export = generate_L2(df_suivi, ordre_final, urgents, journee, calcul_df, col_k_name)
+                        export = generate_L2(df_suivi, ordre_final, urgents, journee, calcul, col_k_name)
                     elif ligne_name == "Imprimerie":
-                        export = generate_Imp(df_suivi, ordre_final, urgents, journee, calcul_df)
+                        export = generate_Imp(df_suivi, ordre_final, urgents, journee, calcul)
                     else:
-                        export = generate_Vis(df_suivi, ordre_final, urgents, journee, calcul_df)
-
-                    path = BASE_PATH / ligne_file
+                        export = generate_Vis(df_suivi, ordre_final, urgents, journee, calcul)
 
-                    # Backup
-                    if path.exists():
-                        ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        import shutil
-                        shutil.copy(path, BASE_PATH / f"{ligne_file.replace('.xlsx', '')}_backup_{ts}.xlsx")
+                    path = uap_base_path() / ligne_file
 
                     if save_with_calcul(export, path, ligne_name):
                         st.success(f"✅ {ligne_file} généré! ({len(export)} OFs)")
-                        st.cache_data.clear()
-                        st.info("💡 Le cache a été vidé. Les plannings utiliseront les nouvelles données.")
+                        notify_file_written(path)
+                        st.info(f"💡 Cache de {ligne_file} invalidé. Les plannings utiliseront les nouvelles données.")
 
     st.divider()
 
@@ -589,19 +469,20 @@ def show_settings():
                 continue
 
             try:
-                calcul_df = calcul_tables.get(ligne_name, pd.DataFrame())
+                calcul = calcul_tables[ligne_name]
 
                 if ligne_name == "L1":
-                    export = generate_L1(df_suivi, ordre, urgents, journee, calcul_df)
+                    export = generate_L1(df_suivi, ordre, urgents, journee, calcul)
                 elif ligne_name == "L2":
-                    export = generate_L2(df_suivi, ordre, urgents, journee, calcul_df, col_k_name)
+                    export = generate_L2(df_suivi, ordre, urgents, journee, calcul, col_k_name)
                 elif ligne_name == "Imprimerie":
-                    export = generate_Imp(df_suivi, ordre, urgents, journee, calcul_df)
+                    export = generate_Imp(df_suivi, ordre, urgents, journee, calcul)
                 else:
-                    export = generate_Vis(df_suivi, ordre, urgents, journee, calcul_df)
+                    export = generate_Vis(df_suivi, ordre, urgents, journee, calcul)
 
-                path = BASE_PATH / ligne_file
+                path = uap_base_path() / ligne_file
                 save_with_calcul(export, path, ligne_name)
+                notify_file_written(path)
                 results.append(f"✅ {ligne_name}: {len(export)} OFs")
             except Exception as e:
                 results.append(f"❌ {ligne_name}: {e}")
@@ -609,5 +490,32 @@ def show_settings():
         for r in results:
             st.write(r)
         st.success("🎉 Terminé!")
-        st.cache_data.clear()
-        st.info("💡 Le cache a été vidé. Retournez sur les plannings pour voir les changements.")
+        st.info("💡 Seuls les fichiers générés ont été invalidés. Retournez sur les plannings pour voir les changements.")
+
+    # Base SQLite : export des classeurs à la demande
+    store = get_store()
+    if store is not None:
+        st.divider()
+        st.header("🗄️ Export Excel (base SQLite)")
+        pending = store.pending()
+        if pending:
+            st.warning(f"Modifications non exportées : {', '.join(pending)}")
+        else:
+            st.caption("Les classeurs sont à jour avec la base.")
+        for fichier, detecte_le in store.conflicts().items():
+            st.error(
+                f"⚠️ {fichier} a été modifié hors de l'appli (détecté le {detecte_le}) alors que la base "
+                "contient des modifications non exportées : la base est conservée. L'exporter écrase le "
+                "classeur ; le reprendre abandonne les modifications de la base."
+            )
+            if st.button(f"📥 Reprendre {fichier}", key=f"reimport_{fichier}"):
+                store.reimport(fichier)
+                notify_file_written(uap_base_path() / fichier)
+                st.rerun()
+        fichiers = sorted({info["file"] for info in LIGNE_MAPPING.values()})
+        cols = st.columns(len(fichiers))
+        for col, fichier in zip(cols, fichiers):
+            with col:
+                if st.button(f"📤 {fichier}", key=f"export_{fichier}", use_container_width=True):
+                    st.session_state.export_excel = get_writeback().submit_export(fichier)
+        show_write_status("export_excel", "✅ Classeur exporté depuis la base.")
@@ -0,0 +1,137 @@
+# ============================================
+# calendrier.py — Calendrier des postes compilé
+# Version: 2026-02-09
+# ============================================
+# Le calendrier Excel (Jour, Horaire_1..3, Etat_1..3) est converti UNE fois
+# par version de fichier en tableaux NumPy datetime64 :
+#   - créneaux OUVERT : open_start / open_end
+#   - créneaux FERME  : closed_start / closed_end
+# Une requête "créneaux dans [a, b)" devient un découpage par searchsorted,
+# sans iterrows ni strptime à chaque rerun.
+
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pages.data_access import LIGNES, current_uap, load_table, table_version
+
+# '12h30-20h30' -> 12, 30, 20, 30
+HORAIRE_RE = r"^\s*(\d{1,2})h(\d{2})\s*-\s*(\d{1,2})h(\d{2})\s*$"
+POSTES = (1, 2, 3)
+
+
+def _to_datetime64(value):
+    return np.datetime64(pd.Timestamp(value).to_datetime64(), "ns")
+
+
+def _intervals(cal, etat):
+    """Tableaux (starts, ends) triés des postes dont l'état vaut 'etat'."""
+    jours = pd.to_datetime(cal["Jour"], errors="coerce").dt.normalize()
+    starts, ends = [], []
+    for i in POSTES:
+        hor_col, etat_col = f"Horaire_{i}", f"Etat_{i}"
+        if hor_col not in cal or etat_col not in cal:
+            continue
+        mask = (cal[etat_col] == etat).fillna(False).to_numpy(bool) & jours.notna().to_numpy()
+        hm = cal.loc[mask, hor_col].astype("string").str.extract(HORAIRE_RE).astype("float64")
+        ok = hm.notna().all(axis=1).to_numpy()
+        hm = hm[ok]
+        jour = jours[mask][ok].to_numpy("datetime64[ns]")
+        debut = pd.to_timedelta(hm[0] * 60 + hm[1], unit="m").to_numpy()
+        fin = pd.to_timedelta(hm[2] * 60 + hm[3], unit="m").to_numpy()
+        # Poste de nuit : la fin passe au lendemain
+        fin = np.where(fin <= debut, fin + np.timedelta64(1, "D"), fin)
+        starts.append(jour + debut)
+        ends.append(jour + fin)
+
+    if not starts:
+        empty = np.array([], dtype="datetime64[ns]")
+        return empty, empty.copy()
+    starts = np.concatenate(starts).astype("datetime64[ns]")
+    ends = np.concatenate(ends).astype("datetime64[ns]")
+    order = np.argsort(starts, kind="stable")
+    return starts[order], ends[order]
+
+
+class CompiledCalendar:
+    """Créneaux OUVERT / FERME d'un calendrier sous forme de tableaux triés."""
+
+    def __init__(self, cal_df):
+        self.open_start, self.open_end = _intervals(cal_df, "OUVERT")
+        self.closed_start, self.closed_end = _intervals(cal_df, "FERME")
+        # Fin cumulée (max glissant) : triée même si des postes se chevauchent
+        self._open_reach = np.maximum.accumulate(self.open_end) if len(self.open_end) else self.open_end
+        self._closed_reach = np.maximum.accumulate(self.closed_end) if len(self.closed_end) else self.closed_end
+
+    @staticmethod
+    def _window(starts, ends, reach, a, b):
+        a = _to_datetime64(a)
+        i0 = np.searchsorted(reach, a, side="right")
+        if b is None:
+            i1 = len(starts)
+        else:
+            b = _to_datetime64(b)
+            i1 = np.searchsorted(starts, b, side="left")
+        s, e = starts[i0:i1], ends[i0:i1]
+        keep = e > a
+        s, e = np.maximum(s[keep], a), e[keep]
+        if b is not None:
+            e = np.minimum(e, b)
+        return s, e
+
+    def open_arrays(self, a, b=None):
+        """Créneaux OUVERT qui recoupent [a, b), bornés à la fenêtre (datetime64)."""
+        return self._window(self.open_start, self.open_end, self._open_reach, a, b)
+
+    def closed_arrays(self, a, b=None):
+        """Créneaux FERME qui recoupent [a, b), bornés à la fenêtre (datetime64)."""
+        return self._window(self.closed_start, self.closed_end, self._closed_reach, a, b)
+
+    @staticmethod
+    def _as_slots(s, e):
+        starts = pd.DatetimeIndex(s).to_pydatetime()
+        ends = pd.DatetimeIndex(e).to_pydatetime()
+        return [{"start": x, "end": y} for x, y in zip(starts, ends)]
+
+    def open_slots(self, a, b=None):
+        """[{'start': datetime, 'end': datetime}, ...] des créneaux OUVERT dans [a, b)."""
+        return self._as_slots(*self.open_arrays(a, b))
+
+    def closed_slots(self, a, b=None):
+        """[{'start': datetime, 'end': datetime}, ...] des créneaux FERME dans [a, b)."""
+        return self._as_slots(*self.closed_arrays(a, b))
+
+
+# ============================================
+# CACHE PAR VERSION DE FICHIER
+# ============================================
+_compiled = {}  # (UAP, nom de table) -> (version, CompiledCalendar)
+_lock = threading.Lock()
+
+
+def get_calendar(name, uap=None):
+    """Calendrier compilé de la table 'name', recompilé seulement si le fichier a changé."""
+    key = (uap or current_uap(), name)
+    version = table_version(name, key[0])
+    entry = _compiled.get(key)
+    if entry is None or entry[0] != version:
+        with _lock:
+            entry = _compiled.get(key)
+            if entry is None or entry[0] != version:
+                entry = (version, CompiledCalendar(load_table(name, key[0])))
+                _compiled[key] = entry
+    return entry[1]
+
+
+def calendrier_ligne(ligne, uap=None):
+    """Calendrier compilé d'une ligne ("Ligne 1", "Ligne 2", ...)."""
+    return get_calendar(LIGNES[ligne]["cal"], uap)
+
+
+def open_slots(ligne, start, end=None):
+    """Créneaux OUVERT d'une ligne entre start et end (None = fin du calendrier)."""
+    if start is None:
+        start = datetime.now()
+    return calendrier_ligne(ligne).open_slots(start, end)
@@ -0,0 +1,283 @@
+# ============================================
+# data_access.py — Accès unique aux classeurs Excel
+# Version: 2026-02-09
+# ============================================
+# Un seul objet (DataRepository) connaît les chemins des classeurs et
+# garde en mémoire une copie de chaque table, partagée par toutes les
+# sessions du process Streamlit. Une table n'est relue que si SON fichier
+# a changé (mtime + taille) ; les autres restent en cache.
+# Un FileWatcher évince les tables d'un fichier dès qu'il est modifié,
+# y compris par un process externe (macro CONTROLEUR.xlsm / RunMAJ.vbs).
+# Seuls les classeurs déjà lus sont surveillés : une page ne dépend que
+# des fichiers qu'elle lit.
+#
+# Chaque UAP (4M, 2M, P2000, KLAM) a son jeu de classeurs, son repository
+# et son watcher, créés à la première utilisation de l'UAP : un utilisateur
+# de la 2M ne charge ni ne surveille les classeurs de la 4M. Les raccourcis
+# ci-dessous prennent l'UAP de la session (st.session_state["uap_selection"],
+# choisie sur la page d'accueil) ; hors session (threads de fond), l'UAP
+# doit être passée explicitement.
+
+import os
+import threading
+import time
+from pathlib import Path
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from pages.file_watcher import FileWatcher
+from pages.ingestion import SUIVI_OF_DTYPES, file_signature, load_columnar
+from pages.sqlite_store import SqliteStore
+
+# Racine des classeurs : dossier du dépôt (surchargeable par variable d'env)
+BASE_PATH = Path(
+    os.environ.get("PLANNING_BASE_PATH", Path(__file__).resolve().parent.parent)
+)
+
+# Stockage des OFs, calendriers et calcul_durée : "excel" (classeurs) ou
+# "sqlite" (base embarquée, export Excel à la demande — voir sqlite_store.py)
+STORE_BACKEND = os.environ.get("PLANNING_STORE", "excel")
+DB_PATH = Path(os.environ.get("PLANNING_DB", BASE_PATH / "planning.sqlite"))
+
+# UAP : la 4M garde BASE_PATH, les autres un sous-dossier <BASE_PATH>/<UAP>
+# (surchargeable par PLANNING_BASE_PATH_<UAP>)
+UAPS = ("4M", "2M", "P2000", "KLAM")
+DEFAULT_UAP = "4M"
+
+
+def uap_base_path(uap=None):
+    """Dossier des classeurs de l'UAP."""
+    uap = uap or current_uap()
+    env = os.environ.get(f"PLANNING_BASE_PATH_{uap}")
+    if env:
+        return Path(env)
+    return BASE_PATH if uap == DEFAULT_UAP else BASE_PATH / uap
+
+
+def uap_folder_error(uap=None):
+    """Message si le dossier des classeurs de l'UAP n'existe pas, sinon None."""
+    uap = uap or current_uap()
+    folder = uap_base_path(uap)
+    if folder.is_dir():
+        return None
+    return f"Classeurs de l'UAP {uap} introuvables : dossier '{folder}' absent."
+
+
+def require_uap_folder(uap=None):
+    """En tête de page : st.error + st.stop si le dossier de l'UAP n'existe pas."""
+    message = uap_folder_error(uap)
+    if message:
+        st.error(message)
+        st.stop()
+
+
+def uap_db_path(uap=None):
+    """Base SQLite de l'UAP (à côté de PLANNING_DB pour les UAP hors 4M)."""
+    uap = uap or current_uap()
+    return DB_PATH if uap == DEFAULT_UAP else DB_PATH.with_name(f"{DB_PATH.stem}_{uap}{DB_PATH.suffix}")
+
+
+_last_used = {}  # UAP -> time.monotonic() de la dernière page servie
+
+
+def current_uap():
+    """UAP de la session Streamlit courante (4M par défaut ou hors session)."""
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return DEFAULT_UAP
+    uap = st.session_state.get("uap_selection", DEFAULT_UAP)
+    uap = uap if uap in UAPS else DEFAULT_UAP
+    _last_used[uap] = time.monotonic()
+    return uap
+
+
+def uap_last_used(uap):
+    """Dernière utilisation de l'UAP par une session (time.monotonic), None si jamais."""
+    return _last_used.get(uap)
+
+# ============================================
+# REGISTRE DES TABLES
+# ============================================
+TABLES = {
+    "suivi_of": {"file": "SUIVI_OF.xlsx", "sheet": 0, "dtypes": SUIVI_OF_DTYPES},
+    "qualite": {"file": "Qualite.xlsx", "sheet": 0},
+    # Calendriers des postes
+    "calendrier": {"file": "Calendrier 2026.xlsx", "sheet": "Feuil1"},
+    "calendrier_l1": {"file": "Calendrier 2026 L1.xlsx", "sheet": "Feuil1"},
+    "calendrier_imprimerie": {"file": "Calendrier 2026 imprimerie.xlsx", "sheet": "Feuil1"},
+    # Séquences d'OFs par ligne
+    "ofs_l1": {"file": "OFs_L1.xlsx", "sheet": "Feuil1"},
+    "ofs_l2": {"file": "OFs_L2.xlsx", "sheet": "Sheet1"},
+    "ofs_imprimerie": {"file": "OFs_Imprimerie.xlsx", "sheet": "Feuil1"},
+    "ofs_visitage": {"file": "OFs_Visitage.xlsx", "sheet": "Feuil1"},
+    # Tables ml/min (onglet calcul_durée des fichiers OFs)
+    "calcul_l1": {"file": "OFs_L1.xlsx", "sheet": "calcul_durée"},
+    "calcul_l2": {"file": "OFs_L2.xlsx", "sheet": "calcul_durée"},
+    "calcul_imprimerie": {"file": "OFs_Imprimerie.xlsx", "sheet": "calcul_durée"},
+    "calcul_visitage": {"file": "OFs_Visitage.xlsx", "sheet": "calcul_durée"},
+}
+
+# Tables utilisées par chaque ligne (nom affiché sur les Gantt)
+LIGNES = {
+    "Ligne 1": {"ofs": "ofs_l1", "cal": "calendrier_l1", "calcul": "calcul_l1"},
+    "Imprimerie": {"ofs": "ofs_imprimerie", "cal": "calendrier_imprimerie", "calcul": "calcul_imprimerie"},
+    "Ligne 2": {"ofs": "ofs_l2", "cal": "calendrier", "calcul": "calcul_l2"},
+    "Visitage": {"ofs": "ofs_visitage", "cal": "calendrier", "calcul": "calcul_visitage"},
+}
+
+# Tables gardées dans la base SQLite (PLANNING_STORE=sqlite)
+STORE_TABLES = [n for n in TABLES if n.startswith(("ofs_", "calendrier", "calcul_"))]
+
+# Classeur du Dashboard PIC (lu cellule par cellule, hors registre)
+PIC_FILE_NAME = "Essai appli dashboard (1).xlsx"
+
+
+def pic_file(uap=None):
+    """Classeur PIC de l'UAP."""
+    return uap_base_path(uap) / PIC_FILE_NAME
+
+
+# ============================================
+# REPOSITORY
+# ============================================
+
+class DataRepository:
+    """Chemins des classeurs + une copie en mémoire par table.
+
+    'store' (SqliteStore ou None) sert les tables qu'il porte à la place
+    des classeurs."""
+
+    def __init__(self, base_path=BASE_PATH, tables=TABLES, store=None, uap=DEFAULT_UAP):
+        self.base_path = Path(base_path)
+        self.tables = tables
+        self.store = store
+        self.uap = uap
+        self._cache = {}  # nom -> (signature, DataFrame)
+        self._lock = threading.Lock()
+        self._listeners = []  # callback(path, [noms de tables])
+
+    def path(self, name):
+        """Chemin du classeur qui porte la table 'name'."""
+        return self.base_path / self.tables[name]["file"]
+
+    def version(self, name):
+        """Version courante du fichier de la table : (mtime_ns, taille) ou révision SQLite."""
+        if self.store is not None and self.store.holds(name):
+            return self.store.version(name)
+        return file_signature(self.path(name))
+
+    def _load(self, name):
+        if self.store is not None and self.store.holds(name):
+            return self.store.read(name)
+        spec = self.tables[name]
+        return load_columnar(self.path(name), sheet_name=spec["sheet"], dtypes=spec.get("dtypes"))
+
+    def get(self, name):
+        """Retourne une copie de la table, relue seulement si son fichier a changé."""
+        version = self.version(name)
+        entry = self._cache.get(name)
+        if entry is None or entry[0] != version:
+            with self._lock:
+                entry = self._cache.get(name)
+                if entry is None or entry[0] != version:
+                    entry = (version, self._load(name))
+                    self._cache[name] = entry
+        return entry[1].copy()
+
+    def invalidate(self, name):
+        """Oublie la table 'name' (relue au prochain accès)."""
+        self._cache.pop(name, None)
+
+    def tables_of(self, path):
+        """Noms des tables portées par le classeur 'path'."""
+        path = Path(path).resolve()
+        return [n for n in self.tables if self.path(n).resolve() == path]
+
+    def invalidate_file(self, path):
+        """Évince toutes les tables du classeur 'path' et prévient les abonnés."""
+        names = self.tables_of(path)
+        for name in names:
+            self.invalidate(name)
+        for callback in list(self._listeners):
+            callback(Path(path), names)
+        return names
+
+    def on_change(self, callback):
+        """Abonne callback(path, noms) aux invalidations par fichier."""
+        self._listeners.append(callback)
+
+    def files(self):
+        """Classeurs distincts du registre."""
+        return sorted({self.path(n) for n in self.tables})
+
+
+_active_uaps = []  # UAP dont le repository existe (ordre de création)
+
+
+@st.cache_resource
+def _repository(uap):
+    store = None
+    if STORE_BACKEND == "sqlite":
+        store = SqliteStore(uap_db_path(uap), uap_base_path(uap), TABLES, STORE_TABLES)
+    repo = DataRepository(uap_base_path(uap), store=store, uap=uap)
+    _active_uaps.append(uap)
+    return repo
+
+
+@st.cache_resource
+def _watcher(uap):
+    # Les classeurs s'y ajoutent à leur première lecture (load_table)
+    return FileWatcher().start()
+
+
+def get_repository(uap=None):
+    """Repository de l'UAP (un par UAP et par process, partagé entre sessions)."""
+    return _repository(uap or current_uap())
+
+
+def get_watcher(uap=None):
+    """Watcher de l'UAP : invalide son repository fichier par fichier."""
+    return _watcher(uap or current_uap())
+
+
+def active_uaps():
+    """UAP déjà utilisées dans ce process."""
+    return list(_active_uaps)
+
+
+# ============================================
+# RACCOURCIS POUR LES PAGES
+# ============================================
+
+def table_path(name, uap=None):
+    return uap_base_path(uap) / TABLES[name]["file"]
+
+
+def table_version(name, uap=None):
+    return get_repository(uap).version(name)
+
+
+def get_store(uap=None):
+    """Base SQLite du repository de l'UAP (None en stockage Excel)."""
+    return get_repository(uap).store
+
+
+def load_table(name, uap=None):
+    """Table 'name' de l'UAP ; son classeur est surveillé dès cette lecture."""
+    uap = uap or current_uap()
+    repo = get_repository(uap)
+    get_watcher(uap).watch(repo.path(name), repo.invalidate_file)
+    return repo.get(name)
+
+
+def notify_file_written(path, uap=None):
+    """À appeler après une écriture par l'appli : invalidation immédiate du fichier."""
+    changed = get_watcher(uap).check()
+    if Path(path).resolve() not in changed:
+        get_repository(uap).invalidate_file(path)
+
+
+def load_ligne(ligne, uap=None):
+    """Retourne (ofs_df, cal_df) d'une ligne ("Ligne 1", "Ligne 2", ...)."""
+    spec = LIGNES[ligne]
+    return load_table(spec["ofs"], uap), load_table(spec["cal"], uap)
@@ -0,0 +1,138 @@
+# ============================================
+# file_watcher.py — Surveillance des classeurs
+# Version: 2026-02-09
+# ============================================
+# Détecte les modifications des classeurs (export Settings, macro
+# CONTROLEUR.xlsm lancée par RunMAJ.vbs, copie OneDrive...) et prévient
+# les abonnés du fichier concerné, pour n'invalider QUE les données
+# construites à partir de ce fichier.
+#
+# Le polling sur (mtime, taille) est toujours actif : il fonctionne aussi
+# sur les dossiers synchronisés / partages réseau où inotify ne remonte
+# rien. Si le paquet optionnel 'watchdog' est installé, ses événements
+# déclenchent en plus une vérification immédiate.
+
+import threading
+from pathlib import Path
+
+from pages.ingestion import file_signature
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # watchdog optionnel : polling seul
+    FileSystemEventHandler = object
+    Observer = None
+
+# Période de polling par défaut (secondes)
+POLL_INTERVAL_S = 2.0
+
+
+def _key(path):
+    return str(Path(path).resolve())
+
+
+def _signature(key):
+    # Fichier absent (remplacé par un temporaire + renommage) : None
+    try:
+        return file_signature(key)
+    except OSError:
+        return None
+
+
+class _WatchdogHandler(FileSystemEventHandler):
+    """Relaye les événements watchdog vers FileWatcher.check()."""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_any_event(self, event):
+        paths = {getattr(event, "src_path", None), getattr(event, "dest_path", None)}
+        if any(p and _key(p) in self.watcher.watched for p in paths):
+            self.watcher.check()
+
+
+class FileWatcher:
+    """Surveille une liste de fichiers et appelle callback(path) à chaque changement."""
+
+    def __init__(self, interval=POLL_INTERVAL_S):
+        self.interval = interval
+        self.watched = {}  # chemin résolu -> signature connue
+        self._callbacks = {}  # chemin résolu -> [callback, ...]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._dirs = set()
+
+    def watch(self, path, callback):
+        """Abonne callback(path) aux modifications de 'path' (une fois par callback).
+
+        Un fichier absent est surveillé aussi : sa création est un changement."""
+        key = _key(path)
+        with self._lock:
+            if key not in self.watched:
+                self.watched[key] = _signature(key)
+            callbacks = self._callbacks.setdefault(key, [])
+            if callback in callbacks:
+                return
+            callbacks.append(callback)
+            if self._observer is not None:
+                self._schedule_dir(Path(key).parent)
+
+    def check(self):
+        """Compare les signatures et notifie les abonnés. Retourne les fichiers modifiés."""
+        changed = []
+        with self._lock:
+            for key, old in self.watched.items():
+                new = _signature(key)
+                if new != old:
+                    self.watched[key] = new
+                    changed.append((key, list(self._callbacks.get(key, []))))
+
+        # Callbacks hors verrou : ils peuvent relire le fichier
+        for key, callbacks in changed:
+            for callback in callbacks:
+                try:
+                    callback(Path(key))
+                except Exception:
+                    pass
+        return [Path(key) for key, _ in changed]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception:  # le polling ne doit jamais s'arrêter
+                pass
+
+    def _schedule_dir(self, directory):
+        if directory not in self._dirs:
+            try:
+                self._observer.schedule(_WatchdogHandler(self), str(directory), recursive=False)
+            except OSError:  # dossier absent : le polling suffit
+                return
+            self._dirs.add(directory)
+
+    def start(self):
+        """Démarre le thread de polling (et l'observer watchdog si disponible)."""
+        if self._thread is not None:
+            return self
+        if Observer is not None:
+            try:
+                self._observer = Observer()
+                with self._lock:
+                    for key in self.watched:
+                        self._schedule_dir(Path(key).parent)
+                self._observer.daemon = True
+                self._observer.start()
+            except Exception:
+                self._observer = None
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._observer is not None:
+            self._observer.stop()
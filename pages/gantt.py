@@ -0,0 +1,189 @@
+# ============================================
+# gantt.py — Construction groupée des Gantt Plotly
+# Version: 2026-02-09
+# ============================================
+# Au lieu d'un go.Bar / add_shape / add_annotation par segment, les
+# éléments d'un Gantt sont émis en quelques traces à tableaux :
+#   - add_bars     : une trace Bar par rangée (couleurs / textes par point)
+#   - add_lines    : traits horizontaux, une trace Scatter par couleur
+#   - add_blocks   : rectangles pleins (ARRET) + leur texte, 2 traces
+#   - add_pastilles: pastilles de statut, une trace Scatter texte
+# Pour les vues à défilement (L1 / L2), viewport() + in_viewport() limitent
+# les éléments émis à la fenêtre affichée (plus une marge) : la taille de la
+# figure dépend de la largeur de vue, plus de l'horizon planifié.
+# client_scroll() donne l'inverse : tout l'horizon est envoyé une fois et
+# le défilement / zoom se fait dans le navigateur (pan, molette, barre de
+# défilement), sans rerun Python.
+# Les traits, rectangles et pastilles étaient positionnés en coordonnées
+# "paper" : ils sont tracés sur un axe y2 invisible [0, 1] superposé à y,
+# ce qui garde exactement leur position.
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+PAPER_AXIS = "y2"
+
+# Marge autour de la fenêtre affichée (heures)
+VIEWPORT_MARGIN_H = 2
+
+# Config Plotly du défilement navigateur (à passer à st.plotly_chart)
+CLIENT_SCROLL_CONFIG = {"scrollZoom": True, "displayModeBar": False}
+
+# Format des graduations selon le zoom (ms) : heures, puis jours
+_TICKFORMATSTOPS = [
+    dict(dtickrange=[None, 86400000], value="%Hh"),
+    dict(dtickrange=[86400000, None], value="%d/%m"),
+]
+
+
+def _dates(values):
+    return pd.DatetimeIndex(pd.to_datetime(pd.Series(values), errors="coerce"))
+
+
+def _as_list(value, n):
+    if isinstance(value, (list, tuple, np.ndarray, pd.Series, pd.Index)):
+        return list(value)
+    return [value] * n
+
+
+def _paper_axis(fig):
+    fig.update_layout(
+        yaxis2=dict(overlaying="y", type="linear", range=[0, 1], visible=False, fixedrange=True)
+    )
+
+
+def viewport(view_start, view_end, margin_h=VIEWPORT_MARGIN_H):
+    """Fenêtre [view_start - marge, view_end + marge] des éléments à émettre."""
+    margin = timedelta(hours=margin_h)
+    return view_start - margin, view_end + margin
+
+
+def in_viewport(df, win_start, win_end, start_col="start", end_col="end"):
+    """Lignes de df dont [start, end] recoupe [win_start, win_end]."""
+    if df.empty:
+        return df
+    mask = (df[end_col] > pd.Timestamp(win_start)) & (df[start_col] < pd.Timestamp(win_end))
+    return df[mask]
+
+
+def client_scroll(fig, view_start, view_end, min_x=None, max_x=None):
+    """Fenêtre initiale [view_start, view_end] défilable dans le navigateur.
+
+    L'axe x devient déplaçable (glisser, molette) avec une barre de
+    défilement ; min_x / max_x bornent le défilement à l'horizon."""
+    fig.update_xaxes(
+        range=[view_start, view_end],
+        fixedrange=False,
+        dtick=None,
+        tickformatstops=_TICKFORMATSTOPS,
+        rangeslider=dict(visible=True, thickness=0.08, bgcolor="#555555"),
+        minallowed=min_x,
+        maxallowed=max_x,
+    )
+    fig.update_layout(dragmode="pan")
+    return fig
+
+
+def paper_y(index, n_categories, shift_px=0, plot_height_px=None):
+    """Position 'paper' du centre de la catégorie 'index' (0 = en bas),
+    décalée de shift_px pixels (négatif = vers le bas)."""
+    y = (index + 0.5) / n_categories
+    if shift_px and plot_height_px:
+        y += shift_px / plot_height_px
+    return y
+
+
+def add_bars(fig, y, start, end, color, text=None, text_color="#000000", hover=None,
+             line_color="#000000", line_width=1, font_size=9, font_family=None,
+             insidetextanchor="middle", textposition="inside"):
+    """Une trace Bar horizontale pour tous les segments d'une rangée."""
+    start = _dates(start)
+    end = _dates(end)
+    n = len(start)
+    if n == 0:
+        return fig
+    dur_ms = (end - start).total_seconds().to_numpy() * 1000
+    text = _as_list(text, n) if text is not None else None
+    hover = _as_list(hover, n) if hover is not None else text
+    font = dict(size=font_size, color=_as_list(text_color, n))
+    if font_family:
+        font["family"] = font_family
+    fig.add_trace(go.Bar(
+        x=dur_ms,
+        y=_as_list(y, n),
+        base=list(start.to_pydatetime()),
+        orientation="h",
+        marker=dict(color=_as_list(color, n), line=dict(color=line_color, width=line_width)),
+        text=text,
+        textposition=textposition,
+        insidetextanchor=insidetextanchor,
+        textfont=font,
+        hovertext=hover,
+        hovertemplate="%{hovertext}<extra></extra>" if hover is not None else None,
+        showlegend=False,
+    ))
+    return fig
+
+
+def add_lines(fig, start, end, y, color, width=3):
+    """Traits horizontaux [start, end] à la hauteur 'paper' y, une trace par couleur."""
+    start = _dates(start)
+    end = _dates(end)
+    if len(start) == 0:
+        return fig
+    _paper_axis(fig)
+    df = pd.DataFrame({"start": start, "end": end, "y": _as_list(y, len(start)), "color": _as_list(color, len(start))})
+    for col, grp in df.groupby("color", sort=False):
+        xs, ys = [], []
+        for s, e, yy in zip(grp["start"], grp["end"], grp["y"]):
+            xs += [s, e, None]
+            ys += [yy, yy, None]
+        fig.add_trace(go.Scatter(
+            x=xs, y=ys, yaxis=PAPER_AXIS, mode="lines",
+            line=dict(color=col, width=width),
+            hoverinfo="skip", showlegend=False,
+        ))
+    return fig
+
+
+def add_blocks(fig, start, end, color, y0=0.05, y1=0.95, opacity=1.0, text=None, font=None):
+    """Rectangles pleins [start, end] x [y0, y1] (paper) + texte centré."""
+    start = _dates(start)
+    end = _dates(end)
+    if len(start) == 0:
+        return fig
+    _paper_axis(fig)
+    xs, ys = [], []
+    for s, e in zip(start, end):
+        xs += [s, e, e, s, s, None]
+        ys += [y0, y0, y1, y1, y0, None]
+    fig.add_trace(go.Scatter(
+        x=xs, y=ys, yaxis=PAPER_AXIS, mode="lines",
+        fill="toself", fillcolor=color, opacity=opacity,
+        line=dict(width=0), hoverinfo="skip", showlegend=False,
+    ))
+    if text:
+        mid = start + (end - start) / 2
+        fig.add_trace(go.Scatter(
+            x=list(mid.to_pydatetime()), y=[(y0 + y1) / 2] * len(mid), yaxis=PAPER_AXIS,
+            mode="text", text=[text] * len(mid), textfont=font or {},
+            hoverinfo="skip", showlegend=False,
+        ))
+    return fig
+
+
+def add_pastilles(fig, x, y, text="🟢", size=12):
+    """Pastilles (emoji) aux instants x, hauteur 'paper' y."""
+    x = _dates(x)
+    if len(x) == 0:
+        return fig
+    _paper_axis(fig)
+    fig.add_trace(go.Scatter(
+        x=list(x.to_pydatetime()), y=_as_list(y, len(x)), yaxis=PAPER_AXIS,
+        mode="text", text=[text] * len(x), textfont=dict(size=size),
+        hoverinfo="skip", showlegend=False,
+    ))
+    return fig
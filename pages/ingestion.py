@@ -0,0 +1,230 @@
+# ============================================
+# ingestion.py — Copie colonnaire (Parquet) des classeurs Excel
+# Version: 2026-02-09
+# ============================================
+# Le classeur Excel n'est parsé qu'une seule fois par
+# version du fichier : le résultat typé est stocké en Parquet dans un
+# dossier local (hors OneDrive) et relu directement par les pages.
+# La version est identifiée par mtime + taille, puis par hash du contenu
+# (un simple "touch" OneDrive ne déclenche donc pas de re-conversion).
+#
+# Lecture Excel : read_excel() utilise le lecteur compilé python-calamine
+# s'il est installé (pip install python-calamine), sinon openpyxl.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from datetime import date, datetime, time
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401  (lecteur compilé optionnel)
+    EXCEL_ENGINE = "calamine"
+except ImportError:
+    EXCEL_ENGINE = "openpyxl"
+
+# Dossier local pour les copies colonnaires (surchargeable par variable d'env)
+CACHE_DIR = Path(
+    os.environ.get("PLANNING_CACHE_DIR", Path(tempfile.gettempdir()) / "planning_digital")
+)
+
+# Types déclarés de SUIVI_OF (les autres colonnes sont normalisées automatiquement)
+SUIVI_OF_DTYPES = {
+    "CAMPAGNE": "float64",
+    "NUM_OF": "int64",
+    "STATUT": "int64",
+    "OF_VISITAGE": "int64",
+    "STATUT_VISITAGE": "float64",
+    "COMMANDE": "float64",
+    "FABRIQUE": "float64",
+    "STOCK_COMPOSANT": "float64",
+    "DATE DEMANDE": "datetime64[ns]",
+    "DEBUT": "datetime64[ns]",
+}
+
+# Version du format de conversion : la changer force la reconversion des copies
+CONVERSION_FORMAT = 2
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+# ============================================
+# LECTURE EXCEL
+# ============================================
+
+def read_excel(path, sheet_name=0, usecols=None, **kwargs):
+    """pd.read_excel avec le moteur le plus rapide disponible.
+
+    usecols : colonnes à garder (noms, lettres "A:D" ou indices).
+    Si calamine échoue sur un classeur, nouvelle lecture avec openpyxl."""
+    if EXCEL_ENGINE != "openpyxl":
+        try:
+            return pd.read_excel(path, sheet_name=sheet_name, usecols=usecols, engine=EXCEL_ENGINE, **kwargs)
+        except FileNotFoundError:
+            raise
+        except Exception:
+            pass  # classeur non supporté par calamine : repli openpyxl
+    return pd.read_excel(path, sheet_name=sheet_name, usecols=usecols, engine="openpyxl", **kwargs)
+
+
+# ============================================
+# SIGNATURE DES FICHIERS
+# ============================================
+
+def file_signature(path):
+    """Retourne (mtime_ns, taille) du fichier — lecture disque très rapide."""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Hash SHA-1 du contenu du fichier."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _cache_key(path, sheet_name):
+    path = Path(path)
+    ident = f"{path.resolve()}|{sheet_name}".encode("utf-8")
+    return f"{path.stem}_{hashlib.sha1(ident).hexdigest()[:12]}"
+
+
+def _lock_for(key):
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+# ============================================
+# TYPAGE
+# ============================================
+
+def _apply_dtypes(df, dtypes):
+    """Applique les types déclarés (int64 retombe en float64 s'il y a des trous)."""
+    for col, dtype in (dtypes or {}).items():
+        if col not in df.columns:
+            continue
+        if dtype.startswith("datetime"):
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+            continue
+        s = pd.to_numeric(df[col], errors="coerce")
+        if dtype.startswith("int") and s.isna().any():
+            dtype = "float64"
+        df[col] = s.astype(dtype)
+    return df
+
+
+def _normalize_objects(df, skip=()):
+    """Rend les colonnes 'object' homogènes pour Parquet (dates, nombres ou texte)."""
+    for col in df.columns:
+        if col in skip or df[col].dtype != object:
+            continue
+        values = df[col].dropna()
+        if values.empty:
+            continue
+        is_date = values.map(lambda v: isinstance(v, (datetime, date)))
+        if is_date.all():
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+        elif is_date.any() and values.map(lambda v: isinstance(v, (datetime, date, time))).all():
+            # Dates + cellules vides formatées "00:00:00" (time) : ces heures seules -> NaT
+            df[col] = pd.to_datetime(df[col].map(lambda v: v if isinstance(v, (datetime, date)) else None), errors="coerce")
+        elif values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool)).all():
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        elif not values.map(lambda v: isinstance(v, str)).all():
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+# ============================================
+# MANIFESTE + ÉCRITURE ATOMIQUE
+# ============================================
+
+def _read_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_manifest(manifest_path, manifest):
+    tmp = manifest_path.with_suffix(".json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, manifest_path)
+
+
+def _write_parquet(df, parquet_path):
+    tmp = parquet_path.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp, index=False)
+    os.replace(tmp, parquet_path)
+
+
+# ============================================
+# API
+# ============================================
+
+def ensure_columnar(path, sheet_name=0, dtypes=None):
+    """Garantit une copie Parquet à jour du classeur et retourne son chemin.
+
+    La conversion Excel n'a lieu que si le contenu du fichier a changé."""
+    path = Path(path)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    key = _cache_key(path, sheet_name)
+    parquet_path = CACHE_DIR / f"{key}.parquet"
+    manifest_path = CACHE_DIR / f"{key}.json"
+
+    with _lock_for(key):
+        mtime_ns, size = file_signature(path)
+        manifest = _read_manifest(manifest_path)
+        fresh = (
+            manifest is not None
+            and parquet_path.exists()
+            and manifest.get("dtypes") == dtypes
+            and manifest.get("format") == CONVERSION_FORMAT
+        )
+
+        if fresh and manifest["mtime_ns"] == mtime_ns and manifest["size"] == size:
+            return parquet_path
+
+        digest = file_hash(path)
+        if fresh and manifest["sha1"] == digest:
+            # Fichier "touché" (synchro OneDrive) mais contenu identique
+            manifest.update(mtime_ns=mtime_ns, size=size)
+            _write_manifest(manifest_path, manifest)
+            return parquet_path
+
+        df = read_excel(path, sheet_name=sheet_name)
+        df = _apply_dtypes(df, dtypes)
+        df = _normalize_objects(df, skip=set(dtypes or {}))
+        _write_parquet(df, parquet_path)
+        _write_manifest(manifest_path, {
+            "source": str(path),
+            "sheet": sheet_name,
+            "mtime_ns": mtime_ns,
+            "size": size,
+            "sha1": digest,
+            "dtypes": dtypes,
+            "rows": len(df),
+            "format": CONVERSION_FORMAT,
+        })
+        return parquet_path
+
+
+def load_columnar(path, sheet_name=0, dtypes=None, columns=None):
+    """Lit la copie colonnaire du classeur (créée/rafraîchie si nécessaire).
+
+    Si Parquet n'est pas disponible, retombe sur une lecture Excel directe."""
+    try:
+        parquet_path = ensure_columnar(path, sheet_name, dtypes)
+    except ImportError:
+        df = read_excel(path, sheet_name=sheet_name, usecols=columns)
+        return _apply_dtypes(df, dtypes)
+    return pd.read_parquet(parquet_path, columns=columns)
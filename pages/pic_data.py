@@ -0,0 +1,166 @@
+# ============================================
+# pic_data.py — Lecture du classeur du Dashboard PIC
+# Version: 2026-02-09
+# ============================================
+# Le classeur PIC est ouvert UNE fois par version de fichier (openpyxl en
+# read_only, un seul iter_rows borné aux colonnes A:AM) ; tous les blocs
+# du Dashboard PIC en sont extraits dans un objet PicData :
+#   - PIC mensuel réalisé / prévu (A3:C14), ruptures (Q2), En-cours (Q4)
+#   - adhérence S-1 (T2) et hebdomadaire (V3:W51)
+#   - campagnes du mois (G:N) et campagnes à venir (Z:AH)
+#   - soucis de cylindre (AJ:AM, de la ligne 2 à la fin de la feuille)
+# L'objet est partagé entre sessions : ne pas modifier ses DataFrames.
+# Un classeur PIC par UAP (data_access.pic_file), mis en cache par UAP.
+
+import threading
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from pages.data_access import current_uap, pic_file
+from pages.ingestion import file_signature
+
+PIC_SHEET = "2025"
+
+# Bloc principal lu en grille (lignes 1..51, colonnes A..AM)
+GRID_ROWS = 51
+GRID_COLS = 39
+# Soucis de cylindre : AJ=36 .. AM=39 (A=1)
+COL_AJ, COL_AM = 36, 39
+
+ISSUES_COLUMNS = ["Cylindre", "Délai", "Retour prévu", "Impact client"]
+
+
+def _cell(value):
+    # Comme pandas.read_excel : un flottant entier devient un int
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _issues(rows):
+    """DataFrame des soucis de cylindre (AJ:AM), trié par date de retour."""
+    rows = [r for r in rows if not (r[0] is None or (isinstance(r[0], str) and r[0].strip() == ""))]
+    issues = pd.DataFrame(rows, columns=ISSUES_COLUMNS)
+    if not issues.empty:
+        # Normalise la date (AL)
+        issues["Retour prévu"] = pd.to_datetime(issues["Retour prévu"], errors="coerce", dayfirst=True)
+        # Colonne pour affichage
+        issues["Retour prévu (aff.)"] = issues["Retour prévu"].dt.strftime("%d/%m/%Y")
+        # Tri par date de retour (les NaT passent en bas)
+        issues = issues.sort_values(by=["Retour prévu"], na_position="last").reset_index(drop=True)
+    return issues
+
+
+class PicData:
+    """Blocs du classeur PIC, typés, extraits d'une seule lecture."""
+
+    def __init__(self, grid, cylindres, en_cours_visitage):
+        self.mois = grid.iloc[2:14, 0].tolist()
+
+        self.pic_realise = pd.Series(
+            pd.to_numeric(grid.iloc[2:14, 1], errors="coerce").fillna(0).astype(int).values,
+            index=self.mois,
+        )
+        self.pic_prevu = pd.Series(
+            pd.to_numeric(grid.iloc[2:14, 2], errors="coerce").fillna(0).astype(int).values,
+            index=self.mois,
+        )
+        self.ruptures = int(grid.iloc[1, 16])
+        self.en_cours_visitage = en_cours_visitage if en_cours_visitage is not None else 0
+
+        # Taux d'adhérence global (W2) et S-1 (T2)
+        raw_adherence = pd.to_numeric(grid.iloc[1, 22], errors="coerce")
+        self.taux_adherence = (raw_adherence * 100) if pd.notna(raw_adherence) else 0
+        self.adherence_s1 = pd.to_numeric(grid.iloc[1, 19], errors="coerce")
+
+        # Campagnes à venir (Z à AH)
+        self.campagnes = grid.iloc[1, 25:34].tolist()
+        campagne_data = grid.iloc[2:14, 25:34].apply(pd.to_numeric, errors="coerce").fillna(0)
+        campagne_data.columns = self.campagnes
+        campagne_data.index = self.mois
+        self.campagne_data = campagne_data
+
+        # Campagnes du mois (G à N) : camembert + heatmap
+        self.campagne_labels = grid.iloc[1, 6:14].tolist()
+        heatmap = grid.iloc[2:14, 6:14].apply(pd.to_numeric, errors="coerce").fillna(0)
+        heatmap.columns = self.campagne_labels
+        heatmap.index = self.mois
+        self.campagne_heatmap = heatmap
+
+        # Données hebdomadaires (V, W)
+        weekly = grid.iloc[2:GRID_ROWS, [21, 22]].copy()
+        weekly.columns = ["Semaine", "Taux d'adhérence"]
+        weekly = weekly.dropna()
+        weekly["Taux d'adhérence"] = (pd.to_numeric(weekly["Taux d'adhérence"], errors="coerce") * 100).round(1)
+        weekly["Semaine"] = weekly["Semaine"].astype(int)
+        self.weekly = weekly
+
+        # Soucis de cylindre (AJ:AM)
+        self.issues_error = None
+        try:
+            self.issues = _issues(cylindres)
+        except Exception as e:
+            self.issues = pd.DataFrame(columns=["Cylindre", "Délai", "Retour prévu (aff.)", "Impact client"])
+            self.issues_error = str(e)
+
+    def campagne_values(self, mois):
+        """Valeurs G:N du mois 'mois' (numériques, 0 si vide)."""
+        return self.campagne_heatmap.loc[mois]
+
+    @property
+    def nb_cylindres(self):
+        return len(self.issues)
+
+    @property
+    def prochaine_date_aff(self):
+        if self.issues.empty or "Retour prévu" not in self.issues:
+            return "—"
+        prochaine = self.issues["Retour prévu"].dropna().min()
+        return prochaine.strftime("%d/%m/%Y") if pd.notna(prochaine) else "—"
+
+
+def read_pic(path=None, sheet=PIC_SHEET):
+    """Lit le classeur PIC (par défaut celui de l'UAP de la session) en un passage (read_only) et rend un PicData."""
+    if path is None:
+        path = pic_file(current_uap())
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        # Onglet "2025" s'il existe, sinon le premier (autre année)
+        ws = wb[sheet] if sheet in wb.sheetnames else wb.worksheets[0]
+        grid, cylindres = [], []
+        for r, row in enumerate(ws.iter_rows(min_row=1, max_col=COL_AM, values_only=True), start=1):
+            row = [_cell(v) for v in row] + [None] * (COL_AM - len(row))
+            if r <= GRID_ROWS:
+                grid.append(row[:GRID_COLS])
+            if r >= 2:
+                cylindres.append(row[COL_AJ - 1:COL_AM])
+        en_cours_visitage = grid[3][16] if len(grid) > 3 else None  # Q4
+    finally:
+        wb.close()
+
+    grid = pd.DataFrame(grid, dtype=object).reindex(range(GRID_ROWS))
+    grid = grid.where(grid.notna(), float("nan"))
+    return PicData(grid, cylindres, en_cours_visitage)
+
+
+# ============================================
+# CACHE PAR VERSION DE FICHIER
+# ============================================
+_pic = {}  # UAP -> (version, PicData)
+_lock = threading.Lock()
+
+
+def load_pic(uap=None):
+    """Classeur PIC de l'UAP extrait, relu seulement si le fichier a changé."""
+    uap = uap or current_uap()
+    path = pic_file(uap)
+    version = file_signature(path)
+    entry = _pic.get(uap)
+    if entry is None or entry[0] != version:
+        with _lock:
+            entry = _pic.get(uap)
+            if entry is None or entry[0] != version:
+                entry = (version, read_pic(path))
+                _pic[uap] = entry
+    return entry[1]
@@ -0,0 +1,116 @@
+# ============================================
+# plan_cache.py — Cache partagé des plannings par ligne
+# Version: 2026-02-09
+# ============================================
+# Un planning ne dépend que de :
+#   - la table d'OFs dans l'ordre (empreinte du contenu)
+#   - la version du fichier calendrier de la ligne
+#   - l'instant de départ "now", arrondi à un créneau de NOW_BUCKET_MIN
+#     minutes (et la fin d'horizon)
+# Le résultat est gardé dans un cache LRU commun au processus : les pages
+# de ligne, le Planning Global et plusieurs utilisateurs qui regardent la
+# même ligne réutilisent le même calcul. La clé porte l'UAP : deux UAP ne
+# partagent jamais un planning.
+# Les plannings préchauffés par le refresher (warm=True) ont leur propre
+# cache, dimensionné pour un passage complet : ils n'évincent jamais les
+# plannings calculés pour les utilisateurs.
+
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from pages.data_access import LIGNES, UAPS, current_uap, table_version
+
+# Arrondi de "now" (minutes) et nombre de plannings gardés
+NOW_BUCKET_MIN = 5
+PLAN_CACHE_SIZE = 32
+# Préchauffage : planning de la semaine + planning long, par ligne et par UAP
+PREWARM_CACHE_SIZE = 2 * len(LIGNES) * len(UAPS)
+
+
+def now_bucket(now=None, minutes=NOW_BUCKET_MIN):
+    """'now' arrondi à l'inférieur sur un pas de 'minutes' (datetime naïf)."""
+    now = now or datetime.now()
+    now = now.replace(second=0, microsecond=0)
+    return now.replace(minute=now.minute - now.minute % minutes)
+
+
+def ofs_hash(ofs_df):
+    """Empreinte du contenu ET de l'ordre d'une table d'OFs."""
+    h = hashlib.sha1()
+    h.update(repr(list(ofs_df.columns)).encode())
+    try:
+        values = pd.util.hash_pandas_object(ofs_df, index=False)
+    except TypeError:  # colonnes objet de types mélangés
+        values = pd.util.hash_pandas_object(ofs_df.astype(str), index=False)
+    h.update(np.ascontiguousarray(values.to_numpy()).tobytes())
+    return h.hexdigest()
+
+
+class PlanCache:
+    """Cache LRU thread-safe clé -> planning (DataFrame ou scheduler.SegmentTable)."""
+
+    def __init__(self, maxsize=PLAN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = PlanCache()
+_warm_cache = PlanCache(PREWARM_CACHE_SIZE)
+
+
+def plan_key(ligne, ofs_df, start, end=None, variant="", uap=None):
+    """Clé (UAP, ligne, variante, empreinte OFs, version calendrier, début, fin)."""
+    uap = uap or current_uap()
+    return (
+        uap,
+        ligne,
+        variant,
+        ofs_hash(ofs_df),
+        table_version(LIGNES[ligne]["cal"], uap),
+        pd.Timestamp(start),
+        pd.Timestamp(end) if end is not None else None,
+    )
+
+
+def cached_plan(ligne, ofs_df, start, end, compute, variant="", uap=None, warm=False):
+    """Planning de 'ligne' depuis le cache, ou compute() s'il est absent.
+
+    'variant' distingue les plannings d'une même ligne calculés par des
+    fonctions différentes (page de ligne / Planning Global). 'warm' : calcul
+    du refresher, gardé dans le cache de préchauffage. Une copie est
+    rendue : l'appelant peut ajouter des colonnes sans toucher au cache."""
+    key = plan_key(ligne, ofs_df, start, end, variant, uap)
+    planning = _cache.get(key)
+    if planning is None:
+        planning = _warm_cache.get(key)
+    if planning is None:
+        planning = compute()
+        (_warm_cache if warm else _cache).put(key, planning)
+    return planning.copy()
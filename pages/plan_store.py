@@ -0,0 +1,283 @@
+# ============================================
+# plan_store.py — Ordre des OFs versionné, partagé entre sessions
+# Version: 2026-02-09
+# ============================================
+# Plusieurs planificateurs peuvent ouvrir la même page de ligne. Le store
+# garde pour chaque table d'OFs l'ordre courant et un numéro de version :
+#   - chaque session retient la version de départ de son ordre
+#   - une écriture part de cette version : si quelqu'un a écrit entre-temps,
+#     les deux séries de déplacements sont fusionnées, ou l'écriture est
+#     refusée (PlanConflict) si les mêmes OFs ont bougé des deux côtés
+#   - après une écriture, les sessions ouvertes reçoivent le nouvel ordre
+#     (sync_order) : les ID_PLAN ('<n° de ligne>_<Ofs>') sont traduits
+#     d'une version à l'autre, sans relire le classeur ni réparer l'ordre
+# Un export externe (CONTROLEUR.xlsm) crée aussi une version : l'ordre est
+# alors celui du fichier, les ID_PLAN sont rapprochés par numéro d'OF.
+# Un store par UAP.
+
+import threading
+from bisect import bisect_left
+
+import streamlit as st
+
+from pages.data_access import current_uap, load_table, table_version
+
+# Nombre de passages de version gardés pour traduire les ordres des sessions
+PLAN_HISTORY = 50
+
+
+class PlanConflict(Exception):
+    """Écriture refusée : les mêmes OFs ont été déplacés par un autre planificateur."""
+
+    def __init__(self, name, version, ids):
+        self.name = name
+        self.version = version
+        self.ids = list(ids)
+        ofs = ", ".join(str(x).split("_", 1)[-1] for x in self.ids[:5]) or "ordre trop ancien"
+        super().__init__(
+            f"ordre modifié par un autre planificateur (version {version}) — "
+            f"OFs déplacés des deux côtés : {ofs}. Réinitialisez l'ordre puis recommencez."
+        )
+
+
+def plan_ids(df):
+    """ID_PLAN des pages de planning : '<n° de ligne>_<Ofs>'."""
+    return df.index.astype(str) + "_" + df["Ofs"].astype(str)
+
+
+# ============================================
+# FUSION DE DEUX SÉRIES DE DÉPLACEMENTS
+# ============================================
+
+def _moved(base, ordre):
+    """OFs de 'ordre' déplacés par rapport à 'base'.
+
+    Les OFs restés en place forment la plus longue sous-suite commune aux
+    deux ordres (sous-suite croissante des positions dans 'base')."""
+    rank = {x: i for i, x in enumerate(base)}
+    items = [x for x in ordre if x in rank]
+    tails, tails_idx, parent = [], [], [None] * len(items)
+    for i, x in enumerate(items):
+        k = bisect_left(tails, rank[x])
+        if k == len(tails):
+            tails.append(rank[x])
+            tails_idx.append(i)
+        else:
+            tails[k] = rank[x]
+            tails_idx[k] = i
+        parent[i] = tails_idx[k - 1] if k else None
+    stable = set()
+    i = tails_idx[-1] if tails_idx else None
+    while i is not None:
+        stable.add(items[i])
+        i = parent[i]
+    return {x for x in items if x not in stable}
+
+
+def merge_orders(base, theirs, mine, name="", version=None):
+    """Fusionne 'mine' (parti de 'base') dans 'theirs' (écrit depuis 'base').
+
+    Les OFs que 'mine' a retirés de 'base' sont retirés ; les OFs absents de
+    'base' (nouveaux ou exclus de la page) restent à leur place dans 'theirs'.
+    PlanConflict si un même OF a été déplacé des deux côtés."""
+    if mine == base or mine == theirs:
+        return list(theirs)
+    if theirs == base:
+        return list(mine)
+
+    moved_mine = _moved(base, mine)
+    common = _moved(base, theirs) & moved_mine
+    if common:
+        raise PlanConflict(name, version, [x for x in mine if x in common])
+
+    dropped = set(base) - set(mine)
+    result = [x for x in theirs if x not in moved_mine and x not in dropped]
+    present = set(theirs)
+    for i, x in enumerate(mine):
+        if x not in moved_mine or x not in present:
+            continue
+        # Réinséré derrière son prédécesseur dans 'mine' (déjà placé)
+        prev = next((p for p in reversed(mine[:i]) if p in result), None)
+        result.insert(result.index(prev) + 1 if prev is not None else 0, x)
+    return result
+
+
+def _rename_by_ofs(old_ids, new_ids):
+    """{ancien ID_PLAN: nouveau} par numéro d'OF (k-ième occurrence -> k-ième)."""
+    by_of = {}
+    for x in new_ids:
+        by_of.setdefault(str(x).split("_", 1)[-1], []).append(x)
+    counters = {}
+    rename = {}
+    for x in old_ids:
+        ofs = str(x).split("_", 1)[-1]
+        k = counters.get(ofs, 0)
+        if k < len(by_of.get(ofs, [])):
+            rename[x] = by_of[ofs][k]
+            counters[ofs] = k + 1
+    return rename
+
+
+# ============================================
+# STORE
+# ============================================
+
+class PlanStore:
+    """Ordre courant (ID_PLAN) et version de chaque table d'OFs de l'UAP 'uap'."""
+
+    def __init__(self, uap, history=PLAN_HISTORY):
+        self.uap = uap
+        self.history = history
+        self._plans = {}  # nom -> {"version", "signature", "ordre", "renames": {v: {ancien: nouveau}}}
+        self._lock = threading.RLock()
+
+    def _advance(self, entry, ordre, signature, rename):
+        version = entry["version"] if entry else 0
+        renames = dict(entry["renames"]) if entry else {}
+        renames[version] = rename
+        for v in [v for v in renames if v <= version - self.history]:
+            del renames[v]
+        return {"version": version + 1, "signature": signature, "ordre": list(ordre), "renames": renames}
+
+    def current(self, name):
+        """(version, ordre) de la table 'name' ; nouvelle version si le fichier a changé."""
+        with self._lock:
+            signature = table_version(name, self.uap)
+            entry = self._plans.get(name)
+            if entry is None or entry["signature"] != signature:
+                ordre = list(plan_ids(load_table(name, self.uap)))
+                rename = _rename_by_ofs(entry["ordre"], ordre) if entry else {}
+                entry = self._advance(entry, ordre, signature, rename)
+                self._plans[name] = entry
+            return entry["version"], list(entry["ordre"])
+
+    def translate(self, name, ids, version):
+        """'ids' (ID_PLAN de la version 'version') traduits dans la version courante.
+
+        Les OFs disparus sont retirés ; None si la version est trop ancienne."""
+        with self._lock:
+            entry = self._plans.get(name)
+            if entry is None:
+                return None
+            ids = list(ids)
+            for v in range(version, entry["version"]):
+                rename = entry["renames"].get(v)
+                if rename is None:
+                    return None
+                ids = [rename[x] for x in ids if x in rename]
+            return ids
+
+    def rebase(self, name, base_version, base, ordre):
+        """(version, ordre courant, ordre à écrire) : 'ordre' rejoué sur la version courante.
+
+        PlanConflict si la fusion est impossible."""
+        with self._lock:
+            version, courant = self.current(name)
+            if base_version is None or not base:
+                return version, courant, list(ordre)
+            if base_version == version:
+                # Même version : 'base' peut différer de l'ordre courant si la
+                # session a gardé ses déplacements après un conflit (sync_order)
+                shown = set(base) | set(ordre)
+                theirs = [x for x in courant if x in shown]
+                return version, courant, merge_orders(list(base), theirs, list(ordre), name, version)
+            base_t = self.translate(name, base, base_version)
+            mine_t = self.translate(name, ordre, base_version)
+            if base_t is None or mine_t is None:
+                raise PlanConflict(name, version, [])
+            return version, courant, merge_orders(base_t, courant, mine_t, name, version)
+
+    def written(self, name, ordre, signature):
+        """Enregistre 'ordre' écrit dans le fichier : les lignes sont renumérotées."""
+        with self._lock:
+            entry = self._plans.get(name)
+            new_ids = [f"{i}_{str(x).split('_', 1)[-1]}" for i, x in enumerate(ordre)]
+            entry = self._advance(entry, new_ids, signature, dict(zip(ordre, new_ids)))
+            self._plans[name] = entry
+            return entry["version"]
+
+    def lock(self):
+        """Verrou du store : vérification + écriture + enregistrement d'un seul tenant."""
+        return self._lock
+
+
+@st.cache_resource
+def _plan_store(uap):
+    return PlanStore(uap)
+
+
+def get_plan_store(uap=None):
+    """Store d'ordres de l'UAP (un par process, partagé entre sessions)."""
+    return _plan_store(uap or current_uap())
+
+
+# ============================================
+# SESSIONS
+# ============================================
+
+def sync_order(name, key, key_origine, ids):
+    """Aligne l'ordre de la session (st.session_state[key]) sur la version courante.
+
+    'ids' : ID_PLAN affichés par la page (OFs exclus déjà retirés). Sans
+    modification locale, la session reprend l'ordre enregistré ; sinon ses
+    déplacements sont rejoués sur cet ordre. En cas de conflit, l'ordre de
+    la session est gardé avec sa base d'origine (<key>_base) : 'Valider'
+    est alors refusé (PlanConflict) tant que l'ordre n'est pas réinitialisé.
+    Retourne la version courante."""
+    store = get_plan_store()
+    version, courant = store.current(name)
+    shown = set(ids)
+    courant = [x for x in courant if x in shown]
+    ss = st.session_state
+    key_version = f"{key}_version"
+    key_base = f"{key}_base"
+
+    if key not in ss or key_version not in ss:
+        ss[key] = courant.copy()
+        ss[key_origine] = courant.copy()
+        ss[key_base] = courant.copy()
+        ss[key_version] = version
+        return version
+    if ss[key_version] == version:
+        return version
+
+    base = store.translate(name, ss.get(key_base, ss[key_origine]), ss[key_version])
+    mine = store.translate(name, ss[key], ss[key_version])
+    ss[key_origine] = courant.copy()
+    ss[key_base] = courant.copy()
+    ss[key_version] = version
+    if base is None or mine is None:
+        ss[key] = courant.copy()
+        st.warning("⚠️ Ordre de la session trop ancien — ordre enregistré repris.")
+    elif mine == courant:  # écriture de cette session
+        ss[key] = courant.copy()
+    elif mine == base:
+        ss[key] = courant.copy()
+        if base != courant:
+            st.info(f"🔄 Ordre mis à jour par un autre planificateur (version {version}).")
+    else:
+        try:
+            ss[key] = [x for x in merge_orders(base, courant, mine, name, version) if x in shown]
+            st.info(f"🔄 Ordre enregistré par un autre planificateur (version {version}) : vos déplacements ont été rejoués dessus.")
+        except PlanConflict as e:
+            ss[key] = mine + [x for x in courant if x not in set(mine)]
+            ss[key_base] = base + [x for x in courant if x not in set(base)]
+            ofs = ", ".join(str(x).split("_", 1)[-1] for x in e.ids[:5])
+            st.warning(
+                f"⚠️ Un autre planificateur a enregistré la version {version} en déplaçant aussi : {ofs}. "
+                "Votre ordre est affiché mais 'Valider' sera refusé : 'Réinitialiser' reprend l'ordre enregistré."
+            )
+    return version
+
+
+def order_base(key, key_origine):
+    """(base_version, base) à passer à submit_order pour l'ordre st.session_state[key]."""
+    ss = st.session_state
+    return ss.get(f"{key}_version"), list(ss.get(f"{key}_base", ss.get(key_origine, [])))
+
+
+def reset_order(key, key_origine):
+    """Bouton 'Réinitialiser' : la session reprend l'ordre enregistré (et sa base)."""
+    ss = st.session_state
+    ss[key] = list(ss[key_origine])
+    ss[f"{key}_base"] = list(ss[key_origine])
@@ -0,0 +1,255 @@
+# ============================================
+# qualite_data.py — Chargement typé de Qualite.xlsx
+# Version: 2026-02-09
+# ============================================
+# Qualite.xlsx est lu UNE fois par version de fichier pour les pages
+# Qualité et TRG :
+#   - les alias de colonnes (find_col) sont résolus une seule fois
+#   - seules les colonnes du schéma sont lues (copie colonnaire)
+#   - types compacts : float32 / category / datetime64
+# Le DataFrame rendu est partagé entre pages et sessions : ne pas le
+# modifier en place (filtrer ou copier avant d'ajouter des colonnes).
+#
+# load_cube() en dérive, par version, un cube (année, semaine ISO, jour,
+# ligne, OF TRG) de sommes et de comptes : les changements de filtre des
+# deux tableaux de bord se calculent sur quelques centaines de cellules.
+# Une moyenne se recompose par somme / compte (aggregate).
+# Les deux caches sont tenus par UAP (Qualite.xlsx de chaque UAP).
+
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from pages.data_access import TABLES, current_uap, table_path, table_version
+from pages.ingestion import ensure_columnar, load_columnar, read_excel
+
+# Nom canonique -> (alias dans le classeur, type)
+QUALITE_SCHEMA = {
+    "DateDebutOF": (["Date début OF", "datedebutof"], "datetime64[ns]"),
+    "DateFinOF": (["Date fin OF", "datefinof"], "datetime64[ns]"),
+    "Ligne": (["Libelle ligne", "ligne"], "category"),
+    "UniteIM": (["Unité IM", "Unite IM"], "category"),
+    "QteIM": (["Quantité mvt IM", "Quantite mvt IM", "IM"], "float32"),
+    "QteIC": (["Quantité IC", "Quantite IC", "IC"], "float32"),
+    "QteDemandee": (["Quantité demandée", "Quantite demandee"], "float32"),
+    "RdtBudget": (["Rdt budget"], "float32"),
+    "RdmtCalc": (["Rdmt Calculé", "Rdmt Calcule"], "float32"),
+    "Numéro OF": (["Numéro OF", "Numero OF"], "int64"),
+    "Dessin coloris": (["Dessin coloris"], "category"),
+    "RebutsEcartBudget": (["Rebuts en écart vs budget"], "float32"),
+}
+QUALITE_REQUIRED = ("DateDebutOF", "Ligne", "QteIM", "QteIC")
+
+# Dimensions et mesures du cube
+CUBE_KEYS = ["annee", "semaine", "Jour", "Ligne", "trg"]
+CUBE_SUMS = ["n", "nb_of", "QteIM", "QteIC", "scrap_ml", "QteDemandee", "duree_h"]
+CUBE_MEANS = ["PctRealise", "PctRebut", "RdtBudget", "TRG_reel_OF", "TRG_prev_OF"]
+
+
+# ============================================
+# RÉSOLUTION DES COLONNES
+# ============================================
+
+def _normalize(col: str) -> str:
+    if col is None: return ""
+    col = col.lower()
+    repl = {
+        "é":"e","è":"e","ê":"e","ë":"e",
+        "à":"a","â":"a",
+        "î":"i","ï":"i",
+        "ô":"o",
+        "ù":"u","û":"u","ü":"u",
+        "ç":"c"
+    }
+    for k,v in repl.items(): col = col.replace(k,v)
+    col = re.sub(r"[^a-z0-9]","", col)
+    return col
+
+def find_col(columns, candidates):
+    """Colonne réelle correspondant au premier alias (exact, puis inclus)."""
+    norm = {_normalize(c): c for c in columns}
+    for cand in candidates:
+        k = _normalize(cand)
+        if k in norm: return norm[k]
+    for cand in candidates:
+        k = _normalize(cand)
+        for key, real in norm.items():
+            if k in key: return real
+    raise KeyError(f"Colonne introuvable : {candidates}")
+
+
+def resolve_columns(columns, schema=QUALITE_SCHEMA, required=QUALITE_REQUIRED):
+    """{colonne du classeur: nom canonique} ; KeyError si une colonne requise manque."""
+    mapping = {}
+    for name, (aliases, _) in schema.items():
+        try:
+            real = find_col(columns, aliases)
+        except KeyError:
+            if name in required:
+                raise
+            continue
+        mapping.setdefault(real, name)
+    return mapping
+
+
+# ============================================
+# TYPAGE
+# ============================================
+
+def _to_datetime(s):
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s.astype("datetime64[ns]")
+    out = pd.to_datetime(s, errors="coerce", format="ISO8601")
+    rest = out.isna() & s.notna()
+    if rest.any():
+        out[rest] = pd.to_datetime(s[rest], errors="coerce", dayfirst=True, format="mixed")
+    return out.astype("datetime64[ns]")
+
+
+def _cast(s, dtype):
+    if dtype.startswith("datetime"):
+        return _to_datetime(s)
+    if dtype == "category":
+        return s.where(s.isna(), s.astype(str)).astype("category")
+    s = pd.to_numeric(s, errors="coerce")
+    if dtype.startswith("int") and s.isna().any():
+        dtype = "float64"
+    return s.astype(dtype)
+
+
+# ============================================
+# CHARGEMENT
+# ============================================
+
+def _source_columns(name, uap):
+    """En-têtes du classeur (schéma de la copie Parquet, sinon ligne d'en-tête Excel)."""
+    spec = TABLES[name]
+    try:
+        import pyarrow.parquet as pq
+        parquet_path = ensure_columnar(table_path(name, uap), spec["sheet"], spec.get("dtypes"))
+        return list(pq.read_schema(parquet_path).names)
+    except ImportError:
+        return list(read_excel(table_path(name, uap), sheet_name=spec["sheet"], nrows=0).columns)
+
+
+def _build_qualite(uap):
+    spec = TABLES["qualite"]
+    mapping = resolve_columns(_source_columns("qualite", uap))
+    raw = load_columnar(table_path("qualite", uap), sheet_name=spec["sheet"], dtypes=spec.get("dtypes"), columns=list(mapping))
+
+    df = pd.DataFrame({name: _cast(raw[real], QUALITE_SCHEMA[name][1]) for real, name in mapping.items()})
+
+    im, ic = df["QteIM"], df["QteIC"]
+    df["PctRebut"] = np.where(im > 0, (im - ic) / im * 100, np.nan).astype("float32")
+    df["PctRealise"] = np.where(im > 0, ic / im * 100, np.nan).astype("float32")
+    df.loc[df["PctRebut"] < 0, "PctRebut"] = 0
+    df.loc[df["PctRealise"] < 0, "PctRealise"] = 0
+
+    df["Jour"] = df["DateDebutOF"].dt.normalize()
+    return df
+
+
+_qualite = {}  # UAP -> (version, DataFrame)
+_lock = threading.Lock()
+
+
+def load_qualite(uap=None):
+    """Qualite.xlsx typé (schéma QUALITE_SCHEMA), relu seulement si le fichier a changé."""
+    uap = uap or current_uap()
+    version = table_version("qualite", uap)
+    entry = _qualite.get(uap)
+    if entry is None or entry[0] != version:
+        with _lock:
+            entry = _qualite.get(uap)
+            if entry is None or entry[0] != version:
+                entry = (version, _build_qualite(uap))
+                _qualite[uap] = entry
+    return entry[1]
+
+
+# ============================================
+# CUBE (ANNÉE, SEMAINE, JOUR, LIGNE)
+# ============================================
+
+def build_cube(df):
+    """Sommes et comptes par (annee, semaine, Jour, Ligne, trg).
+
+    'trg' marque les OFs retenus par le Dashboard TRG (unité ML, durée > 0).
+    Pour chaque mesure de CUBE_MEANS : colonnes <mesure>_sum et <mesure>_n.
+    'nb_of' compte les Numéro OF distincts : un OF présent sur plusieurs
+    lignes de Qualite (plusieurs postes, plusieurs jours) n'est compté que
+    dans la cellule de son premier jour de la semaine. La somme par
+    semaine et ligne donne donc le nombre d'OFs distincts (nunique)."""
+    df = df[df["Jour"].notna()]
+    iso = df["Jour"].dt.isocalendar()
+    duree_h = (df["DateFinOF"] - df["DateDebutOF"]).dt.total_seconds() / 3600
+    trg = ((df["UniteIM"] == "ML") & (duree_h > 0)).to_numpy(bool)
+
+    im = df["QteIM"].astype("float64")
+    ic = df["QteIC"].astype("float64")
+    dem = df["QteDemandee"].astype("float64") if "QteDemandee" in df else pd.Series(np.nan, index=df.index)
+    rdt = df["RdtBudget"].astype("float64") if "RdtBudget" in df else pd.Series(np.nan, index=df.index)
+    of = df["Numéro OF"] if "Numéro OF" in df else pd.Series(np.nan, index=df.index)
+
+    # Première apparition de l'OF dans sa (semaine, ligne, trg)
+    first = ~pd.DataFrame({
+        "annee": iso["year"], "semaine": iso["week"], "Ligne": df["Ligne"], "trg": trg,
+        "of": of, "Jour": df["Jour"],
+    }).sort_values("Jour", kind="stable").duplicated(subset=["annee", "semaine", "Ligne", "trg", "of"])
+    first_of = (of.notna() & first.reindex(df.index)).astype("int64")
+
+    values = {
+        "PctRealise": df["PctRealise"].astype("float64"),
+        "PctRebut": df["PctRebut"].astype("float64"),
+        "RdtBudget": rdt,
+        "TRG_reel_OF": (im / duree_h).where(trg),
+        "TRG_prev_OF": (dem / duree_h).where(trg),
+    }
+    cells = pd.DataFrame({
+        "annee": iso["year"],
+        "semaine": iso["week"],
+        "Jour": df["Jour"],
+        "Ligne": df["Ligne"],
+        "trg": trg,
+        "n": 1,
+        "nb_of": first_of,
+        "QteIM": im,
+        "QteIC": ic,
+        "scrap_ml": im - ic,
+        "QteDemandee": dem,
+        "duree_h": duree_h.where(trg),
+    })
+    for name, v in values.items():
+        cells[f"{name}_sum"] = v
+        cells[f"{name}_n"] = v.notna().astype("int64")
+
+    return cells.groupby(CUBE_KEYS, observed=True, dropna=False).sum().reset_index()
+
+
+def aggregate(cube, by, sums=CUBE_SUMS, means=CUBE_MEANS):
+    """Regroupe le cube selon 'by' : sommes, et moyennes = somme / compte."""
+    cols = list(sums) + [f"{m}_{k}" for m in means for k in ("sum", "n")]
+    out = cube.groupby(by, observed=True)[cols].sum()
+    for m in means:
+        out[m] = out.pop(f"{m}_sum") / out.pop(f"{m}_n")
+    return out.reset_index()
+
+
+_cube = {}  # UAP -> (version, DataFrame)
+_cube_lock = threading.Lock()
+
+
+def load_cube(uap=None):
+    """Cube qualité de la version courante de Qualite.xlsx (partagé, ne pas modifier)."""
+    uap = uap or current_uap()
+    version = table_version("qualite", uap)
+    entry = _cube.get(uap)
+    if entry is None or entry[0] != version:
+        with _cube_lock:
+            entry = _cube.get(uap)
+            if entry is None or entry[0] != version:
+                entry = (version, build_cube(load_qualite(uap)))
+                _cube[uap] = entry
+    return entry[1]
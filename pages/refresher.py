@@ -0,0 +1,184 @@
+# ============================================
+# refresher.py — Préchauffage des caches en arrière-plan
+# Version: 2026-02-09
+# ============================================
+# Après un export (RunMAJ.vbs -> CONTROLEUR.xlsm), le premier utilisateur
+# de chaque page payait la relecture de tous les classeurs. Un thread
+# unique du process reconstruit à l'avance :
+#   - les copies colonnaires et le cache du repository (toutes les tables)
+#   - les calendriers compilés, l'index SUIVI_OF, Qualite + son cube, le PIC
+#   - les plannings par défaut des quatre lignes (Planning Global)
+# Il se relance :
+#   - après une modification de classeur, une fois l'export terminé
+#     (aucune autre modification pendant REFRESH_DELAY_S secondes)
+#   - à chaque nouveau créneau de "now" (plan_cache.NOW_BUCKET_MIN)
+# Seules les UAP ouvertes par une session depuis le passage précédent sont
+# préchauffées (et la 4M au démarrage) ; les plannings préchauffés vont
+# dans un cache séparé (plan_cache, warm=True).
+# Démarré par app.py via get_refresher() (un seul par process).
+
+import threading
+import time
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from pages.data_access import (
+    DEFAULT_UAP, LIGNES, TABLES, active_uaps, get_repository, get_watcher, load_table, pic_file, uap_last_used,
+)
+from pages.plan_cache import NOW_BUCKET_MIN, now_bucket
+
+# Attente après la dernière modification de fichier (secondes)
+REFRESH_DELAY_S = 5.0
+
+
+def _warm_each(names, load):
+    # Un classeur absent n'empêche pas de charger les autres
+    failed = []
+    for name in names:
+        try:
+            load(name)
+        except Exception as e:
+            failed.append(f"{name}: {e}")
+    if failed:
+        raise RuntimeError(" ; ".join(failed))
+
+
+def _warm_tables(uap):
+    _warm_each(TABLES, lambda name: load_table(name, uap))
+
+
+def _warm_calendars(uap):
+    from pages.calendrier import get_calendar
+    _warm_each(sorted({spec["cal"] for spec in LIGNES.values()}), lambda name: get_calendar(name, uap))
+
+
+def _warm_suivi(uap):
+    from pages.utils import get_suivi_index
+    get_suivi_index(uap)
+
+
+def _warm_qualite(uap):
+    from pages.qualite_data import load_cube
+    load_cube(uap)
+
+
+def _warm_pic(uap):
+    from pages.pic_data import load_pic
+    load_pic(uap)
+
+
+def _warm_plans(uap):
+    from pages.Planning_Global import default_plans
+    default_plans(now_bucket(), uap)
+
+
+# Étapes dans l'ordre : les plannings réutilisent tables et calendriers
+WARM_STEPS = {
+    "tables": _warm_tables,
+    "calendriers": _warm_calendars,
+    "suivi_of": _warm_suivi,
+    "qualite": _warm_qualite,
+    "pic": _warm_pic,
+    "plannings": _warm_plans,
+}
+
+
+def prewarm(uap=DEFAULT_UAP):
+    """Exécute toutes les étapes pour l'UAP ; retourne ({étape: durée s}, {étape: erreur})."""
+    timings, errors = {}, {}
+    for name, step in WARM_STEPS.items():
+        t0 = time.perf_counter()
+        try:
+            step(uap)
+        except Exception as e:  # une étape en échec n'empêche pas les suivantes
+            errors[name] = str(e)
+        timings[name] = time.perf_counter() - t0
+    return timings, errors
+
+
+class Refresher:
+    """Thread de préchauffage : au démarrage, après chaque export, à chaque créneau."""
+
+    def __init__(self, delay=REFRESH_DELAY_S):
+        self.delay = delay
+        self.last_run = None
+        self._last_pass = None  # time.monotonic() du début du dernier passage
+        self.last_timings = {}  # UAP -> {étape: durée s}
+        self.last_errors = {}  # UAP -> {étape: erreur} ; None -> erreur du passage
+        self._subscribed = set()
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def notify(self, *args):
+        """Callback de modification de fichier (repository / watcher)."""
+        self._changed.set()
+
+    def _subscribe(self):
+        """Abonnement aux modifications de fichiers des UAP utilisées depuis le dernier passage."""
+        for uap in active_uaps():
+            if uap in self._subscribed:
+                continue
+            get_repository(uap).on_change(self.notify)
+            get_watcher(uap).watch(pic_file(uap), self.notify)
+            self._subscribed.add(uap)
+
+    def _idle(self, uap, since):
+        """UAP ouverte par personne depuis 'since' (passage précédent)."""
+        if since is None:
+            return False
+        used = uap_last_used(uap)
+        return used is None or used < since
+
+    def refresh(self):
+        get_repository(DEFAULT_UAP)
+        self._subscribe()
+        since, self._last_pass = self._last_pass, time.monotonic()
+        for uap in active_uaps():
+            if self._idle(uap, since):
+                continue
+            self.last_timings[uap], self.last_errors[uap] = prewarm(uap)
+        self.last_run = datetime.now()
+
+    def _safe_refresh(self):
+        # Une erreur hors étape (abonnement, ouverture de la base...) est
+        # gardée dans last_errors[None] : le thread continue
+        try:
+            self.refresh()
+            self.last_errors.pop(None, None)
+        except Exception as e:
+            self.last_errors[None] = {"refresh": str(e)}
+
+    def _next_bucket_s(self):
+        nxt = now_bucket() + timedelta(minutes=NOW_BUCKET_MIN)
+        return max((nxt - datetime.now()).total_seconds(), 0) + 1
+
+    def _run(self):
+        self._safe_refresh()
+        while not self._stop.is_set():
+            if self._changed.wait(self._next_bucket_s()):
+                # Export en cours : attendre qu'il n'y ait plus de modification
+                self._changed.clear()
+                while self._changed.wait(self.delay):
+                    self._changed.clear()
+            if self._stop.is_set():
+                break
+            self._safe_refresh()
+
+    def start(self):
+        if self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, name="cache-refresher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._changed.set()
+
+
+@st.cache_resource
+def get_refresher():
+    """Refresher unique du process (partagé entre sessions)."""
+    return Refresher().start()
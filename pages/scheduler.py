@@ -0,0 +1,413 @@
+# ============================================
+# scheduler.py — Moteur de planification commun aux lignes
+# Version: 2026-02-09
+# ============================================
+# Les OFs (et les INTRO) sont posés bout à bout sur le "temps ouvert" :
+#   - C = sommes cumulées des durées des créneaux OUVERT
+#   - T = sommes cumulées des durées des tâches (INTRO + OFs)
+# La tâche i occupe [T[i], T[i+1]) en temps ouvert ; un searchsorted de T
+# dans C donne les créneaux traversés, puis tous les segments sont générés
+# en une seule passe vectorisée (np.repeat), sans boucle par OF.
+#
+# Les règles d'INTRO propres à chaque ligne sont des fonctions vectorisées
+# (Series des clés -> tableau booléen "INTRO avant cet OF").
+#
+# IncrementalPlan garde l'état à chaque frontière d'OF (curseur en temps
+# ouvert, INTRO, OF précédent) : après un déplacement manuel, seuls les OFs
+# à partir de la première position modifiée sont replanifiés.
+#
+# SegmentTable (Planning Global, horizon de plusieurs semaines en cache)
+# garde les segments en tableaux : OF, début / fin en secondes, codes de
+# famille et de campagne, drapeaux. Libellés et couleurs ne sont calculés
+# qu'à l'affichage, pour la fenêtre affichée.
+
+import numpy as np
+import pandas as pd
+
+INTRO_DUREE_H = 2.3
+
+_US_PER_H = 3600 * 1_000_000
+
+
+# ============================================
+# RÈGLES D'INTRO PAR LIGNE
+# ============================================
+
+def _support_type(produits):
+    p = produits.fillna("").astype(str).str.upper()
+    return np.select(
+        [p.str.contains("CICDMD", regex=False), p.str.contains("CIMD", regex=False), p.str.contains("CICD", regex=False)],
+        ["CICDMD", "CIMD", "CICD"],
+        default="OTHER",
+    )
+
+
+def _largeur(produits):
+    p = produits.fillna("").astype(str).str.upper()
+    return np.select(
+        [p.str.contains("3M", regex=False), p.str.contains("4M", regex=False)],
+        ["3M", "4M"],
+        default="UNKNOWN",
+    )
+
+
+def intro_produit_l1(produits):
+    """INTRO L1 entre deux produits consécutifs :
+    - changement CICD / CIMD / CICDMD (dans les deux sens)
+    - passage de 3M à 4M (pas l'inverse)"""
+    produits = pd.Series(produits).reset_index(drop=True)
+    types = _support_type(produits)
+    larg = _largeur(produits)
+    prev_types = np.roll(types, 1)
+    prev_larg = np.roll(larg, 1)
+    connus = (types != "OTHER") & (prev_types != "OTHER")
+    intro = (connus & (types != prev_types)) | ((prev_larg == "3M") & (larg == "4M"))
+    if len(intro):
+        intro[0] = False
+    return intro
+
+
+def intro_changement(cles):
+    """INTRO à chaque changement de clé (campagne L2) ; jamais avant le premier OF."""
+    cles = pd.Series(cles).reset_index(drop=True)
+    intro = cles.ne(cles.shift()).to_numpy(bool, copy=True)
+    if len(intro):
+        intro[0] = False
+    return intro
+
+
+# ============================================
+# MOTEUR
+# ============================================
+
+def slot_arrays(slots):
+    """(starts, ends) datetime64[us] depuis une liste [{'start','end'}] ou un tuple de tableaux."""
+    if isinstance(slots, tuple):
+        starts, ends = slots
+        # Tableaux entiers : déjà en µs (sortie de slot_arrays)
+        if np.asarray(starts).dtype.kind in "iu":
+            return np.asarray(starts, dtype="int64"), np.asarray(ends, dtype="int64")
+    else:
+        starts = [s["start"] for s in slots]
+        ends = [s["end"] for s in slots]
+    return (
+        np.asarray(pd.DatetimeIndex(starts).as_unit("us").asi8, dtype="int64"),
+        np.asarray(pd.DatetimeIndex(ends).as_unit("us").asi8, dtype="int64"),
+    )
+
+
+def _to_us(durations_h):
+    dur = np.round(np.asarray(durations_h, dtype="float64") * _US_PER_H).astype("int64")
+    return np.maximum(dur, 0)
+
+
+def schedule_tasks(durations_h, slots, offset_us=0):
+    """Pose des tâches consécutives dans les créneaux.
+
+    offset_us : temps ouvert déjà consommé avant la première tâche.
+    Retourne (task, segment, start_us, end_us) : un élément par segment,
+    'task' = indice de la tâche, 'segment' = n° de morceau (1, 2, ...).
+    Une tâche qui déborde du dernier créneau est tronquée ; les suivantes
+    ne sont pas planifiées."""
+    slot_s, slot_e = slot_arrays(slots)
+    keep = slot_e > slot_s
+    slot_s, slot_e = slot_s[keep], slot_e[keep]
+    dur = _to_us(durations_h)
+    if len(slot_s) == 0 or len(dur) == 0:
+        empty = np.array([], dtype="int64")
+        return empty, empty, empty, empty
+
+    # Temps ouvert cumulé au début de chaque créneau (C) et de chaque tâche (T)
+    cap = slot_e - slot_s
+    C = np.concatenate(([0], np.cumsum(cap)))
+    T = offset_us + np.concatenate(([0], np.cumsum(dur)))
+    total = C[-1]
+
+    t0 = T[:-1]
+    t1 = np.minimum(T[1:], total)
+    planned = (dur > 0) & (t0 < total)
+
+    # Créneau du début (un début pile en fin de créneau passe au suivant)
+    # et créneau de la fin (une fin pile en fin de créneau y reste)
+    k0 = np.searchsorted(C, t0, side="right") - 1
+    k1 = np.searchsorted(C, t1, side="left") - 1
+    nseg = np.where(planned, k1 - k0 + 1, 0)
+
+    task = np.repeat(np.arange(len(dur)), nseg)
+    first = np.repeat(np.cumsum(nseg) - nseg, nseg)
+    segment = np.arange(len(task)) - first + 1
+    k = k0[task] + segment - 1
+
+    o0 = np.maximum(t0[task], C[k])
+    o1 = np.minimum(t1[task], C[k + 1])
+    start = slot_s[k] + (o0 - C[k])
+    end = slot_s[k] + (o1 - C[k])
+    return task, segment, start, end
+
+
+def _intro_flags(n, intro, intro_h):
+    if intro is None or intro_h <= 0:
+        return np.zeros(n, dtype=bool)
+    return np.asarray(intro, dtype=bool)
+
+
+def _plan_arrays(durations_h, slots, intro=None, intro_h=INTRO_DUREE_H, offset_us=0, first_intro_no=1):
+    """(pos, rang, intro_no, segment, start_us, end_us) : tableaux de plan_segments."""
+    durations_h = np.asarray(durations_h, dtype="float64")
+    n = len(durations_h)
+    intro = _intro_flags(n, intro, intro_h)
+
+    # Tâches : INTRO éventuelle puis OF, pour chaque OF
+    n_intro = int(intro.sum())
+    of_task = np.arange(n) + np.cumsum(intro)
+    task_pos = np.full(n + n_intro, -1, dtype="int64")
+    task_pos[of_task] = np.arange(n)
+    task_dur = np.full(n + n_intro, float(intro_h))
+    task_dur[of_task] = durations_h
+    task_intro_no = np.zeros(n + n_intro, dtype="int64")
+    task_intro_no[of_task[intro] - 1] = np.arange(first_intro_no, first_intro_no + n_intro)
+    task_rang = np.searchsorted(of_task, np.arange(n + n_intro))
+
+    task, segment, start, end = schedule_tasks(task_dur, slots, offset_us)
+    return task_pos[task], task_rang[task], task_intro_no[task], segment, start, end
+
+
+def plan_segments(durations_h, slots, intro=None, intro_h=INTRO_DUREE_H, offset_us=0, first_intro_no=1):
+    """Planifie des OFs (dans l'ordre) avec INTRO optionnelles.
+
+    durations_h : durée de chaque OF (h)
+    intro       : tableau booléen "INTRO avant cet OF" (règle de la ligne)
+    Retourne un DataFrame de segments : pos (ligne de l'OF, -1 pour une INTRO),
+    rang (OF auquel le segment se rattache, INTRO comprise), intro_no,
+    Segment, start, end, duree_h, is_intro."""
+    pos, rang, intro_no, segment, start, end = _plan_arrays(
+        durations_h, slots, intro, intro_h, offset_us, first_intro_no
+    )
+    return pd.DataFrame({
+        "pos": pos,
+        "rang": rang,
+        "intro_no": intro_no,
+        "Segment": segment,
+        "start": pd.to_datetime(start, unit="us"),
+        "end": pd.to_datetime(end, unit="us"),
+        "duree_h": (end - start) / _US_PER_H,
+        "is_intro": pos < 0,
+    })
+
+
+class IncrementalPlan:
+    """Planning d'une ligne conservé entre deux reruns (st.session_state).
+
+    État gardé à chaque frontière d'OF i : curseur en temps ouvert avant
+    l'OF (et son INTRO), drapeau INTRO, identifiant et durée de l'OF ;
+    l'OF précédent (produit / campagne) est porté par le drapeau INTRO.
+    Le créneau courant se déduit du curseur (searchsorted sur les cumuls)."""
+
+    def __init__(self):
+        self.slots_key = None
+        self.ids = np.array([], dtype=object)
+        self.dur = np.array([], dtype="int64")
+        self.intro = np.array([], dtype=bool)
+        self.cursor = np.zeros(1, dtype="int64")
+        self.segments = None
+        self.replanned_from = None
+
+    def plan(self, ids, durations_h, slots, intro=None, intro_h=INTRO_DUREE_H):
+        """Comme plan_segments, en réutilisant les segments avant le premier changement."""
+        ids = np.asarray(ids, dtype=object)
+        durations_h = np.asarray(durations_h, dtype="float64")
+        dur = _to_us(durations_h)
+        n = len(ids)
+        intro = _intro_flags(n, intro, intro_h)
+        slot_s, slot_e = slot_arrays(slots)
+        slots_key = (slot_s.tobytes(), slot_e.tobytes(), float(intro_h))
+
+        p = 0
+        if self.segments is not None and slots_key == self.slots_key:
+            m = min(n, len(self.ids))
+            diff = (self.ids[:m] != ids[:m]) | (self.dur[:m] != dur[:m]) | (self.intro[:m] != intro[:m])
+            hits = np.flatnonzero(diff)
+            p = int(hits[0]) if len(hits) else m
+            if p == n == len(self.ids):
+                self.replanned_from = n
+                return self.segments
+
+        intro_us = _to_us([intro_h])[0] if intro_h > 0 else 0
+        cursor = np.concatenate(([0], np.cumsum(dur + intro * intro_us)))
+
+        suffix = plan_segments(
+            durations_h[p:], (slot_s, slot_e), intro[p:], intro_h,
+            offset_us=int(cursor[p]), first_intro_no=int(intro[:p].sum()) + 1,
+        )
+        suffix["pos"] = np.where(suffix["pos"] >= 0, suffix["pos"] + p, -1)
+        suffix["rang"] += p
+        if p == 0:
+            segments = suffix
+        else:
+            prefix = self.segments[self.segments["rang"] < p]
+            segments = pd.concat([prefix, suffix], ignore_index=True) if len(suffix) else prefix.reset_index(drop=True)
+
+        self.slots_key = slots_key
+        self.ids, self.dur, self.intro, self.cursor = ids, dur, intro, cursor
+        self.segments = segments
+        self.replanned_from = p
+        return segments
+
+
+def attach_columns(segments, ofs_df, columns, intro_values=None):
+    """Ajoute aux segments les colonnes de l'OF (valeurs INTRO pour les INTRO)."""
+    intro_values = intro_values or {}
+    pos = segments["pos"].to_numpy()
+    is_intro = pos < 0
+    safe = np.where(is_intro, 0, pos)
+    out = segments.copy()
+    for out_col, src_col in columns.items():
+        if src_col in ofs_df.columns and len(ofs_df):
+            values = ofs_df[src_col].to_numpy(dtype=object)[safe]
+        else:
+            values = np.full(len(pos), "", dtype=object)
+        values = np.where(is_intro, intro_values.get(out_col, ""), values)
+        out[out_col] = values
+    return out
+
+
+def durations_from(ofs_df, col="Temps en h", default=0.0):
+    """Durées (h) de la colonne 'col', 'default' si vide."""
+    if col not in ofs_df.columns:
+        return np.full(len(ofs_df), float(default))
+    return pd.to_numeric(ofs_df[col], errors="coerce").fillna(default).to_numpy("float64")
+
+
+# ============================================
+# TABLE DE SEGMENTS COMPACTE
+# ============================================
+
+# Drapeaux des segments (bits de SegmentTable.flags)
+FLAG_INTRO = 1  # segment d'INTRO
+FLAG_SUITE = 2  # suite d'un OF coupé par un arrêt (morceau 2, 3, ...)
+
+
+def _code_dtype(n_categories):
+    return np.int16 if n_categories < np.iinfo(np.int16).max else np.int32
+
+
+def _epoch_s(value):
+    return pd.Timestamp(value).as_unit("s").value
+
+
+class SegmentTable:
+    """Segments d'un planning en tableaux ; le texte reste dans la table d'OFs.
+
+    pos        : ligne de l'OF dans 'ofs' (-1 pour une INTRO)
+    start, end : secondes epoch (int64)
+    codes      : {"famille", "campagne"} -> code de la colonne FAMILLE /
+                 Campagne de l'OF (-1 pour une INTRO), valeurs dans cats
+    flags      : FLAG_INTRO | FLAG_SUITE
+    Libellés et couleurs sont calculés à l'affichage (column, per_code,
+    per_of, to_frame), pour les seuls segments affichés. Les tableaux sont
+    en lecture seule et 'ofs' est partagé (cache) : ne pas le modifier."""
+
+    CODED = {"famille": "FAMILLE", "campagne": "Campagne"}
+
+    def __init__(self, ofs, pos, start, end, flags, codes, cats):
+        self.ofs = ofs
+        self.pos = pos
+        self.start = start
+        self.end = end
+        self.flags = flags
+        self.codes = codes
+        self.cats = cats
+        for a in (pos, start, end, flags, *codes.values()):
+            a.setflags(write=False)
+
+    @classmethod
+    def plan(cls, ofs, durations_h, slots, intro=None, intro_h=INTRO_DUREE_H):
+        """Comme plan_segments, sur les OFs de 'ofs' (index 0..n-1)."""
+        pos, _, _, segment, start, end = _plan_arrays(durations_h, slots, intro, intro_h)
+        flags = np.where(pos < 0, FLAG_INTRO, 0) | np.where(segment > 1, FLAG_SUITE, 0)
+        safe = np.maximum(pos, 0)
+        codes, cats = {}, {}
+        for field, col in cls.CODED.items():
+            values = ofs[col] if col in ofs.columns else pd.Series("", index=ofs.index)
+            of_codes, cats[field] = pd.factorize(values, use_na_sentinel=False)
+            seg_codes = of_codes[safe] if len(of_codes) else np.zeros(len(pos), dtype="int64")
+            codes[field] = np.where(pos < 0, -1, seg_codes).astype(_code_dtype(len(cats[field])))
+        return cls(
+            ofs, pos.astype(np.int32), start // 1_000_000, end // 1_000_000,
+            flags.astype(np.uint8), codes, cats,
+        )
+
+    @classmethod
+    def empty_for(cls, ofs):
+        """Table sans segment (aucun OF ou aucun créneau)."""
+        return cls.plan(ofs, [], [])
+
+    def take(self, idx):
+        """Sous-table des segments 'idx' (masque ou indices)."""
+        return SegmentTable(
+            self.ofs, self.pos[idx], self.start[idx], self.end[idx], self.flags[idx],
+            {f: c[idx] for f, c in self.codes.items()}, self.cats,
+        )
+
+    def copy(self):
+        # Tableaux en lecture seule : une copie superficielle suffit (plan_cache)
+        return SegmentTable(self.ofs, self.pos, self.start, self.end, self.flags, self.codes, self.cats)
+
+    def window(self, win_start, win_end):
+        """Segments dont [start, end] recoupe [win_start, win_end] (bornes incluses)."""
+        return self.take((self.end >= _epoch_s(win_start)) & (self.start <= _epoch_s(win_end)))
+
+    def __len__(self):
+        return len(self.pos)
+
+    @property
+    def empty(self):
+        return len(self.pos) == 0
+
+    @property
+    def is_intro(self):
+        return (self.flags & FLAG_INTRO) != 0
+
+    @property
+    def duree_h(self):
+        return (self.end - self.start) / 3600
+
+    def starts(self):
+        return pd.to_datetime(self.start, unit="s")
+
+    def ends(self):
+        return pd.to_datetime(self.end, unit="s")
+
+    # ---------- résolution à l'affichage ----------
+
+    def column(self, name, intro_value=""):
+        """Valeurs de la colonne 'name' de l'OF de chaque segment."""
+        if name in self.ofs.columns:
+            values = self.ofs[name].to_numpy(dtype=object)[np.maximum(self.pos, 0)]
+        else:
+            values = np.full(len(self), "", dtype=object)
+        return np.where(self.pos < 0, intro_value, values)
+
+    def per_code(self, field, fn, intro_value=""):
+        """fn(valeur) calculé une fois par catégorie de 'field', étendu aux segments."""
+        values = [fn(v) for v in self.cats[field]] + [intro_value]
+        return np.array(values, dtype=object)[self.codes[field]]  # -1 -> intro_value
+
+    def per_of(self, fn, intro_value=""):
+        """fn(ligne de l'OF) calculé une fois par OF présent, étendu aux segments."""
+        if self.empty:
+            return np.array([], dtype=object)
+        uniq, inverse = np.unique(self.pos, return_inverse=True)
+        values = [intro_value if p < 0 else fn(self.ofs.iloc[p]) for p in uniq]
+        return np.array(values, dtype=object)[inverse]
+
+    def to_frame(self, columns=None, intro_values=None):
+        """DataFrame pos, start, end, duree_h, is_intro + colonnes {sortie: colonne de l'OF}."""
+        segments = pd.DataFrame({
+            "pos": self.pos.astype("int64"),
+            "start": self.starts(),
+            "end": self.ends(),
+            "duree_h": self.duree_h,
+            "is_intro": self.is_intro,
+        })
+        return attach_columns(segments, self.ofs, columns or {}, intro_values)
@@ -0,0 +1,294 @@
+# ============================================
+# sqlite_store.py — Base SQLite des séquences d'OFs
+# Version: 2026-02-09
+# ============================================
+# Alternative aux allers-retours OFs_*.xlsx (PLANNING_STORE=sqlite) : les
+# tables OFs, calendriers et calcul_durée sont gardées dans une base SQLite
+# embarquée, interrogée directement par le repository :
+#   - une table "t_<nom>" par table du registre (row_id + colonnes du
+#     classeur), indexée sur sa clé (Ofs, Jour, Famille)
+#   - "ordre" (nom, row_id, rang) : déplacer un OF ne met à jour que les
+#     rangs qui changent, sans relire ni réécrire de classeur
+#   - "colonnes" garde le nom et le type de chaque colonne
+#   - "sources" garde la signature du classeur importé / exporté et si la
+#     base contient des modifications non exportées
+# Un classeur modifié hors de l'appli (export CONTROLEUR.xlsm) est réimporté
+# à la première lecture : il remplace alors le contenu de la base. Si la
+# base a des modifications non exportées, il n'est pas réimporté : le
+# conflit est noté dans "conflits" et tranché dans le Settings (exporter la
+# base ou reprendre le classeur).
+# L'écriture des classeurs devient un export à la demande (writeback).
+# PLANNING_DB doit pointer sur un disque local du serveur (pas OneDrive).
+
+import json
+import sqlite3
+import threading
+from contextlib import closing, contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from pages.ingestion import file_signature, load_columnar
+
+# Colonne indexée de chaque famille de tables (si présente)
+INDEX_COLUMNS = {"ofs": "Ofs", "calendrier": "Jour", "calcul": "Famille"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    fichier TEXT PRIMARY KEY, signature TEXT, importe_le TEXT, exporte INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS revisions (nom TEXT PRIMARY KEY, revision INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS colonnes (
+    nom TEXT, pos INTEGER, colonne TEXT, dtype TEXT, PRIMARY KEY (nom, pos)
+);
+CREATE TABLE IF NOT EXISTS ordre (
+    nom TEXT, row_id INTEGER, rang INTEGER, PRIMARY KEY (nom, row_id)
+);
+CREATE INDEX IF NOT EXISTS ordre_rang ON ordre (nom, rang);
+CREATE TABLE IF NOT EXISTS conflits (fichier TEXT PRIMARY KEY, signature TEXT, detecte_le TEXT);
+"""
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _kind(name):
+    return name.split("_", 1)[0]
+
+
+def _records(df):
+    """Lignes de df en valeurs SQLite (dates ISO, manquants -> NULL)."""
+    out = df.astype(object)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            out[col] = df[col].dt.strftime("%Y-%m-%dT%H:%M:%S.%f").astype(object)
+    out = out.where(df.notna(), None)
+    return [tuple(v.item() if hasattr(v, "item") else v for v in row) for row in out.itertuples(index=False)]
+
+
+def _cast(s, dtype):
+    if dtype.startswith("datetime"):
+        return pd.to_datetime(s).astype(dtype)
+    if dtype.startswith(("int", "float")):
+        s = pd.to_numeric(s)
+        return s.astype(dtype) if not (dtype.startswith("int") and s.isna().any()) else s
+    if dtype == "bool":
+        return s.astype(bool)
+    return s.astype(dtype)
+
+
+class SqliteStore:
+    """Tables du registre 'names' dans la base 'db_path' (importées des classeurs)."""
+
+    def __init__(self, db_path, base_path, tables, names):
+        self.db_path = Path(db_path)
+        self.base_path = Path(base_path)
+        self.tables = tables
+        self.names = list(names)
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self, write=False):
+        # Une connexion par opération : les threads de Streamlit ne partagent rien.
+        # Écriture : une seule transaction (verrou posé dès le début)
+        with closing(sqlite3.connect(self.db_path, timeout=30)) as con:
+            with con:
+                if write:
+                    con.execute("BEGIN IMMEDIATE")
+                yield con
+
+    def holds(self, name):
+        return name in self.names
+
+    def file_tables(self, fichier):
+        """Tables de la base portées par le classeur 'fichier' (ordre du registre)."""
+        return [n for n in self.names if self.tables[n]["file"] == fichier]
+
+    # ---------- import ----------
+
+    def _signature(self, fichier):
+        try:
+            return json.dumps(list(file_signature(self.base_path / fichier)))
+        except FileNotFoundError:
+            return None
+
+    def _write_table(self, con, name, df):
+        """Remplace la table 'name' par df (ordre = ordre des lignes de df)."""
+        table = _quote(f"t_{name}")
+        df = df.reset_index(drop=True)
+        cols = ", ".join(_quote(c) for c in df.columns)
+        con.execute(f"DROP TABLE IF EXISTS {table}")
+        con.execute(f"CREATE TABLE {table} (row_id INTEGER PRIMARY KEY, {cols})")
+        key = INDEX_COLUMNS.get(_kind(name))
+        if key in df.columns:
+            con.execute(f"CREATE INDEX {_quote(f'ix_{name}')} ON {table} ({_quote(key)})")
+        marks = ", ".join("?" * (len(df.columns) + 1))
+        con.executemany(f"INSERT INTO {table} VALUES ({marks})", [(i, *r) for i, r in enumerate(_records(df))])
+
+        con.execute("DELETE FROM colonnes WHERE nom = ?", (name,))
+        con.executemany(
+            "INSERT INTO colonnes VALUES (?, ?, ?, ?)",
+            [(name, i, str(c), str(df[c].dtype)) for i, c in enumerate(df.columns)],
+        )
+        con.execute("DELETE FROM ordre WHERE nom = ?", (name,))
+        con.executemany("INSERT INTO ordre VALUES (?, ?, ?)", [(name, i, i) for i in range(len(df))])
+        self._bump(con, name)
+
+    def _bump(self, con, name):
+        con.execute(
+            "INSERT INTO revisions VALUES (?, 1) ON CONFLICT(nom) DO UPDATE SET revision = revision + 1",
+            (name,),
+        )
+
+    def _import(self, fichier, signature):
+        path = self.base_path / fichier
+        frames = {
+            n: load_columnar(path, sheet_name=self.tables[n]["sheet"], dtypes=self.tables[n].get("dtypes"))
+            for n in self.file_tables(fichier)
+        }
+        with self._connect(write=True) as con:
+            for name, df in frames.items():
+                self._write_table(con, name, df)
+            con.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, 1)",
+                (fichier, signature, datetime.now().isoformat(timespec="seconds")),
+            )
+            con.execute("DELETE FROM conflits WHERE fichier = ?", (fichier,))
+
+    def _conflict(self, fichier, signature):
+        """Classeur modifié alors que la base a des modifications non exportées : noté, pas importé."""
+        with self._connect(write=True) as con:
+            row = con.execute("SELECT signature FROM conflits WHERE fichier = ?", (fichier,)).fetchone()
+            if row is None or row[0] != signature:
+                con.execute(
+                    "INSERT OR REPLACE INTO conflits VALUES (?, ?, ?)",
+                    (fichier, signature, datetime.now().isoformat(timespec="seconds")),
+                )
+
+    def sync(self, name):
+        """Réimporte le classeur de 'name' s'il a changé depuis le dernier import / export.
+
+        Si la base a des modifications non exportées, le classeur n'est pas
+        réimporté : le conflit est noté (conflicts) et la base reste servie."""
+        fichier = self.tables[name]["file"]
+        signature = self._signature(fichier)
+        with self._connect() as con:
+            row = con.execute("SELECT signature FROM sources WHERE fichier = ?", (fichier,)).fetchone()
+        if signature is None:
+            if row is None:
+                raise FileNotFoundError(self.base_path / fichier)
+            return
+        if row is None or row[0] != signature:
+            with self._lock:
+                with self._connect() as con:
+                    row = con.execute("SELECT signature, exporte FROM sources WHERE fichier = ?", (fichier,)).fetchone()
+                if row is None:
+                    self._import(fichier, signature)
+                elif row[0] != signature:
+                    if row[1]:
+                        self._import(fichier, signature)
+                    else:
+                        self._conflict(fichier, signature)
+
+    def reimport(self, fichier):
+        """Reprend le classeur 'fichier' : remplace la base (modifications non exportées perdues)."""
+        signature = self._signature(fichier)
+        if signature is None:
+            raise FileNotFoundError(self.base_path / fichier)
+        with self._lock:
+            self._import(fichier, signature)
+
+    # ---------- lecture ----------
+
+    def revision(self, name):
+        with self._connect() as con:
+            row = con.execute("SELECT revision FROM revisions WHERE nom = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def version(self, name):
+        """Version de la table dans la base (après réimport éventuel du classeur)."""
+        self.sync(name)
+        return "sqlite", self.revision(name)
+
+    def read(self, name):
+        """Table 'name' dans l'ordre courant (index 0..n-1, types du classeur)."""
+        self.sync(name)
+        with self._connect() as con:
+            cols = con.execute("SELECT colonne, dtype FROM colonnes WHERE nom = ? ORDER BY pos", (name,)).fetchall()
+            select = ", ".join(f"t.{_quote(c)}" for c, _ in cols) or "t.row_id"
+            rows = con.execute(
+                f"SELECT {select} FROM {_quote(f't_{name}')} t "
+                "JOIN ordre o ON o.nom = ? AND o.row_id = t.row_id ORDER BY o.rang",
+                (name,),
+            ).fetchall()
+        df = pd.DataFrame.from_records(rows, columns=[c for c, _ in cols]) if cols else pd.DataFrame(index=range(len(rows)))
+        for c, dtype in cols:
+            df[c] = _cast(df[c], dtype)
+        return df
+
+    # ---------- écriture ----------
+
+    def _pending(self, con, name):
+        con.execute("UPDATE sources SET exporte = 0 WHERE fichier = ?", (self.tables[name]["file"],))
+        self._bump(con, name)
+
+    def reorder(self, name, pos):
+        """Nouvel ordre : la ligne de rang pos[i] passe au rang i ; les autres sont retirées.
+
+        Seuls les rangs qui changent sont mis à jour. Retourne la révision."""
+        table = _quote(f"t_{name}")
+        with self._lock, self._connect(write=True) as con:
+            rows = [r for (r,) in con.execute("SELECT row_id FROM ordre WHERE nom = ? ORDER BY rang", (name,))]
+            keep = [rows[p] for p in pos]
+            drop = [(name, r) for r in set(rows) - set(keep)]
+            if drop:
+                con.executemany("DELETE FROM ordre WHERE nom = ? AND row_id = ?", drop)
+                con.executemany(f"DELETE FROM {table} WHERE row_id = ?", [(r,) for _, r in drop])
+            rang = {r: i for i, r in enumerate(rows)}
+            con.executemany(
+                "UPDATE ordre SET rang = ? WHERE nom = ? AND row_id = ?",
+                [(i, name, r) for i, r in enumerate(keep) if rang[r] != i],
+            )
+            self._pending(con, name)
+        return self.revision(name)
+
+    def replace(self, name, df):
+        """Remplace le contenu de la table 'name' (génération du Settings)."""
+        with self._lock, self._connect(write=True) as con:
+            self._write_table(con, name, df)
+            self._pending(con, name)
+        return self.revision(name)
+
+    # ---------- export ----------
+
+    def exported(self, fichier, revisions):
+        """Classeur 'fichier' écrit depuis la base à 'revisions' ({nom: révision}).
+
+        Sa signature est enregistrée (pas de réimport) ; il reste « à exporter »
+        si une table a changé pendant l'export."""
+        signature = self._signature(fichier)
+        with self._lock, self._connect(write=True) as con:
+            current = dict(con.execute("SELECT nom, revision FROM revisions").fetchall())
+            up_to_date = all(current.get(n, 0) == r for n, r in revisions.items())
+            con.execute(
+                "UPDATE sources SET signature = ?, exporte = CASE WHEN ? THEN 1 ELSE exporte END WHERE fichier = ?",
+                (signature, up_to_date, fichier),
+            )
+            # Le classeur modifié hors de l'appli vient d'être remplacé par la base
+            con.execute("DELETE FROM conflits WHERE fichier = ?", (fichier,))
+
+    def pending(self):
+        """Classeurs dont la base contient des modifications non exportées."""
+        with self._connect() as con:
+            return [f for (f,) in con.execute("SELECT fichier FROM sources WHERE exporte = 0 ORDER BY fichier")]
+
+    def conflicts(self):
+        """{fichier: date} des classeurs modifiés hors de l'appli et non réimportés (modifications en attente)."""
+        with self._connect() as con:
+            return dict(con.execute("SELECT fichier, detecte_le FROM conflits ORDER BY fichier").fetchall())
@@ -3,12 +3,12 @@
 # Version: 2026-02-07
 # ============================================
 
+import threading
+
+import numpy as np
 import pandas as pd
-from pathlib import Path
-import streamlit as st
 
-BASE_PATH = Path(r"C:\Users\yannick.tetard\OneDrive - GERFLOR\Desktop\Planning Streamlit\xarpediem2684-repo-main")
-SUIVI_OF_FILE = BASE_PATH / "SUIVI_OF.xlsx"
+from pages.data_access import current_uap, load_table, table_version
 
 # Statuts
 STATUT_ACTIF = [30, 40, 50]          # Pastille verte
@@ -20,57 +20,130 @@ SUPPORTS_L1 = ["S1013", "S2012", "S2009", "S2010", "S1162", "S1166", "S2019", "S
                "S2003", "S2004", "S2005", "S2006", "S2011", "S2015", "S2014", "S1016"]
 
 
-@st.cache_data(ttl=7200)  # Cache de 2h
-def load_suivi_of():
-    """Charge SUIVI_OF avec cache de 2h."""
-    return pd.read_excel(SUIVI_OF_FILE, engine="openpyxl")
+def load_suivi_of(uap=None):
+    """Charge SUIVI_OF (copie colonnaire, partagée via le repository)."""
+    return load_table("suivi_of", uap)
 
 
-def get_ofs_exclus(suivi_df, ligne_pattern):
-    """Retourne les OFs à exclure (terminés + < 200ml)."""
-    df = suivi_df[suivi_df["LIB_LIGNE"].str.contains(ligne_pattern, case=False, na=False)]
+def _ofs_exclus(df):
     ofs_termines = set(df[df["STATUT"].isin(STATUT_TERMINE)]["NUM_OF"].tolist())
     ofs_petits = set(df[df["COMMANDE"] < ML_MINIMUM]["NUM_OF"].tolist())
     return ofs_termines | ofs_petits
 
 
+def get_ofs_exclus(suivi_df, ligne_pattern):
+    """Retourne les OFs à exclure (terminés + < 200ml)."""
+    df = suivi_df[suivi_df["LIB_LIGNE"].str.contains(ligne_pattern, case=False, na=False)]
+    return _ofs_exclus(df)
+
+
 def get_statut_dict(suivi_df, ligne_pattern):
     """Retourne un dict NUM_OF -> STATUT pour une ligne."""
     df = suivi_df[suivi_df["LIB_LIGNE"].str.contains(ligne_pattern, case=False, na=False)]
     return dict(zip(df["NUM_OF"], df["STATUT"]))
 
 
-def get_fabrique_dict(suivi_df):
-    """Retourne dict COLORIS -> FABRIQUE pour OFs Imprimerie avec FABRIQUE > 0."""
+def _fabrique_dict(suivi_df):
     df = suivi_df[suivi_df["LIB_LIGNE"].str.contains("IMPRIMERIE", case=False, na=False)]
-    fabrique = {}
-    for _, row in df.iterrows():
-        coloris = row["COLORIS"]
-        fab = row["FABRIQUE"]
-        if coloris and pd.notna(fab) and fab > 0:
-            if coloris not in fabrique or fab > fabrique[coloris]:
-                fabrique[coloris] = fab
-    return fabrique
-
-
-def get_stock_supports(suivi_df):
-    """Récupère le stock des supports L1 (une seule valeur par support)."""
-    stocks = {}
-    seen = set()
-    
-    for _, row in suivi_df.iterrows():
-        composant = str(row.get("COMPOSANT", ""))
-        stock = row.get("STOCK_COMPOSANT", 0)
-        
-        if pd.isna(composant) or composant == "nan":
-            continue
-            
-        for support in SUPPORTS_L1:
-            if support in composant and support not in seen:
-                stocks[support] = stock if pd.notna(stock) else 0
-                seen.add(support)
-    
-    return stocks
+    fab = pd.to_numeric(df["FABRIQUE"], errors="coerce")
+    coloris = df["COLORIS"]
+    ok = coloris.notna() & (coloris.astype(str) != "") & (fab > 0)
+    return fab[ok].groupby(coloris[ok], sort=False).max().to_dict()
+
+
+def _stock_supports(suivi_df):
+    # Tous les codes support présents dans COMPOSANT (une ligne par occurrence)
+    composants = suivi_df["COMPOSANT"].astype("string")
+    found = composants.str.extractall(f"({'|'.join(SUPPORTS_L1)})")[0]
+    if found.empty:
+        return {}
+    rows = found.index.get_level_values(0)
+    hits = pd.DataFrame({
+        "row": suivi_df.index.get_indexer(rows),
+        "support": found.to_numpy(),
+        "rang": found.map({s: i for i, s in enumerate(SUPPORTS_L1)}).to_numpy(),
+        "stock": suivi_df["STOCK_COMPOSANT"].reindex(rows).to_numpy(),
+    })
+    # Première ligne du tableau qui cite chaque support
+    first = hits.sort_values(["row", "rang"], kind="stable").drop_duplicates("support")
+    return {s: (v if pd.notna(v) else 0) for s, v in zip(first["support"], first["stock"])}
+
+
+def get_fabrique_dict(suivi_df=None):
+    """Retourne dict COLORIS -> FABRIQUE pour OFs Imprimerie avec FABRIQUE > 0.
+    Sans suivi_df : SUIVI_OF courant, calculé une fois par version du fichier."""
+    if suivi_df is None:
+        return dict(get_suivi_index().fabrique)
+    return _fabrique_dict(suivi_df)
+
+
+def get_stock_supports(suivi_df=None):
+    """Récupère le stock des supports L1 (une seule valeur par support : première
+    ligne de SUIVI_OF dont le COMPOSANT cite le support).
+    Sans suivi_df : SUIVI_OF courant, calculé une fois par version du fichier."""
+    if suivi_df is None:
+        return dict(get_suivi_index().stock_supports)
+    return _stock_supports(suivi_df)
+
+
+# ============================================
+# INDEX SUIVI_OF PAR LIGNE (une fois par version du fichier)
+# ============================================
+# Motif LIB_LIGNE de chaque ligne (clés de data_access.LIGNES)
+LIGNE_PATTERNS = {
+    "Ligne 1": "LIGNE1|L06",
+    "Imprimerie": "IMPRIMERIE|L09",
+    "Ligne 2": "LIGNE2|L08",
+    "Visitage": "VISITAGE|L10",
+}
+
+
+class SuiviLigne:
+    """Lignes de SUIVI_OF d'une ligne de production + OFs exclus et statuts."""
+
+    def __init__(self, df):
+        self.df = df
+        self.exclus = frozenset(_ofs_exclus(df))
+        self.statut = dict(zip(df["NUM_OF"], df["STATUT"]))
+
+
+class SuiviIndex:
+    """SUIVI_OF partitionné par ligne. Les motifs ne sont testés que sur
+    les valeurs distinctes de LIB_LIGNE, pas sur chaque ligne du tableau."""
+
+    def __init__(self, suivi_df):
+        codes, libelles = pd.factorize(suivi_df["LIB_LIGNE"])
+        libelles = pd.Series(libelles, dtype="string")
+        self.lignes = {}
+        for ligne, pattern in LIGNE_PATTERNS.items():
+            match = libelles.str.contains(pattern, case=False, na=False).to_numpy(bool)
+            rows = np.flatnonzero((codes >= 0) & match[np.maximum(codes, 0)])
+            self.lignes[ligne] = SuiviLigne(suivi_df.iloc[rows])
+        self.fabrique = _fabrique_dict(suivi_df)
+        self.stock_supports = _stock_supports(suivi_df)
+
+
+_suivi_index = {}  # UAP -> (version, SuiviIndex)
+_suivi_lock = threading.Lock()
+
+
+def get_suivi_index(uap=None):
+    """Index de SUIVI_OF de l'UAP, reconstruit seulement si le fichier a changé."""
+    uap = uap or current_uap()
+    version = table_version("suivi_of", uap)
+    entry = _suivi_index.get(uap)
+    if entry is None or entry[0] != version:
+        with _suivi_lock:
+            entry = _suivi_index.get(uap)
+            if entry is None or entry[0] != version:
+                entry = (version, SuiviIndex(load_suivi_of(uap)))
+                _suivi_index[uap] = entry
+    return entry[1]
+
+
+def suivi_ligne(ligne):
+    """Tranche SUIVI_OF d'une ligne ("Ligne 1", "Imprimerie", ...) : .df, .exclus, .statut."""
+    return get_suivi_index().lignes[ligne]
 
 
 def is_statut_actif(of_num, statut_dict):
@@ -0,0 +1,208 @@
+# ============================================
+# writeback.py — Écriture de l'ordre des OFs dans les classeurs
+# Version: 2026-02-09
+# ============================================
+# "Valider et écrire" (Planning L1 / L2 / Imprimerie) passe par ce service :
+#   - l'écriture tourne dans un thread unique du process (file d'attente),
+#     la page n'est pas bloquée et affiche l'état jusqu'à la fin
+#   - le classeur est écrit dans un fichier temporaire du même dossier puis
+#     renommé (os.replace) : la macro CONTROLEUR.xlsm ne voit jamais un
+#     fichier à moitié écrit
+#   - seules les lignes de l'onglet OFs sont réordonnées (openpyxl) : les
+#     autres onglets (calcul_durée) et le nom de l'onglet sont conservés
+#   - la sauvegarde est un journal d'ordres (JSON lines, une ligne par
+#     écriture : ordre avant / après) au lieu d'une copie du classeur ;
+#     les générations du Settings y sont journalisées aussi (log_order)
+#   - l'ordre part d'une version du store (plan_store) : il est fusionné
+#     avec les écritures faites depuis, ou refusé (PlanConflict)
+#   - en stockage SQLite (PLANNING_STORE=sqlite), l'ordre est écrit dans la
+#     base ; le classeur n'est réécrit que par export_excel (à la demande)
+# L'UAP de la session est capturée à la soumission : le thread d'écriture
+# n'a pas de session. atomic_path() sert aussi aux exports du Settings.
+
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+from openpyxl import load_workbook
+
+from pages.data_access import (
+    TABLES, current_uap, get_store, load_table, notify_file_written, table_path, table_version, uap_base_path,
+)
+from pages.ingestion import read_excel
+from pages.plan_store import get_plan_store, plan_ids
+
+# Journal des ordres écrits (un fichier .jsonl par table, dans le dossier de l'UAP)
+ORDER_LOG_DIR_NAME = "historique_ordres"
+
+# Rafraîchissement de l'état d'une écriture en cours (secondes)
+STATUS_POLL_S = 1.0
+
+_log_lock = threading.Lock()
+
+
+@contextmanager
+def atomic_path(path):
+    """Chemin temporaire (même dossier) renommé en 'path' si le bloc réussit."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(prefix=f".{path.stem}_", suffix=path.suffix, dir=path.parent)
+    os.close(fd)
+    try:
+        yield Path(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _permutation(path, sheet, ordre, df=None):
+    """Position (ligne de données) de chaque ID_PLAN de 'ordre' dans le classeur (ou df)."""
+    if df is None:
+        df = read_excel(path, sheet_name=sheet)
+    pos = pd.Index(plan_ids(df)).get_indexer(ordre)
+    missing = [x for x, p in zip(ordre, pos) if p < 0]
+    if missing:
+        raise KeyError(f"OFs absents du classeur : {missing[:5]}")
+    return df, pos
+
+
+def order_log_dir(uap=None):
+    return uap_base_path(uap) / ORDER_LOG_DIR_NAME
+
+
+def log_order(name, before, after, uap=None):
+    """Ajoute au journal de la table 'name' l'ordre des OFs avant / après une écriture."""
+    log_dir = order_log_dir(uap)
+    log_dir.mkdir(exist_ok=True)
+    entry = {"ts": datetime.now().isoformat(timespec="seconds"), "table": name, "avant": before, "apres": after}
+    with _log_lock, open(log_dir / f"{name}.jsonl", "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+
+def order_history(name, uap=None):
+    """Entrées du journal des ordres de la table 'name' (plus ancienne d'abord)."""
+    path = order_log_dir(uap) / f"{name}.jsonl"
+    if not path.exists():
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def write_order(name, ordre, backup=True, base_version=None, base=None, uap=None):
+    """Réordonne les lignes de l'onglet OFs de la table 'name' selon 'ordre' (ID_PLAN).
+
+    'ordre' part de l'ordre 'base' de la version 'base_version' du store : il
+    est rejoué sur les écritures faites depuis (PlanConflict si impossible).
+    Les lignes absentes de l'ordre sont retirées. Retourne la nouvelle version."""
+    uap = uap or current_uap()
+    path = table_path(name, uap)
+    sheet = TABLES[name]["sheet"]
+    store = get_plan_store(uap)
+    db = get_store(uap)
+    if db is not None and db.holds(name):
+        with store.lock():
+            _, _, ordre = store.rebase(name, base_version, base or [], ordre)
+            df, pos = _permutation(path, sheet, ordre, load_table(name, uap))
+            db.reorder(name, pos)
+            version = store.written(name, ordre, table_version(name, uap))
+        if backup:
+            log_order(name, df["Ofs"].tolist(), df["Ofs"].to_numpy()[pos].tolist(), uap)
+        return version
+
+    with store.lock():
+        _, _, ordre = store.rebase(name, base_version, base or [], ordre)
+        df, pos = _permutation(path, sheet, ordre)
+
+        wb = load_workbook(path)
+        ws = wb[sheet] if isinstance(sheet, str) else wb.worksheets[sheet]
+        rows = [list(r) for r in ws.iter_rows(min_row=2, max_row=1 + len(df))]
+        values = [[(c.value, c.number_format) for c in r] for r in rows]
+        for dest, src in zip(rows, pos):
+            for cell, (value, fmt) in zip(dest, values[src]):
+                cell.value = value
+                cell.number_format = fmt
+        if len(pos) < len(df):
+            ws.delete_rows(2 + len(pos), len(df) - len(pos))
+
+        with atomic_path(path) as tmp:
+            wb.save(tmp)
+        wb.close()
+        version = store.written(name, ordre, table_version(name, uap))
+
+    if backup:
+        log_order(name, df["Ofs"].tolist(), df["Ofs"].to_numpy()[pos].tolist(), uap)
+    notify_file_written(path, uap)
+    return version
+
+
+def export_excel(fichier, uap=None):
+    """Réécrit le classeur 'fichier' depuis la base SQLite (onglets du registre)."""
+    uap = uap or current_uap()
+    db = get_store(uap)
+    names = db.file_tables(fichier)
+    revisions = {n: db.revision(n) for n in names}
+    frames = {n: load_table(n, uap) for n in names}
+    path = uap_base_path(uap) / fichier
+    with atomic_path(path) as tmp:
+        with pd.ExcelWriter(tmp, engine="openpyxl") as writer:
+            for name, df in frames.items():
+                df.to_excel(writer, sheet_name=TABLES[name]["sheet"], index=False)
+    db.exported(fichier, revisions)
+    notify_file_written(path, uap)
+    return fichier
+
+
+class WriteBack:
+    """File d'écritures : un seul thread, les écritures passent dans l'ordre."""
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writeback")
+
+    def submit_order(self, name, ordre, backup=True, base_version=None, base=None):
+        """Lance write_order en arrière-plan ; retourne un Future (résultat : la version écrite)."""
+        return self._pool.submit(write_order, name, list(ordre), backup, base_version, list(base or []), current_uap())
+
+    def submit_export(self, fichier):
+        """Lance export_excel en arrière-plan ; retourne un Future (résultat : le fichier)."""
+        return self._pool.submit(export_excel, fichier, current_uap())
+
+
+@st.cache_resource
+def get_writeback():
+    """Service d'écriture unique du process (partagé entre sessions)."""
+    return WriteBack()
+
+
+def show_write_status(key, success_msg, on_success=None):
+    """État de l'écriture st.session_state[key] (Future) : attente, succès ou erreur.
+
+    Tant que l'écriture tourne, un fragment vérifie toutes les STATUS_POLL_S
+    secondes et relance la page à la fin ; on_success(résultat) est alors appelé."""
+    job = st.session_state.get(key)
+    if job is None:
+        return
+    if job.done():
+        del st.session_state[key]
+        error = job.exception()
+        if error is not None:
+            st.error(f"❌ Erreur lors de la mise à jour du fichier : {error}")
+        else:
+            st.success(success_msg)
+            if on_success:
+                on_success(job.result())
+        return
+
+    @st.fragment(run_every=STATUS_POLL_S)
+    def _attente():
+        if job.done():
+            st.rerun()
+        st.info("⏳ Écriture du classeur en arrière-plan…")
+
+    _attente()